@@ -0,0 +1,211 @@
+import multiprocessing
+import tarfile
+import threading
+import zlib
+
+from contextlib import contextmanager
+
+
+class GzipCodec:
+    """ Single-threaded gzip, compatible with archives created by tarfile's w:gz mode. """
+
+    def __init__(self, level=6):
+        self.__level = level
+
+    @staticmethod
+    def identifier():
+        return 'gzip'
+
+    def compressor(self, fileobj):
+        return _GzipWriter(fileobj, self.__level)
+
+    def decompressor(self, fileobj):
+        return _GzipReader(fileobj)
+
+
+class BlockGzipCodec:
+    """ Compresses fixed-size blocks as independent gzip members on multiple threads.
+
+    The result is a standard multi-member gzip stream, so any gzip implementation can decompress it.
+    """
+
+    def __init__(self, level=6, block_size=1024 * 1024, threads=None):
+        self.__level = level
+        self.__block_size = block_size
+        self.__threads = threads if threads else multiprocessing.cpu_count()
+
+    @staticmethod
+    def identifier():
+        return 'block-gzip'
+
+    def compressor(self, fileobj):
+        return _BlockGzipWriter(fileobj, self.__level, self.__block_size, self.__threads)
+
+    def decompressor(self, fileobj):
+        return _GzipReader(fileobj)
+
+
+class ZstdCodec:
+    """ Multi-threaded zstandard compression. Requires the zstandard package. """
+
+    def __init__(self, level=3):
+        self.__level = level
+
+    @staticmethod
+    def identifier():
+        return 'zstd'
+
+    def compressor(self, fileobj):
+        zstandard = ZstdCodec.__zstandard()
+        return _ZstdWriter(zstandard.ZstdCompressor(level=self.__level, threads=-1).stream_writer(fileobj), zstandard)
+
+    def decompressor(self, fileobj):
+        return ZstdCodec.__zstandard().ZstdDecompressor().stream_reader(fileobj)
+
+    @staticmethod
+    def __zstandard():
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('Please install the zstandard Python package to use zstd archives')
+        return zstandard
+
+
+def available_codecs():
+    return [GzipCodec, BlockGzipCodec, ZstdCodec]
+
+
+def codec(identifier):
+    for c in available_codecs():
+        if c.identifier() == identifier:
+            return c()
+    raise ValueError('unknown archive codec: {}'.format(identifier))
+
+
+def write_archive(directory, fileobj, codec):
+    """ writes the contents of directory to fileobj as a compressed tar stream """
+    with _closing(codec.compressor(fileobj)) as stream:
+        tar = tarfile.open(fileobj=stream, mode='w|')
+        tar.add(directory, arcname='.')
+        tar.close()
+
+
+def extract_archive(fileobj, directory, codec):
+    """ extracts a compressed tar stream written by write_archive into directory """
+    tar = tarfile.open(fileobj=codec.decompressor(fileobj), mode='r|')
+    tar.extractall(path=directory)
+    tar.close()
+
+
+@contextmanager
+def _closing(stream):
+    yield stream
+    stream.close()
+
+
+class _GzipWriter:
+    def __init__(self, fileobj, level):
+        self.__fileobj = fileobj
+        self.__compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data):
+        self.__fileobj.write(self.__compressor.compress(data))
+
+    def close(self):
+        self.__fileobj.write(self.__compressor.flush())
+
+
+class _ZstdWriter:
+    def __init__(self, writer, zstandard):
+        self.__writer = writer
+        self.__zstandard = zstandard
+
+    def write(self, data):
+        self.__writer.write(data)
+
+    def close(self):
+        # closing the writer would also close the underlying file
+        self.__writer.flush(self.__zstandard.FLUSH_FRAME)
+
+
+class _BlockGzipWriter:
+    def __init__(self, fileobj, level, block_size, threads):
+        self.__fileobj = fileobj
+        self.__level = level
+        self.__block_size = block_size
+        self.__threads = threads
+        self.__buffer = []
+        self.__buffered = 0
+        self.__pending = []
+
+    def write(self, data):
+        self.__buffer.append(data)
+        self.__buffered += len(data)
+        if self.__buffered >= self.__block_size:
+            self.__compress_buffer()
+
+    def close(self):
+        if self.__buffered:
+            self.__compress_buffer()
+        while self.__pending:
+            self.__write_oldest()
+
+    def __compress_buffer(self):
+        block = b''.join(self.__buffer)
+        self.__buffer = []
+        self.__buffered = 0
+
+        while len(self.__pending) >= self.__threads:
+            self.__write_oldest()
+
+        result = []
+
+        def compress():
+            compressor = zlib.compressobj(self.__level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            result.append(compressor.compress(block) + compressor.flush())
+
+        # zlib releases the gil while compressing, so threads are enough to use multiple cores
+        thread = threading.Thread(target=compress)
+        thread.daemon = True
+        thread.start()
+        self.__pending.append((thread, result))
+
+    def __write_oldest(self):
+        thread, result = self.__pending.pop(0)
+        thread.join()
+        if not result:
+            raise RuntimeError('unable to compress archive block')
+        self.__fileobj.write(result[0])
+
+
+class _GzipReader:
+    """ Decompresses gzip streams, including multi-member streams, without requiring a seekable file """
+
+    def __init__(self, fileobj, chunk_size=64 * 1024):
+        self.__fileobj = fileobj
+        self.__chunk_size = chunk_size
+        self.__decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.__buffer = b''
+        self.__offset = 0
+        self.__eof = False
+
+    def read(self, size=-1):
+        while not self.__eof and (size < 0 or len(self.__buffer) - self.__offset < size):
+            self.__fill()
+        end = len(self.__buffer) if size < 0 else min(self.__offset + size, len(self.__buffer))
+        ret = self.__buffer[self.__offset:end]
+        self.__offset = end
+        return ret
+
+    def __fill(self):
+        data = self.__decompressor.unused_data
+        if data:
+            # a new member starts after the end of the previous one
+            self.__decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            data = self.__fileobj.read(self.__chunk_size)
+            if not data:
+                self.__eof = True
+        decompressed = self.__decompressor.decompress(data) if data else self.__decompressor.flush()
+        self.__buffer = self.__buffer[self.__offset:] + decompressed
+        self.__offset = 0
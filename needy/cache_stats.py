@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+from collections import OrderedDict
+
+
+class CacheStats:
+    """ Records the outcome and cost of every build cache operation so that codecs and backends can be compared.
+
+    Operations are appended to a log as single lines of JSON, which concurrent builds can do without coordinating.
+    Gets result in a hit, miss, or error. Sets result in stored, skipped, or error.
+    """
+
+    def __init__(self, path):
+        self.__path = path
+
+    def path(self):
+        return self.__path
+
+    def record(self, operation, result, library, target, cache, bytes=0, compression_time=0, transfer_time=0, extraction_time=0):
+        record = {
+            'time': time.time(),
+            'operation': operation,
+            'result': result,
+            'library': library,
+            'target': target,
+            'cache': cache,
+            'bytes': bytes,
+            'compression-time': compression_time,
+            'transfer-time': transfer_time,
+            'extraction-time': extraction_time,
+        }
+        if not os.path.exists(os.path.dirname(self.__path)):
+            os.makedirs(os.path.dirname(self.__path))
+        fd = os.open(self.__path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, (json.dumps(record, sort_keys=True) + '\n').encode())
+        finally:
+            os.close(fd)
+
+    def records(self):
+        if not os.path.exists(self.__path):
+            return []
+        ret = []
+        with open(self.__path, 'r') as f:
+            for line in f:
+                try:
+                    ret.append(json.loads(line))
+                except ValueError:
+                    # a line may be incomplete if a process was interrupted while writing it
+                    pass
+        return ret
+
+    def summary(self):
+        """ returns totals for each (cache, library, target), ordered by cache and then by library """
+        ret = OrderedDict()
+        for record in sorted(self.records(), key=lambda r: (r['cache'], r['library'], r['target'])):
+            key = (record['cache'], record['library'], record['target'])
+            if key not in ret:
+                ret[key] = {
+                    'hits': 0, 'misses': 0, 'get-errors': 0, 'stored': 0, 'skipped': 0, 'set-errors': 0,
+                    'bytes-downloaded': 0, 'bytes-uploaded': 0,
+                    'download-time': 0, 'upload-time': 0, 'compression-time': 0, 'extraction-time': 0,
+                }
+            totals = ret[key]
+            if record['operation'] == 'get':
+                totals[{'hit': 'hits', 'miss': 'misses', 'error': 'get-errors'}[record['result']]] += 1
+                totals['bytes-downloaded'] += record['bytes']
+                totals['download-time'] += record['transfer-time']
+            else:
+                totals[{'stored': 'stored', 'skipped': 'skipped', 'error': 'set-errors'}[record['result']]] += 1
+                totals['bytes-uploaded'] += record['bytes']
+                totals['upload-time'] += record['transfer-time']
+            totals['compression-time'] += record['compression-time']
+            totals['extraction-time'] += record['extraction-time']
+        return ret
+
+    def reset(self):
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+
+
+class TimedReader:
+    """ Wraps a file object to count the bytes read from it and the time spent waiting on it """
+
+    def __init__(self, fileobj):
+        self.__fileobj = fileobj
+        self.__bytes_read = 0
+        self.__read_time = 0
+
+    def read(self, size=-1):
+        start = time.time()
+        ret = self.__fileobj.read(size)
+        self.__read_time += time.time() - start
+        self.__bytes_read += len(ret)
+        return ret
+
+    def bytes_read(self):
+        return self.__bytes_read
+
+    def read_time(self):
+        return self.__read_time
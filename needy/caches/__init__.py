@@ -0,0 +1,16 @@
+from .content_addressed import ContentAddressedCache
+from .directory import DirectoryCache
+from .s3 import S3Cache
+from .tiered import TieredCache
+
+
+def cache_from_dict(d):
+    """ returns the cache for a build-caches entry, which is either a path or a dictionary """
+    config = d if isinstance(d, dict) else {'path': d}
+    if config.get('type') == ContentAddressedCache.type():
+        return ContentAddressedCache.from_dict(config)
+    if config.get('type') == TieredCache.type():
+        return TieredCache.from_dict(config)
+    if config['path'].lower().startswith('s3://'):
+        return S3Cache.from_dict(config)
+    return DirectoryCache.from_dict(config)
@@ -0,0 +1,135 @@
+import calendar
+import json
+import logging
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+
+try:
+    from configparser import ConfigParser
+except ImportError:
+    from ConfigParser import ConfigParser
+
+
+class CredentialsError(RuntimeError):
+    pass
+
+
+class Credentials:
+    def __init__(self, access_key, secret_key, session_token=None, expiration=None):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.expiration = expiration
+
+    def expires_within(self, seconds):
+        return self.expiration is not None and self.expiration - time.time() < seconds
+
+
+class CredentialProvider:
+    """ Resolves AWS credentials from the sources that the aws cli reads without contacting AWS: the environment and the
+    shared credentials and config files, including profiles with a credential_process. Temporary credentials are
+    refreshed before they expire.
+
+    If botocore is installed, it's used for everything else, such as instance and container roles or SSO.
+    """
+
+    def __init__(self, credentials=None):
+        self.__credentials = Credentials(*credentials) if credentials else None
+        self.__static = credentials is not None
+        self.__botocore_credentials = None
+        self.__lock = threading.Lock()
+
+    def get(self):
+        """ returns the current credentials, raising CredentialsError if none can be found """
+        with self.__lock:
+            needs_refresh = self.__credentials is None or self.__credentials.expires_within(5 * 60)
+            if not self.__static and self.__botocore_credentials is None and needs_refresh:
+                self.__credentials = CredentialProvider.resolve()
+                if self.__credentials is None:
+                    self.__botocore_credentials = CredentialProvider.__botocore()
+            if self.__botocore_credentials is not None:
+                # botocore refreshes its own credentials
+                frozen = self.__botocore_credentials.get_frozen_credentials()
+                return Credentials(frozen.access_key, frozen.secret_key, frozen.token)
+            if self.__credentials is None:
+                raise CredentialsError('no AWS credentials found. set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY, or configure a '
+                                       'profile in ~/.aws. other sources, such as instance roles, require botocore')
+            return self.__credentials
+
+    @staticmethod
+    def resolve():
+        """ returns the first credentials found in the environment or the shared files, or None """
+        credentials = CredentialProvider.__environment()
+        return credentials if credentials is not None else CredentialProvider.__profile()
+
+    @staticmethod
+    def profile_name():
+        return os.environ.get('AWS_PROFILE', os.environ.get('AWS_DEFAULT_PROFILE', 'default'))
+
+    @staticmethod
+    def config_file(name):
+        """ returns the settings for the current profile from the shared 'config' or 'credentials' file """
+        environment_variable = 'AWS_CONFIG_FILE' if name == 'config' else 'AWS_SHARED_CREDENTIALS_FILE'
+        path = os.environ.get(environment_variable, os.path.join('~', '.aws', name))
+        parser = ConfigParser()
+        parser.read(os.path.expanduser(path))
+        profile = CredentialProvider.profile_name()
+        sections = [profile] if name == 'credentials' else (['default', 'profile default'] if profile == 'default' else ['profile ' + profile])
+        for section in sections:
+            if parser.has_section(section):
+                return dict(parser.items(section))
+        return {}
+
+    @staticmethod
+    def parse_time(value):
+        """ parses ISO 8601 times such as 2016-01-01T00:00:00Z or 2016-01-01T00:00:00.5+01:00 into a unix timestamp """
+        match = re.match(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:?\d{2})$', value)
+        if not match:
+            raise CredentialsError('unable to parse the expiration time {}'.format(value))
+        timestamp = calendar.timegm(time.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S')) + float(match.group(2) or 0)
+        if match.group(3) != 'Z':
+            sign = -1 if match.group(3)[0] == '+' else 1
+            digits = match.group(3)[1:].replace(':', '')
+            timestamp += sign * (int(digits[:2]) * 60 * 60 + int(digits[2:]) * 60)
+        return timestamp
+
+    @staticmethod
+    def __environment():
+        if 'AWS_ACCESS_KEY_ID' in os.environ and 'AWS_SECRET_ACCESS_KEY' in os.environ:
+            return Credentials(os.environ['AWS_ACCESS_KEY_ID'], os.environ['AWS_SECRET_ACCESS_KEY'], os.environ.get('AWS_SESSION_TOKEN'))
+        return None
+
+    @staticmethod
+    def __profile():
+        credentials = CredentialProvider.config_file('credentials')
+        config = CredentialProvider.config_file('config')
+        for settings in [credentials, config]:
+            if 'aws_access_key_id' in settings and 'aws_secret_access_key' in settings:
+                return Credentials(settings['aws_access_key_id'], settings['aws_secret_access_key'], settings.get('aws_session_token'))
+
+        process = credentials.get('credential_process', config.get('credential_process'))
+        if not process:
+            return None
+        logging.debug('Running {} for AWS credentials'.format(process))
+        try:
+            output = subprocess.check_output(shlex.split(process))
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise CredentialsError('unable to get AWS credentials from "{}": {}'.format(process, e))
+        try:
+            values = json.loads(output.decode())
+            return Credentials(values['AccessKeyId'], values['SecretAccessKey'], values.get('SessionToken'),
+                               CredentialProvider.parse_time(values['Expiration']) if values.get('Expiration') else None)
+        except (ValueError, KeyError) as e:
+            raise CredentialsError('unable to parse AWS credentials from "{}": {}'.format(process, e))
+
+    @staticmethod
+    def __botocore():
+        try:
+            import botocore.session
+        except ImportError:
+            return None
+        return botocore.session.get_session().get_credentials()
@@ -0,0 +1,184 @@
+import binascii
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+from contextlib import contextmanager
+
+from .file_cache import FileCache
+from ..filesystem import file_hash, reflink_or_copy
+
+
+class ContentAddressedCache(FileCache):
+    """ Stores directories as manifests of content hashes so that identical files are only stored once.
+
+    Blobs are read-only and shared between manifests. Restored files are reflinked into place whenever the filesystem
+    allows it and copied otherwise, so they can be modified without affecting the cache.
+    """
+
+    def __init__(self, path):
+        self.__path = os.path.expanduser(path)
+
+    @staticmethod
+    def type():
+        return 'content-addressed'
+
+    @staticmethod
+    def from_dict(d):
+        return ContentAddressedCache(path=d['path'])
+
+    def description(self):
+        return self.__path if self.__path else ''
+
+    def stores_directories(self):
+        return True
+
+    def set(self, key, source):
+        raise NotImplementedError('content addressed caches can only store directories')
+
+    def get(self, key, destination):
+        raise NotImplementedError('content addressed caches can only store directories')
+
+    def set_directory(self, key, source):
+        manifest = {'files': {}, 'symlinks': {}, 'directories': []}
+        for root, dirs, files in os.walk(source):
+            relroot = os.path.relpath(root, source)
+            for name in dirs:
+                path = os.path.join(root, name)
+                relpath = os.path.normpath(os.path.join(relroot, name))
+                if os.path.islink(path):
+                    manifest['symlinks'][relpath] = os.readlink(path)
+                else:
+                    manifest['directories'].append(relpath)
+            for name in files:
+                path = os.path.join(root, name)
+                relpath = os.path.normpath(os.path.join(relroot, name))
+                if os.path.islink(path):
+                    manifest['symlinks'][relpath] = os.readlink(path)
+                else:
+                    manifest['files'][relpath] = self.__store_blob(path)
+
+        with self.__atomic_file(self.__manifest_path(key), 0o644) as f:
+            f.write(json.dumps(manifest, sort_keys=True).encode())
+        return True
+
+    def get_directory(self, key, destination):
+        try:
+            with open(self.__manifest_path(key), 'r') as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+
+        blobs = dict((relpath, self.__blob_path(blob)) for relpath, blob in manifest['files'].items())
+        if not all([os.path.exists(blob) for blob in blobs.values()]):
+            return False
+
+        for relpath in manifest['directories']:
+            path = os.path.join(destination, relpath)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        for relpath, blob in blobs.items():
+            path = os.path.join(destination, relpath)
+            ContentAddressedCache.__prepare_destination(path)
+            # blobs are shared and read-only, so restored files are never hard links to them
+            reflink_or_copy(blob, path)
+            os.chmod(path, 0o755 if blob.endswith('.x') else 0o644)
+        for relpath, target in manifest['symlinks'].items():
+            path = os.path.join(destination, relpath)
+            ContentAddressedCache.__prepare_destination(path)
+            os.symlink(target, path)
+
+        # the manifest's modification time tracks its last use for pruning
+        os.utime(self.__manifest_path(key), None)
+        return True
+
+    def last_prune_path(self):
+        return os.path.join(self.__path, '.last-prune')
+
+    def prune(self, object_lifetime=60*60*24*7, blob_grace_period=60*60):
+        manifests_directory = os.path.join(self.__path, 'manifests')
+        blobs_directory = os.path.join(self.__path, 'blobs')
+        if not os.path.exists(manifests_directory):
+            return
+
+        referenced = set()
+        for name in os.listdir(manifests_directory):
+            path = os.path.join(manifests_directory, name)
+            try:
+                if time.time() - os.stat(path).st_mtime >= object_lifetime:
+                    os.remove(path)
+                    continue
+                with open(path, 'r') as f:
+                    referenced.update(json.load(f)['files'].values())
+            except (IOError, OSError, ValueError):
+                pass
+
+        if not os.path.exists(blobs_directory):
+            return
+
+        # recent blobs may belong to a manifest that is still being written
+        for root, dirs, files in os.walk(blobs_directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if name not in referenced and time.time() - os.stat(path).st_mtime >= blob_grace_period:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def __store_blob(self, path):
+        with open(path, 'rb') as f:
+            blob = binascii.hexlify(file_hash(f, hashlib.sha256())).decode()
+        if os.stat(path).st_mode & stat.S_IXUSR:
+            blob += '.x'
+
+        blob_path = self.__blob_path(blob)
+        if os.path.exists(blob_path):
+            os.utime(blob_path, None)
+            return blob
+
+        with self.__atomic_file(blob_path, 0o555 if blob.endswith('.x') else 0o444) as f:
+            with open(path, 'rb') as source:
+                shutil.copyfileobj(source, f)
+        return blob
+
+    @staticmethod
+    @contextmanager
+    def __atomic_file(path, mode):
+        """ yields a file that is moved to path once it's complete. if path already exists, it's left unchanged """
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+            os.chmod(temp_path, mode)
+            os.rename(temp_path, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def __prepare_destination(path):
+        if os.path.lexists(path):
+            os.remove(path)
+        elif not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+    def __manifest_path(self, key):
+        return os.path.join(self.__path, 'manifests', hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def __blob_path(self, blob):
+        return os.path.join(self.__path, 'blobs', blob[:2], blob)
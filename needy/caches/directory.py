@@ -1,16 +1,30 @@
+import errno
 import hashlib
 import os
 import shutil
+import socket
+import sys
 import time
+import uuid
+
+from contextlib import contextmanager
 
 from .file_cache import FileCache
+from .. import archive
 from ..filesystem import clean_file, TempDir
 
 
 class DirectoryCache(FileCache):
-    def __init__(self, path):
+    """ Stores objects as files in a directory.
+
+    Object sizes and last-use times are appended to an index as objects are stored and retrieved, so pruning doesn't
+    need to scan the directory or rely on access times, which are often disabled.
+    """
+
+    def __init__(self, path, codec='gzip', max_size=None):
         self.__path = os.path.expanduser(path)
-        self.prune()
+        self.__codec = archive.codec(codec).identifier()
+        self.__max_size = max_size
 
     @staticmethod
     def type():
@@ -18,7 +32,23 @@ class DirectoryCache(FileCache):
 
     @staticmethod
     def from_dict(d):
-        return DirectoryCache(path=d['path'])
+        max_size = DirectoryCache.parse_size(d['max-size']) if 'max-size' in d else None
+        return DirectoryCache(path=d['path'], codec=d.get('codec', 'gzip'), max_size=max_size)
+
+    @staticmethod
+    def parse_size(size):
+        """ parses sizes such as 1048576, '512M', or '10G' into bytes """
+        units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+        try:
+            return int(size)
+        except ValueError:
+            pass
+        if size[-1:].upper() not in units:
+            raise ValueError('invalid size: {}'.format(size))
+        return int(float(size[:-1]) * units[size[-1:].upper()])
+
+    def codec(self):
+        return self.__codec
 
     def description(self):
         return self.__path if self.__path else ''
@@ -34,6 +64,7 @@ class DirectoryCache(FileCache):
             except OSError:
                 if not os.path.exists(destination_file):
                     raise
+        self.__record_use(destination_file)
         return True
 
     def get(self, key, destination):
@@ -41,20 +72,191 @@ class DirectoryCache(FileCache):
             shutil.copyfile(self._object_path(key), destination)
         except IOError:
             return False
+        self.__record_use(self._object_path(key))
         return True
 
+    @contextmanager
+    def open_read(self, key):
+        try:
+            f = open(self._object_path(key), 'rb')
+        except IOError:
+            yield None
+            return
+        self.__record_use(self._object_path(key))
+        with f:
+            yield f
+
+    def last_prune_path(self):
+        return os.path.join(self.__path, '.last-prune')
+
     def prune(self, object_lifetime=60*60*24*7):
+        """ removes objects unused for object_lifetime seconds, then the least recently used beyond max_size """
         if not os.path.exists(self.__path):
             return
 
-        for name in os.listdir(self.__path):
-            path = os.path.join(self.__path, name)
-            s = os.stat(path)
-            if name[0] != '.' and time.time() - s.st_atime >= object_lifetime:
+        with self.__compaction_lock() as locked:
+            if not locked:
+                # another process is pruning
+                return
+
+            entries, records, offset = self.__read_index()
+            reconciled = self.__reconcile(entries)
+            self.__refresh_compaction_lock()
+
+            now = time.time()
+            removed = [name for name, (size, last_use) in entries.items() if now - last_use >= object_lifetime]
+            if self.__max_size is not None:
+                remaining = sorted([(last_use, name) for name, (size, last_use) in entries.items() if name not in removed])
+                total = sum([entries[name][0] for _, name in remaining])
+                for _, name in remaining:
+                    if total <= self.__max_size:
+                        break
+                    removed.append(name)
+                    total -= entries[name][0]
+
+            for name in removed:
                 try:
-                    os.remove(path)
-                except IOError:
+                    os.remove(os.path.join(self.__path, name))
+                except OSError:
                     pass
+                del entries[name]
+                self.__refresh_compaction_lock()
+
+            # the index is rewritten when it's out of date or contains a significant number of stale records
+            if removed or reconciled or records > 2 * len(entries):
+                self.__write_index(entries, offset)
+
+    def __record_use(self, path):
+        try:
+            size = os.path.getsize(path)
+            # the modification time is the last use for objects that end up without index records
+            os.utime(path, None)
+        except OSError:
+            return
+        # records are small enough that appends from concurrent processes don't interleave
+        fd = os.open(self.__index_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, '{} {} {}\n'.format(os.path.basename(path), size, time.time()).encode())
+        finally:
+            os.close(fd)
+
+    def __read_index(self):
+        """ returns the latest size and last use for each object, the number of records read, and the offset that
+        reading stopped at """
+        entries = {}
+        records = 0
+        offset = 0
+        if not os.path.exists(self.__index_path()):
+            return entries, records, offset
+        with open(self.__index_path(), 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # the record is still being written
+                    break
+                offset += len(line)
+                try:
+                    name, size, last_use = line.decode().split()
+                    entries[name] = (int(size), float(last_use))
+                    records += 1
+                except ValueError:
+                    pass
+        return entries, records, offset
+
+    def __reconcile(self, entries):
+        """ makes the entries match the objects in the directory. objects without records, such as those stored by older
+        versions or whose records were lost, are added using their modification times. returns True if anything changed """
+        names = set([name for name in os.listdir(self.__path) if name[0] != '.'])
+        changed = False
+        for name in set(entries.keys()) - names:
+            del entries[name]
+            changed = True
+        for name in names - set(entries.keys()):
+            try:
+                s = os.stat(os.path.join(self.__path, name))
+            except OSError:
+                continue
+            entries[name] = (s.st_size, max(s.st_atime, s.st_mtime))
+            changed = True
+        return changed
+
+    def __write_index(self, entries, offset):
+        """ replaces the records up to offset with the entries, keeping records that were appended after it """
+        staging_path = self.__index_path() + '.tmp'
+        with open(staging_path, 'wb') as f:
+            for name, (size, last_use) in entries.items():
+                f.write('{} {} {}\n'.format(name, size, last_use).encode())
+            if os.path.exists(self.__index_path()):
+                with open(self.__index_path(), 'rb') as index:
+                    index.seek(offset)
+                    shutil.copyfileobj(index, f)
+        if os.path.exists(self.__index_path()) and sys.platform == 'win32':
+            os.remove(self.__index_path())
+        os.rename(staging_path, self.__index_path())
+
+    @contextmanager
+    def __compaction_lock(self, stale_lock_age=60*10):
+        """ yields True if the lock was acquired. the lock is only taken over if the process holding it is gone, or if it
+        hasn't been refreshed for stale_lock_age seconds when it's held by another host """
+        lock_path = self.__compaction_lock_path()
+        stale_owner = self.__stale_lock_owner(lock_path, stale_lock_age)
+        if stale_owner is not None:
+            # renaming makes sure that only one process takes the lock over
+            stale_path = '{}.{}.stale'.format(lock_path, uuid.uuid4().hex)
+            try:
+                os.rename(lock_path, stale_path)
+                with open(stale_path, 'r') as f:
+                    if f.read() != stale_owner:
+                        # another process took the lock over first, so it's given back
+                        os.link(stale_path, lock_path)
+                os.remove(stale_path)
+            except (IOError, OSError, AttributeError):
+                pass
+        try:
+            fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except OSError:
+            yield False
+            return
+        try:
+            os.write(fd, '{} {}'.format(socket.gethostname(), os.getpid()).encode())
+        finally:
+            os.close(fd)
+        try:
+            yield True
+        finally:
+            os.remove(lock_path)
+
+    def __refresh_compaction_lock(self):
+        try:
+            os.utime(self.__compaction_lock_path(), None)
+        except OSError:
+            pass
+
+    def __compaction_lock_path(self):
+        return os.path.join(self.__path, '.index.lock')
+
+    @staticmethod
+    def __stale_lock_owner(lock_path, stale_lock_age):
+        """ returns the contents of the lock if it's stale, otherwise None """
+        try:
+            with open(lock_path, 'r') as f:
+                owner = f.read()
+            age = time.time() - os.stat(lock_path).st_mtime
+        except (IOError, OSError):
+            return None
+        parts = owner.split()
+        if len(parts) == 2 and parts[0] == socket.gethostname() and sys.platform != 'win32':
+            try:
+                os.kill(int(parts[1]), 0)
+            except OSError as e:
+                return owner if e.errno == errno.ESRCH else None
+            except ValueError:
+                pass
+            return None
+        # the owner's liveness can't be checked from here, but it refreshes the lock while pruning
+        return owner if age >= stale_lock_age else None
+
+    def __index_path(self):
+        return os.path.join(self.__path, '.index')
 
     def _object_path(self, key):
         return os.path.join(self.__path, hashlib.sha256(key.encode()).hexdigest())
@@ -1,3 +1,11 @@
+import os
+import time
+
+from contextlib import contextmanager
+
+from ..filesystem import TempDir
+
+
 class FileCache:
     @staticmethod
     def type():
@@ -8,6 +16,10 @@ class FileCache:
         '''uri, path, or other human-readable configuration description'''
         raise NotImplementedError('description')
 
+    def codec(self):
+        '''identifier of the archive codec used for objects in this cache'''
+        return 'gzip'
+
     @staticmethod
     def from_dict(d):
         '''inverse of to_dict. returns a file cache'''
@@ -20,3 +32,59 @@ class FileCache:
     def get(self, key, destination):
         '''if True is returned, the given key is now available at the given destination path'''
         raise NotImplementedError('get')
+
+    def prune(self):
+        '''removes objects that are no longer worth keeping'''
+        pass
+
+    def last_prune_path(self):
+        '''path of a file whose modification time records the last prune, or None if pruning isn't needed'''
+        return None
+
+    def prune_if_due(self, minimum_interval=60*60):
+        '''prunes if the cache hasn't been pruned in the last minimum_interval seconds. returns True if it was pruned'''
+        path = self.last_prune_path()
+        if path is None:
+            return False
+        try:
+            if time.time() - os.stat(path).st_mtime < minimum_interval:
+                return False
+        except OSError:
+            if not os.path.exists(os.path.dirname(path)):
+                return False
+        # the timestamp is updated first so that concurrent processes don't all prune at once
+        with open(path, 'a'):
+            os.utime(path, None)
+        self.prune()
+        return True
+
+    def is_remote(self):
+        '''if True, objects are stored on another machine, so transfers are slow'''
+        return False
+
+    def set_uploader(self, uploader):
+        '''gives the cache a BackgroundUploader that it can hand slow stores to'''
+        pass
+
+    def stores_directories(self):
+        '''if True, artifacts are stored with set_directory and get_directory instead of as archives'''
+        return False
+
+    def set_directory(self, key, source):
+        '''make the contents of the source directory retrievable with key'''
+        raise NotImplementedError('set_directory')
+
+    def get_directory(self, key, destination):
+        '''if True is returned, the contents for the given key are now in the destination directory'''
+        raise NotImplementedError('get_directory')
+
+    @contextmanager
+    def open_read(self, key):
+        '''yields a readable binary file object for the given key, or None if the key isn't available'''
+        with TempDir() as d:
+            path = os.path.join(d, 'object')
+            if not self.get(key, path):
+                yield None
+                return
+            with open(path, 'rb') as f:
+                yield f
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import time
+
+
+class NegativeLookups:
+    """ Remembers keys that a cache didn't have so that lookups for them can be skipped for a while.
+
+    Each miss is recorded as an empty file whose modification time is the time of the lookup, so concurrent processes
+    can record and invalidate misses without coordinating.
+    """
+
+    def __init__(self, path, ttl):
+        self.__path = os.path.expanduser(path)
+        self.__ttl = ttl
+
+    def is_missing(self, key):
+        """ returns True if key was missing less than ttl seconds ago """
+        if self.__ttl <= 0:
+            return False
+        path = self.__entry_path(key)
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except OSError:
+            return False
+        if age < self.__ttl:
+            return True
+        self.invalidate(key)
+        return False
+
+    def record_miss(self, key):
+        if self.__ttl <= 0:
+            return
+        try:
+            if not os.path.exists(self.__path):
+                os.makedirs(self.__path)
+            with open(self.__entry_path(key), 'a'):
+                os.utime(self.__entry_path(key), None)
+        except (IOError, OSError):
+            pass
+
+    def invalidate(self, key):
+        try:
+            os.remove(self.__entry_path(key))
+        except OSError:
+            pass
+
+    def __entry_path(self, key):
+        return os.path.join(self.__path, hashlib.sha256(key.encode()).hexdigest())
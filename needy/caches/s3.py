@@ -1,21 +1,26 @@
 import hashlib
-import os
-import distutils.spawn
 import logging
-import subprocess
-import pipes
+import os
+
+from contextlib import contextmanager
 
 from .file_cache import FileCache
-from ..process import command
+from .negative_lookups import NegativeLookups
+from .s3_client import S3Client
+from .. import archive
 
 
 class S3Cache(FileCache):
-    def __init__(self, path):
+    def __init__(self, path, codec='gzip', region=None, endpoint=None, negative_lookup_ttl=5*60):
         if not path.startswith('s3://'):
             raise RuntimeError('s3 cache paths must begin with s3://')
-        if not distutils.spawn.find_executable('aws'):
-            raise RuntimeError('The aws cli is required for the s3 cache')
         self.__path = path
+        self.__codec = archive.codec(codec).identifier()
+        bucket, _, self.__prefix = path[len('s3://'):].partition('/')
+        self.__client = S3Client(bucket, region=region, endpoint=endpoint)
+        # misses are remembered per bucket, prefix, and endpoint so that repeated invocations don't ask again
+        lookups_directory = hashlib.sha256('{} {}'.format(path, endpoint).encode()).hexdigest()
+        self.__negative_lookups = NegativeLookups(os.path.join('~', '.needy', 'negative-lookups', lookups_directory), negative_lookup_ttl)
 
     @staticmethod
     def type():
@@ -23,25 +28,47 @@ class S3Cache(FileCache):
 
     @staticmethod
     def from_dict(d):
-        return S3Cache(path=d['path'])
+        return S3Cache(path=d['path'], codec=d.get('codec', 'gzip'), region=d.get('region'), endpoint=d.get('endpoint'),
+                       negative_lookup_ttl=d.get('negative-lookup-ttl', 5*60))
+
+    def is_remote(self):
+        return True
+
+    def codec(self):
+        return self.__codec
 
     def description(self):
         return self.__path if self.__path else ''
 
     def set(self, key, source):
-        command(['aws', 's3', 'cp', source, self._object_path(key)], verbosity=logging.DEBUG)
+        logging.debug('Uploading {} to {}'.format(source, self.__path))
+        self.__client.upload_file(self._object_key(key), source)
+        self.__negative_lookups.invalidate(key)
         return True
 
     def get(self, key, destination):
-        proc = subprocess.Popen(['aws', 's3', 'cp', self._object_path(key), destination],
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE)
-        _, err = proc.communicate()
-        if proc.returncode:
-            if '(404)' in err:
-                return False
-            raise RuntimeError('unable to retrieve cache object {}:\n{}'.format(self._object_path(key), err))
+        if self.__negative_lookups.is_missing(key):
+            return False
+        if not self.__client.download_file(self._object_key(key), destination):
+            self.__negative_lookups.record_miss(key)
+            return False
         return True
 
-    def _object_path(self, key):
-        return os.path.join(self.__path, hashlib.sha256(key.encode()).hexdigest())
+    @contextmanager
+    def open_read(self, key):
+        if self.__negative_lookups.is_missing(key):
+            yield None
+            return
+        f = self.__client.open(self._object_key(key))
+        if f is None:
+            self.__negative_lookups.record_miss(key)
+            yield None
+            return
+        try:
+            yield f
+        finally:
+            # consumers can stop early, such as when extraction fails, and the prefetched parts shouldn't outlive them
+            f.close()
+
+    def _object_key(self, key):
+        return '/'.join([p for p in [self.__prefix.strip('/'), hashlib.sha256(key.encode()).hexdigest()] if p])
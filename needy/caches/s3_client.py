@@ -0,0 +1,323 @@
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+try:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+except ImportError:
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+
+try:
+    from urllib.parse import quote, urlparse
+except ImportError:
+    from urllib import quote
+    from urlparse import urlparse
+
+from .aws_credentials import CredentialProvider
+
+
+class S3Error(RuntimeError):
+    def __init__(self, status, message):
+        RuntimeError.__init__(self, 'S3 request failed with status {}: {}'.format(status, message))
+        self.status = status
+
+
+class S3Client:
+    """ A minimal S3 client that keeps connections alive between requests and transfers large objects in parts.
+
+    Requests are signed with AWS signature version 4 using credentials from the standard provider chain. If the bucket
+    turns out to be in another region, requests follow the region S3 reports and are signed again.
+    """
+
+    def __init__(self, bucket, region=None, endpoint=None, credentials=None, part_size=16 * 1024 * 1024, threads=8, max_attempts=5):
+        self.__bucket = bucket
+        self.__endpoint = endpoint
+        self.__credentials = CredentialProvider(credentials)
+        self.__part_size = part_size
+        self.__threads = threads
+        self.__max_attempts = max_attempts
+        self.__set_region(region or S3Client.default_region())
+
+        # connections are pooled per host since the host changes when requests are redirected to another region
+        self.__connections = {}
+        self.__connections_lock = threading.Lock()
+
+    def part_size(self):
+        return self.__part_size
+
+    @staticmethod
+    def default_region():
+        region = os.environ.get('AWS_REGION', os.environ.get('AWS_DEFAULT_REGION'))
+        if not region:
+            region = CredentialProvider.config_file('config').get('region')
+        # buckets in other regions are found through the redirects that S3 responds with
+        return region or 'us-east-1'
+
+    def head(self, key):
+        """ returns the size of the object, or None if it doesn't exist """
+        status, headers, _ = self.__request('HEAD', key, expected=[200, 404])
+        return int(headers['content-length']) if status == 200 else None
+
+    def get(self, key, start=None, end=None):
+        """ returns the object's content, optionally limited to the inclusive byte range start-end """
+        headers = {'Range': 'bytes={}-{}'.format(start, end)} if start is not None else {}
+        _, _, body = self.__request('GET', key, headers=headers, expected=[200, 206])
+        return body
+
+    def put(self, key, data):
+        self.__request('PUT', key, body=data)
+
+    def upload_file(self, key, path):
+        """ uploads the file at path, in parallel parts if it's large """
+        size = os.path.getsize(path)
+        if size <= self.__part_size:
+            with open(path, 'rb') as f:
+                self.put(key, f.read())
+            return
+
+        _, _, body = self.__request('POST', key, query={'uploads': ''})
+        upload_id = S3Client.__xml_value(body, 'UploadId')
+        try:
+            part_count = (size + self.__part_size - 1) // self.__part_size
+            etags = {}
+
+            def upload_part(number):
+                with open(path, 'rb') as f:
+                    f.seek((number - 1) * self.__part_size)
+                    data = f.read(self.__part_size)
+                _, headers, _ = self.__request('PUT', key, query={'partNumber': str(number), 'uploadId': upload_id}, body=data)
+                etags[number] = headers['etag']
+
+            self.__run_parallel(upload_part, range(1, part_count + 1))
+
+            parts = ''.join(['<Part><PartNumber>{}</PartNumber><ETag>{}</ETag></Part>'.format(number, etags[number]) for number in sorted(etags)])
+            _, _, body = self.__request('POST', key, query={'uploadId': upload_id}, body='<CompleteMultipartUpload>{}</CompleteMultipartUpload>'.format(parts).encode())
+            # completion can fail after a 200 response has begun, in which case the body contains the error
+            if S3Client.__xml_value(body, 'Code'):
+                raise S3Error(200, body.decode('utf-8', 'replace'))
+        except:
+            self.__request('DELETE', key, query={'uploadId': upload_id}, expected=[204, 404])
+            raise
+
+    def download_file(self, key, path):
+        """ downloads the object to path in parallel parts. returns False if it doesn't exist """
+        size = self.head(key)
+        if size is None:
+            return False
+        with open(path, 'wb') as f:
+            f.truncate(size)
+
+        def download_part(start):
+            data = self.get(key, start, min(start + self.__part_size, size) - 1)
+            with open(path, 'r+b') as f:
+                f.seek(start)
+                f.write(data)
+
+        self.__run_parallel(download_part, range(0, size, self.__part_size))
+        return True
+
+    def open(self, key):
+        """ returns a file-like object that reads the object while prefetching parts in parallel, or None if it doesn't exist """
+        size = self.head(key)
+        if size is None:
+            return None
+        return _PrefetchingReader(self, key, size, self.__part_size, self.__threads)
+
+    def close(self):
+        with self.__connections_lock:
+            for connections in self.__connections.values():
+                for connection in connections:
+                    connection.close()
+            self.__connections = {}
+
+    def __set_region(self, region):
+        self.__region = region
+        if self.__endpoint:
+            url = urlparse(self.__endpoint)
+            self.__secure = url.scheme == 'https'
+            self.__host = url.netloc
+            self.__path_prefix = '/' + self.__bucket
+        elif '.' in self.__bucket:
+            # dotted bucket names don't match the wildcard certificate of virtual-hosted addresses
+            self.__secure = True
+            self.__host = 's3.{}.amazonaws.com'.format(region)
+            self.__path_prefix = '/' + self.__bucket
+        else:
+            self.__secure = True
+            self.__host = '{}.s3.{}.amazonaws.com'.format(self.__bucket, region)
+            self.__path_prefix = ''
+
+    def __run_parallel(self, function, arguments):
+        arguments = list(arguments)
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            while not errors:
+                with lock:
+                    if not arguments:
+                        return
+                    argument = arguments.pop(0)
+                try:
+                    function(argument)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(min(self.__threads, len(arguments)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def __request(self, method, key, query={}, headers={}, body=b'', expected=[200]):
+        query_string = '&'.join(['{}={}'.format(quote(k, safe='~'), quote(v, safe='~')) for k, v in sorted(query.items())])
+        redirected = False
+
+        attempt = 0
+        while True:
+            if attempt:
+                # exponential backoff with jitter
+                time.sleep(min(0.1 * 2 ** attempt, 5) * (0.5 + random.random()))
+            attempt += 1
+            host, path_prefix, region = self.__host, self.__path_prefix, self.__region
+            path = path_prefix + '/' + quote(key, safe='/~')
+            url = path + ('?' + query_string if query_string else '')
+            request_headers = self.__signed_headers(method, host, region, path, query_string, headers, body)
+            connection = self.__acquire_connection(host)
+            try:
+                connection.request(method, url, body=body if body else None, headers=request_headers)
+                response = connection.getresponse()
+                response_body = response.read()
+            except (HTTPException, IOError, OSError) as e:
+                connection.close()
+                if attempt == self.__max_attempts:
+                    raise S3Error(None, str(e))
+                continue
+            self.__release_connection(host, connection)
+
+            response_headers = dict((k.lower(), v) for k, v in response.getheaders())
+            if response.status in expected:
+                return response.status, response_headers, response_body
+            if response.status in [301, 307, 400] and not redirected:
+                bucket_region = response_headers.get('x-amz-bucket-region') or S3Client.__xml_value(response_body, 'Region')
+                if bucket_region and bucket_region != region:
+                    logging.debug('{} is in {}, not {}'.format(self.__bucket, bucket_region, region))
+                    with self.__connections_lock:
+                        self.__set_region(bucket_region)
+                    # the redirect doesn't count as an attempt
+                    redirected = True
+                    attempt -= 1
+                    continue
+            if response.status not in [429, 500, 502, 503, 504] or attempt == self.__max_attempts:
+                raise S3Error(response.status, '{} {}\n{}'.format(method, url, response_body.decode('utf-8', 'replace')))
+
+    def __signed_headers(self, method, host, region, path, query_string, headers, body):
+        ret = dict(headers)
+        ret['Host'] = host
+        credentials = self.__credentials.get()
+        access_key, secret_key, session_token = credentials.access_key, credentials.secret_key, credentials.session_token
+        amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        date = amz_date[:8]
+        ret['x-amz-date'] = amz_date
+        ret['x-amz-content-sha256'] = hashlib.sha256(body).hexdigest()
+        if session_token:
+            ret['x-amz-security-token'] = session_token
+
+        signed = sorted([(k.lower(), str(v).strip()) for k, v in ret.items()])
+        signed_headers = ';'.join([k for k, _ in signed])
+        canonical_query = '&'.join(sorted(query_string.split('&'))) if query_string else ''
+        canonical_request = '\n'.join([method, path, canonical_query, ''.join(['{}:{}\n'.format(k, v) for k, v in signed]), signed_headers, ret['x-amz-content-sha256']])
+        scope = '{}/{}/s3/aws4_request'.format(date, region)
+        string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()])
+
+        key = ('AWS4' + secret_key).encode()
+        for part in [date, region, 's3', 'aws4_request']:
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = binascii.hexlify(hmac.new(key, string_to_sign.encode(), hashlib.sha256).digest()).decode()
+
+        ret['Authorization'] = 'AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, Signature={}'.format(access_key, scope, signed_headers, signature)
+        return ret
+
+    def __acquire_connection(self, host):
+        with self.__connections_lock:
+            if self.__connections.get(host):
+                return self.__connections[host].pop()
+        return HTTPSConnection(host, timeout=60) if self.__secure else HTTPConnection(host, timeout=60)
+
+    def __release_connection(self, host, connection):
+        with self.__connections_lock:
+            self.__connections.setdefault(host, []).append(connection)
+
+    @staticmethod
+    def __xml_value(body, tag):
+        try:
+            root = ElementTree.fromstring(body)
+        except ElementTree.ParseError:
+            return None
+        for element in root.iter():
+            if element.tag == tag or element.tag.endswith('}' + tag):
+                return element.text
+        return None
+
+
+class _PrefetchingReader:
+    def __init__(self, client, key, size, part_size, threads):
+        self.__client = client
+        self.__key = key
+        self.__size = size
+        self.__part_size = part_size
+        self.__threads = threads
+        self.__next_start = 0
+        self.__pending = []
+        self.__buffer = b''
+        self.__offset = 0
+        self.closed = False
+        self.__fill_window()
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        while self.__pending and (size < 0 or len(self.__buffer) - self.__offset < size):
+            thread, result = self.__pending.pop(0)
+            thread.join()
+            if not isinstance(result[0], bytes):
+                raise result[0]
+            self.__buffer = self.__buffer[self.__offset:] + result[0]
+            self.__offset = 0
+            self.__fill_window()
+        end = len(self.__buffer) if size < 0 else min(self.__offset + size, len(self.__buffer))
+        ret = self.__buffer[self.__offset:end]
+        self.__offset = end
+        return ret
+
+    def close(self):
+        """ stops prefetching. parts that are already being downloaded finish in the background and are discarded """
+        self.closed = True
+        self.__pending = []
+        self.__buffer = b''
+
+    def __fill_window(self):
+        while len(self.__pending) < self.__threads and self.__next_start < self.__size:
+            start, end = self.__next_start, min(self.__next_start + self.__part_size, self.__size) - 1
+            result = [None]
+
+            def fetch(start=start, end=end, result=result):
+                try:
+                    result[0] = self.__client.get(self.__key, start, end)
+                except Exception as e:
+                    result[0] = e
+
+            thread = threading.Thread(target=fetch)
+            thread.daemon = True
+            thread.start()
+            self.__pending.append((thread, result))
+            self.__next_start = end + 1
@@ -0,0 +1,116 @@
+import logging
+import os
+
+from contextlib import contextmanager
+from functools import partial
+
+from .file_cache import FileCache
+from ..filesystem import TempDir
+
+
+class TieredCache(FileCache):
+    """ Layers caches from nearest to farthest, such as a local directory in front of a bucket.
+
+    Objects found in a farther tier are copied into the nearer tiers, so repeated restores become local reads. Objects
+    are stored in the local tiers first. Given an uploader, stores to remote tiers are then handed to it and read back
+    from a local tier, so a slow bucket doesn't delay the local copy or hold up other uploads.
+    """
+
+    def __init__(self, tiers):
+        if not tiers:
+            raise ValueError('tiered caches need at least one tier')
+        if any([tier.stores_directories() for tier in tiers]):
+            raise ValueError('tiered caches can only contain caches that store archives')
+        if len(set([tier.codec() for tier in tiers])) > 1:
+            raise ValueError('all tiers of a tiered cache must use the same codec')
+        self.__tiers = tiers
+        self.__uploader = None
+
+    @staticmethod
+    def type():
+        return 'tiered'
+
+    @staticmethod
+    def from_dict(d):
+        from . import cache_from_dict
+        return TieredCache([cache_from_dict(tier) for tier in d['tiers']])
+
+    def tiers(self):
+        return self.__tiers
+
+    def is_remote(self):
+        return all([tier.is_remote() for tier in self.__tiers])
+
+    def set_uploader(self, uploader):
+        self.__uploader = uploader
+        for tier in self.__tiers:
+            tier.set_uploader(uploader)
+
+    def codec(self):
+        return self.__tiers[0].codec()
+
+    def description(self):
+        return ' -> '.join([tier.description() for tier in self.__tiers])
+
+    def set(self, key, source):
+        local_tiers = [tier for tier in self.__tiers if not tier.is_remote()]
+        remote_tiers = [tier for tier in self.__tiers if tier.is_remote()]
+        stored = False
+        for tier in local_tiers:
+            stored = tier.set(key, source) or stored
+        if not stored or self.__uploader is None:
+            # the source may be gone once set returns, so without a local copy the remote tiers are written now
+            for tier in remote_tiers:
+                stored = tier.set(key, source) or stored
+            return stored
+        for tier in remote_tiers:
+            self.__uploader.submit('{} to {}'.format(key, tier.description()), partial(self.__upload, key, local_tiers, tier))
+        return True
+
+    def get(self, key, destination):
+        return self.__get(key, destination, 0)
+
+    @contextmanager
+    def open_read(self, key):
+        with self.__tiers[0].open_read(key) as f:
+            if f is not None:
+                yield f
+                return
+        with TempDir() as d:
+            path = os.path.join(d, 'object')
+            if not self.__get(key, path, 1):
+                yield None
+                return
+            with open(path, 'rb') as f:
+                yield f
+
+    def prune(self):
+        for tier in self.__tiers:
+            tier.prune()
+
+    def prune_if_due(self, minimum_interval=60*60):
+        return any([tier.prune_if_due(minimum_interval) for tier in self.__tiers])
+
+    def __get(self, key, destination, first_tier):
+        for i in range(first_tier, len(self.__tiers)):
+            if self.__tiers[i].get(key, destination):
+                self.__promote(key, destination, self.__tiers[:i])
+                return True
+        return False
+
+    @staticmethod
+    def __upload(key, local_tiers, tier):
+        with TempDir() as d:
+            path = os.path.join(d, 'object')
+            if not any(local_tier.get(key, path) for local_tier in local_tiers):
+                raise RuntimeError('{} is no longer in the local tiers'.format(key))
+            tier.set(key, path)
+
+    @staticmethod
+    def __promote(key, source, tiers):
+        for tier in tiers:
+            try:
+                tier.set(key, source)
+            except Exception as e:
+                # the object was still found, so failing to promote it isn't fatal
+                logging.warning('unable to copy {} into {}: {}'.format(key, tier.description(), e))
@@ -4,6 +4,7 @@ import importlib
 def available_commands():
     commands = [getattr(importlib.import_module(cmd[0], package=__name__), cmd[1])() for cmd in [
         ('.builddir', 'BuildDirCommand'),
+        ('.cache', 'CacheCommand'),
         ('.cflags', 'CFlagsCommand'),
         ('.dev', 'DevCommand'),
         ('.clean', 'CleanCommand'),
@@ -0,0 +1,35 @@
+import importlib
+
+from ...command import Command
+
+
+def available_commands():
+    commands = [getattr(importlib.import_module(cmd[0], package=__name__), cmd[1])() for cmd in [
+        ('.prune', 'PruneCommand'),
+        ('.stats', 'StatsCommand'),
+    ]]
+    return {command.name(): command for command in commands}
+
+
+class CacheCommand(Command):
+    def name(self):
+        return 'cache'
+
+    def add_parser(self, group):
+        parser = group.add_parser(
+            self.name(),
+            description='Provides tools to manage the build caches configured in .needyconfig files.',
+            help='provides tools for managing build caches'
+        )
+
+        subgroup = parser.add_subparsers(
+            title='commands',
+            description='Use \'needy cache <command> --help\' to get help for a specific command.',
+            dest='cache_command',
+            metavar='command'
+        )
+        for name, command in available_commands().items():
+            command.add_parser(subgroup)
+
+    def execute(self, arguments):
+        return available_commands()[arguments.cache_command].execute(arguments)
@@ -0,0 +1,23 @@
+import logging
+
+from ... import command
+from ...needy_configuration import NeedyConfiguration
+
+
+class PruneCommand(command.Command):
+    def name(self):
+        return 'prune'
+
+    def add_parser(self, group):
+        group.add_parser(
+            self.name(),
+            description='Removes expired objects from the build caches. Builds only prune occasionally, so this is suitable for running periodically, e.g. from cron.',
+            help='prunes the build caches'
+        )
+
+    def execute(self, arguments):
+        for cache in NeedyConfiguration('.').build_caches():
+            logging.info('Pruning {}'.format(cache.description()))
+            if not cache.prune_if_due(minimum_interval=0):
+                cache.prune()
+        return 0
@@ -0,0 +1,68 @@
+import logging
+import os
+
+from ... import command
+from ...cache_stats import CacheStats
+from ...needy import Needy
+from ...utility import Fore, Style
+
+
+class StatsCommand(command.Command):
+    def name(self):
+        return 'stats'
+
+    def add_parser(self, group):
+        parser = group.add_parser(
+            self.name(),
+            description='Shows how the build caches have performed for this project: hits, misses, and errors, and the bytes and time spent on transfers, compression, and extraction.',
+            help='shows build cache statistics'
+        )
+        parser.add_argument('--reset', action='store_true', help='discard the recorded statistics')
+
+    def execute(self, arguments):
+        needs_directory = Needy.resolve_needs_directory('.')
+        if needs_directory is None:
+            logging.error('No needs file found. Cache statistics are recorded per project, so run this from a needy project.')
+            return 1
+        stats = CacheStats(os.path.join(needs_directory, 'cache-stats'))
+
+        if arguments.reset:
+            stats.reset()
+            return 0
+
+        summary = stats.summary()
+        if not summary:
+            print('No build cache operations have been recorded.')
+            return 0
+
+        cache = None
+        for (cache_description, library, target), totals in summary.items():
+            if cache_description != cache:
+                cache = cache_description
+                print(Style.BRIGHT + cache + Style.RESET_ALL)
+            lookups = totals['hits'] + totals['misses'] + totals['get-errors']
+            color = Fore.GREEN if lookups and totals['hits'] == lookups else (Fore.RED if totals['get-errors'] or totals['set-errors'] else Fore.YELLOW)
+            print(color + '    {} ({})'.format(library, target) + Fore.RESET)
+            if lookups:
+                print('      gets: {} hit{}, {} miss{}, {} error{} ({:.0%} hit rate), {} downloaded in {:.2f}s, {:.2f}s extracting'.format(
+                    totals['hits'], 's' if totals['hits'] != 1 else '',
+                    totals['misses'], 'es' if totals['misses'] != 1 else '',
+                    totals['get-errors'], 's' if totals['get-errors'] != 1 else '',
+                    float(totals['hits']) / lookups,
+                    StatsCommand.__format_bytes(totals['bytes-downloaded']), totals['download-time'], totals['extraction-time']
+                ))
+            stores = totals['stored'] + totals['skipped'] + totals['set-errors']
+            if stores:
+                print('      sets: {} stored, {} skipped, {} error{}, {} uploaded in {:.2f}s, {:.2f}s compressing'.format(
+                    totals['stored'], totals['skipped'],
+                    totals['set-errors'], 's' if totals['set-errors'] != 1 else '',
+                    StatsCommand.__format_bytes(totals['bytes-uploaded']), totals['upload-time'], totals['compression-time']
+                ))
+        return 0
+
+    @staticmethod
+    def __format_bytes(size):
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024 or unit == 'GB':
+                return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(size)
+            size /= 1024.0
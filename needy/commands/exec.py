@@ -13,13 +13,15 @@ class ExecCommand(command.Command):
         short_description = 'invoke a command from the source directory of a need'
         parser = group.add_parser(self.name(), description=short_description.capitalize()+'.', help=short_description)
         parser.add_argument('library', help='the library who\'s source directory will be used').completer = command.library_completer
+        command.add_target_specification_args(parser, 'invokes the command', allow_universal_binary=False)
         parser.add_argument('command', help='command to invoke')
         parser.add_argument('args', default=[], nargs=argparse.REMAINDER, help='arguments for the command')
 
     def execute(self, arguments):
         with ConfiguredNeedy('.', arguments) as needy:
-            if not os.path.isdir(needy.source_directory(arguments.library)):
+            source_directory = needy.source_directory(arguments.library, needy.target(arguments.target))
+            if not os.path.isdir(source_directory):
                 raise RuntimeError('Please initialize the library before using exec.')
 
-        os.chdir(needy.source_directory(arguments.library))
+        os.chdir(source_directory)
         os.execvp(arguments.command, [arguments.command] + arguments.args)
@@ -12,8 +12,9 @@ class SourceDirCommand(command.Command):
         short_description = 'gets the source directory for a need'
         parser = group.add_parser(self.name(), description=short_description.capitalize()+'.', help=short_description)
         parser.add_argument('library', help='the library to get the directory for').completer = command.library_completer
+        command.add_target_specification_args(parser, 'gets the directory', allow_universal_binary=False)
 
     def execute(self, arguments):
         with ConfiguredNeedy('.', arguments) as needy:
-            print(needy.source_directory(arguments.library), end='')
+            print(needy.source_directory(arguments.library, needy.target(arguments.target)), end='')
         return 0
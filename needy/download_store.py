@@ -0,0 +1,80 @@
+import logging
+import os
+import uuid
+
+from .filesystem import reflink_or_copy
+
+
+class DownloadStore:
+    """ A machine-wide store of downloads keyed by their checksums, shared between projects.
+
+    Entries are read-only, and projects get their own copies of them, so nothing a project does to its download can
+    change the entry. Copies are reflinks when the filesystem supports them, which share storage without sharing writes.
+    """
+
+    def __init__(self, path):
+        self.__path = os.path.expanduser(path)
+
+    @staticmethod
+    def from_dict(d):
+        config = d if isinstance(d, dict) else {'path': d}
+        return DownloadStore(path=config['path'])
+
+    def path(self):
+        return self.__path
+
+    def get(self, checksum, destination):
+        """ copies the stored download to destination. returns False if the store doesn't have it. the copy isn't
+        verified, so callers should check it against the checksum and remove bad entries """
+        path = self.__entry_path(checksum)
+        if not os.path.isfile(path):
+            return False
+        if os.path.lexists(destination):
+            os.remove(destination)
+        elif not os.path.exists(os.path.dirname(destination)):
+            os.makedirs(os.path.dirname(destination))
+        reflink_or_copy(path, destination)
+        os.chmod(destination, 0o644)
+        logging.debug('Copied {} from the download store'.format(destination))
+        return True
+
+    def insert(self, checksum, source):
+        """ adds a verified download to the store. if the store already has it, it's left unchanged """
+        path = self.__entry_path(checksum)
+        if os.path.isfile(path):
+            return
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+        # entries are staged under unique names and renamed into place so that readers never see incomplete files
+        temp_path = os.path.join(directory, '.tmp{}'.format(uuid.uuid4().hex))
+        try:
+            reflink_or_copy(source, temp_path)
+            os.chmod(temp_path, 0o444)
+            os.rename(temp_path, path)
+        except OSError:
+            if not os.path.isfile(path):
+                raise
+        finally:
+            if os.path.exists(temp_path):
+                DownloadStore.__remove(temp_path)
+
+    def remove(self, checksum):
+        """ removes the entry, such as one that turned out to be corrupt """
+        path = self.__entry_path(checksum)
+        if os.path.isfile(path):
+            DownloadStore.__remove(path)
+
+    @staticmethod
+    def __remove(path):
+        # read-only files can't be removed on windows
+        os.chmod(path, 0o644)
+        os.remove(path)
+
+    def __entry_path(self, checksum):
+        return os.path.join(self.__path, checksum.lower()[:2], checksum.lower())
@@ -0,0 +1,43 @@
+import os
+
+from .cd import current_directory
+
+
+class ExecutionContext:
+    """ The working directory and environment that commands are executed with.
+
+    Unlike cd and OverrideEnvironment, contexts don't modify process-wide state, so builds that use separate contexts
+    can run concurrently.
+    """
+
+    def __init__(self, directory=None, environment=None):
+        self.__directory = os.path.abspath(os.path.expanduser(directory)) if directory else current_directory()
+        self.__environment = dict(environment if environment is not None else os.environ)
+
+    def directory(self):
+        return self.__directory
+
+    def environment(self):
+        """ returns a copy of the environment """
+        return self.__environment.copy()
+
+    def getenv(self, key, default=None):
+        return self.__environment.get(key, default)
+
+    def path(self, *components):
+        """ resolves a path relative to the context's directory """
+        return os.path.join(self.__directory, *components)
+
+    def with_directory(self, directory):
+        """ returns a context with the same environment and the given directory, resolved relative to this one's """
+        return ExecutionContext(self.path(os.path.expanduser(directory)), self.__environment)
+
+    def with_environment(self, overrides):
+        """ returns a context with the given environment variables overridden. variables set to None are removed """
+        environment = self.environment()
+        for key, value in overrides.items():
+            if value is None:
+                environment.pop(key, None)
+            else:
+                environment[key] = value
+        return ExecutionContext(self.__directory, environment)
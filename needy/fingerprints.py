@@ -0,0 +1,28 @@
+import threading
+
+
+class Fingerprints:
+    """ Memoizes configuration fingerprints for the duration of a run.
+
+    Library configurations include the platform configuration, which probes compilers, and are hashed wherever a
+    library's status or cache key is needed. Values are computed the first time they're requested and shared by all
+    of the libraries and threads in the run. Returned values are shared, so they shouldn't be modified.
+    """
+
+    def __init__(self):
+        self.__values = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key, compute):
+        """ returns the value for key, calling compute to produce it if it hasn't been requested before """
+        with self.__lock:
+            if key in self.__values:
+                return self.__values[key]
+        # computed without the lock so that slow computations don't block unrelated lookups
+        value = compute()
+        with self.__lock:
+            return self.__values.setdefault(key, value)
+
+    def platform_configuration(self, target):
+        return self.get(('platform-configuration', target.platform.identifier(), target.architecture),
+                        lambda: target.platform.configuration(target.architecture) or {})
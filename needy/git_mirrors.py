@@ -0,0 +1,84 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from .execution_context import ExecutionContext
+from .filesystem import lock_file
+from .process import command
+
+
+class GitMirrors:
+    """ A machine-wide set of bare mirrors that git sources borrow objects from, so each repository's history is only
+    downloaded and stored once.
+
+    Mirrors are updated under a file lock and a lock shared by the process's threads, and they never prune objects since workspaces that borrow from them may still
+    need objects that are no longer reachable from the mirror's refs.
+    """
+
+    __thread_locks = {}
+    __thread_locks_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.__path = os.path.expanduser(path)
+
+    @staticmethod
+    def from_dict(d):
+        config = d if isinstance(d, dict) else {'path': d}
+        return GitMirrors(path=config['path'])
+
+    def path(self):
+        return self.__path
+
+    def mirror_path(self, repository):
+        name = re.sub(r'[^\w.-]', '_', os.path.basename(repository.rstrip('/')))
+        return os.path.join(self.__path, '{}-{}'.format(hashlib.sha256(repository.encode()).hexdigest()[:16], name))
+
+    def update(self, repository, commit=None, fetch=False):
+        """ makes sure the mirror of the repository exists and has the commit. existing mirrors are fetched if they don't
+        have the commit, or if fetch is True, which is needed to pick up refs that moved. returns the path to the mirror """
+        path = self.mirror_path(repository)
+        if not os.path.exists(self.__path):
+            try:
+                os.makedirs(self.__path)
+            except OSError:
+                if not os.path.isdir(self.__path):
+                    raise
+
+        with GitMirrors.__thread_lock(path):
+            return self.__update(repository, path, commit, fetch)
+
+    @staticmethod
+    def __thread_lock(path):
+        """ file locks don't reliably exclude threads of the same process, so each mirror also has a process-wide lock """
+        with GitMirrors.__thread_locks_lock:
+            return GitMirrors.__thread_locks.setdefault(os.path.realpath(path), threading.Lock())
+
+    def __update(self, repository, path, commit, fetch):
+        fd = lock_file(path + '.lock')
+        try:
+            if not os.path.isdir(path):
+                logging.info('Mirroring {}'.format(repository))
+                temporary_path = path + '.tmp'
+                if os.path.exists(temporary_path):
+                    shutil.rmtree(temporary_path)
+                command(['git', 'clone', '--mirror', repository, temporary_path], logging.DEBUG)
+                command(['git', 'config', 'gc.pruneExpire', 'never'], logging.DEBUG, context=ExecutionContext(temporary_path))
+                os.rename(temporary_path, path)
+            elif fetch or (commit and not GitMirrors.has_commit(path, commit)):
+                logging.info('Updating the mirror of {}'.format(repository))
+                command(['git', 'fetch', '--no-prune', 'origin'], logging.DEBUG, context=ExecutionContext(path))
+        finally:
+            os.close(fd)
+        return path
+
+    @staticmethod
+    def has_commit(path, commit):
+        try:
+            command(['git', 'cat-file', '-e', '{}^{{commit}}'.format(commit)], logging.DEBUG, context=ExecutionContext(path))
+            return True
+        except subprocess.CalledProcessError:
+            return False
@@ -0,0 +1,77 @@
+import os
+import select
+import shlex
+
+from contextlib import contextmanager
+
+
+class JobServer:
+    """ A GNU make compatible job server.
+
+    The server is a pipe holding one token for every job that may run in addition to the one implicitly held by
+    its owner. Commands that are given the server's make flags and file descriptors draw from the same budget, so
+    the total number of jobs stays within it no matter how many builds are sharing it.
+    """
+
+    def __init__(self, slots):
+        if slots < 1:
+            raise ValueError('job servers need at least one slot')
+        self.__slots = slots
+        self.__read_fd, self.__write_fd = os.pipe()
+        os.write(self.__write_fd, b'+' * (slots - 1))
+
+    def slots(self):
+        return self.__slots
+
+    def file_descriptors(self):
+        """ the file descriptors that must be inherited by commands using the make flags """
+        return (self.__read_fd, self.__write_fd)
+
+    def make_flags(self, existing=''):
+        """ returns MAKEFLAGS that join the job server, preserving any unrelated flags in existing """
+        flags = [flag for flag in shlex.split(existing) if not JobServer.__is_concurrency_flag(flag)]
+        flags.extend(['-j', '--jobserver-fds={},{}'.format(*self.file_descriptors()), '--jobserver-auth={},{}'.format(*self.file_descriptors())])
+        return ' '.join(flags)
+
+    def acquire(self):
+        """ blocks until a token is available and returns it """
+        return os.read(self.__read_fd, 1)
+
+    def try_acquire(self):
+        """ returns a token if one is immediately available, otherwise None """
+        readable, _, _ = select.select([self.__read_fd], [], [], 0)
+        if not readable:
+            return None
+        # another process may win the race for the token, in which case this blocks until one is released
+        return self.acquire()
+
+    def release(self, token=b'+'):
+        os.write(self.__write_fd, token)
+
+    @contextmanager
+    def slot(self):
+        """ holds a token for the duration of the context """
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    @contextmanager
+    def reserved_slots(self, count):
+        """ holds up to count tokens that are immediately available and yields the number held """
+        tokens = []
+        try:
+            while len(tokens) < count:
+                token = self.try_acquire()
+                if token is None:
+                    break
+                tokens.append(token)
+            yield len(tokens)
+        finally:
+            for token in tokens:
+                self.release(token)
+
+    @staticmethod
+    def __is_concurrency_flag(flag):
+        return flag.startswith('--jobserver-') or flag == '-j' or flag.startswith('-j') and flag[2:].isdigit()
@@ -4,22 +4,25 @@ import json
 import os
 import shutil
 import logging
-import tarfile
 import textwrap
+import time
 
 from operator import itemgetter
 
-from .filesystem import TempDir
+from . import archive
+from .archive import write_archive, extract_archive
+from .cache_stats import TimedReader
+from .filesystem import TempDir, directory_size
 
 from .project import evaluate_conditionals
 from .project import ProjectDefinition
 
-from .sources.download import Download
+from .sources.download import Download, DEFAULT_BUFFER_SIZE
 from .sources.directory import Directory
 from .sources.git import GitRepository
 
-from .cd import cd
-from .override_environment import OverrideEnvironment
+from .execution_context import ExecutionContext
+from .git_mirrors import GitMirrors
 from .target import Target
 from .filesystem import clean_directory
 
@@ -75,16 +78,21 @@ class Library:
         return [str.format(**variables) for str in l]
 
     def clean_source(self):
-        source = self.source()
-        source.clean()
+        # isolated sources for different targets may be cleaned concurrently, but they share downloads and mirrors
+        with self.needy.source_lock(self.name()):
+            source = self.source()
+            source.clean()
 
     def clean_build(self):
         clean_directory(self.build_directory())
 
+    def clean_intermediates(self):
+        if os.path.exists(self.intermediate_directory()):
+            shutil.rmtree(self.intermediate_directory())
+
     def initialize_source(self):
         self.clean_source()
-        with OverrideEnvironment(self.__environment_overrides()):
-            self.__post_clean()
+        self.__post_clean(self.__context())
 
     def synchronize_source(self):
         source = self.source()
@@ -93,18 +101,33 @@ class Library:
     def source(self):
         cfg = self.__configuration
         if 'download' in cfg:
-            return Download(cfg['download'], cfg['checksum'], self.source_directory(), os.path.join(self.directory(), 'download'))
+            needy_configuration = self.needy.needy_configuration()
+            store = needy_configuration.download_store() if needy_configuration else None
+            buffer_size = (needy_configuration.download_buffer_size() if needy_configuration else None) or DEFAULT_BUFFER_SIZE
+            return Download(cfg['download'], cfg['checksum'], self.source_directory(), os.path.join(self.directory(), 'download'),
+                            buffer_size=buffer_size, store=store)
         if 'repository' in cfg:
-            return GitRepository(cfg['repository'], cfg['commit'], self.source_directory())
+            mirrors = self.needy.needy_configuration().git_mirrors() if self.needy.needy_configuration() else None
+            if mirrors is None and self.has_isolated_source():
+                # the targets' clones borrow objects from one mirror instead of each downloading the whole repository
+                mirrors = GitMirrors(os.path.join(self.__directory, 'mirror'))
+            return GitRepository(cfg['repository'], cfg['commit'], self.source_directory(), mirrors=mirrors)
         if 'directory' in cfg:
             return Directory(cfg['directory'] if os.path.isabs(cfg['directory']) else os.path.join(self.needy.path(), cfg['directory']), self.source_directory())
         raise ValueError('no source specified in configuration')
 
-    def build(self):
-        if not self.needy.parameters().force_build and not self.is_in_development_mode():
-            if self.__load_cached_artifacts():
-                logging.info('Build restored from cache')
-                return True
+    def restore_from_cache(self):
+        """ restores the build from the first build cache that has it. returns False if none of them do """
+        if self.needy.parameters().force_build or self.is_in_development_mode():
+            return False
+        if not self.__load_cached_artifacts():
+            return False
+        logging.info('Build restored from cache')
+        return True
+
+    def build(self, check_caches=True):
+        if check_caches and self.restore_from_cache():
+            return True
 
         logging.info('Building for %s %s' % (self.target().platform.identifier(), self.target().architecture))
 
@@ -115,58 +138,58 @@ class Library:
         if not self.is_in_development_mode():
             self.clean_source()
 
-        with OverrideEnvironment(self.__environment_overrides()):
-            if not self.is_in_development_mode():
-                self.__post_clean()
+        context = self.__context()
 
-            configuration = self.project_configuration()
+        if not self.is_in_development_mode():
+            self.__post_clean(context)
 
-            project = self.project(ProjectDefinition(self.target(), self.project_root(), configuration))
-            if not project:
-                raise RuntimeError('unknown project type')
+        configuration = self.project_configuration()
+
+        project = self.project(ProjectDefinition(self.target(), self.project_root(), configuration, self.intermediate_directory(), context, name=self.name()))
+        if not project:
+            raise RuntimeError('unknown project type')
 
-            unrecognized_configuration_keys = set(configuration.keys()) - project.configuration_keys() - self.additional_project_configuration_keys()
-            if len(unrecognized_configuration_keys):
-                raise RuntimeError('unrecognized project configuration keys: {}'.format(', '.join(unrecognized_configuration_keys)))
+        unrecognized_configuration_keys = set(configuration.keys()) - project.configuration_keys() - self.additional_project_configuration_keys()
+        if len(unrecognized_configuration_keys):
+            raise RuntimeError('unrecognized project configuration keys: {}'.format(', '.join(unrecognized_configuration_keys)))
 
-            project.set_string_format_variables(**self.string_format_variables())
+        project.set_string_format_variables(**self.string_format_variables())
 
-            if not self.is_in_development_mode():
-                self.clean_build()
+        if not self.is_in_development_mode():
+            self.clean_build()
 
-            self.__actualize(project)
-            self.__write_build_status()
-            if not self.is_in_development_mode():
-                self.__cache_artifacts()
+        self.__actualize(project)
+        self.__write_build_status()
+        if not self.is_in_development_mode() and self.__build_caches:
+            # the build directory is final at this point, so dependents don't need to wait for the upload
+            self.needy.uploader().submit('{} for {}'.format(self.name(), self.target()), self.__cache_artifacts)
 
         return True
 
-    def __post_clean(self):
+    def __post_clean(self, context):
         configuration = self.project_configuration()
         post_clean_commands = configuration['post-clean'] if 'post-clean' in configuration else []
-        with cd(self.project_root()):
-            for cmd in self.evaluate(post_clean_commands):
-                command(cmd)
+        for cmd in self.evaluate(post_clean_commands):
+            command(cmd, context=context)
 
     def __actualize(self, project):
         build_directory = self.build_directory()
         configuration = self.project_configuration()
-        with cd(self.project_root()):
-            try:
-                project.setup()
-                if 'configure-steps' in configuration:
-                    project.run_commands(configuration['configure-steps'])
-                else:
-                    project.configure(build_directory)
-                project.pre_build(build_directory)
-                project.build(build_directory)
-                project.post_build(build_directory)
-                Library.make_pkgconfigs_relocatable(build_directory)
-                if self.__should_generate_pkgconfig():
-                    self.generate_pkgconfig(build_directory, self.name())
-            except:
-                shutil.rmtree(build_directory)
-                raise
+        try:
+            project.setup()
+            if 'configure-steps' in configuration:
+                project.run_commands(configuration['configure-steps'])
+            else:
+                project.configure(build_directory)
+            project.pre_build(build_directory)
+            project.build(build_directory)
+            project.post_build(build_directory)
+            Library.make_pkgconfigs_relocatable(build_directory)
+            if self.__should_generate_pkgconfig():
+                self.generate_pkgconfig(build_directory, self.name())
+        except:
+            shutil.rmtree(build_directory)
+            raise
 
     def __should_generate_pkgconfig(self):
         def is_empty(path):
@@ -185,35 +208,87 @@ class Library:
         if not self.__build_caches:
             return False
         with TempDir() as temp_dir:
-            temp_tar = os.path.join(temp_dir, 'temp')
-            tar = tarfile.open(temp_tar, 'w:gz')
-            tar.add(self.build_directory(), arcname='.')
-            tar.close()
+            archives = {}
             for cache in self.__build_caches:
-                if cache.set(self.__cache_key(), temp_tar):
-                    d = self.configuration_dict()
-                    logging.debug('cache object hash {} formed from...\n{}'.format(
-                        binascii.hexlify(self.configuration_hash(d)),
-                        json.dumps(d, sort_keys=True, indent=4, separators=(',', ': ')))
-                    )
+                compression_time = 0
+                start = time.time()
+                try:
+                    if cache.stores_directories():
+                        size = directory_size(self.build_directory())
+                        stored = cache.set_directory(self.__cache_key(), self.build_directory())
+                    else:
+                        codec = cache.codec()
+                        if codec not in archives:
+                            archives[codec] = os.path.join(temp_dir, codec)
+                            with open(archives[codec], 'wb') as f:
+                                write_archive(self.build_directory(), f, archive.codec(codec))
+                            compression_time = time.time() - start
+                        size = os.path.getsize(archives[codec])
+                        stored = cache.set(self.__cache_key(codec), archives[codec])
+                except Exception:
+                    self.__record_cache_operation('set', 'error', cache, compression_time=compression_time, transfer_time=time.time() - start - compression_time)
+                    raise
+                self.__record_cache_operation('set', 'stored' if stored else 'skipped', cache, bytes=size if stored else 0,
+                                              compression_time=compression_time, transfer_time=time.time() - start - compression_time)
+                if stored:
+                    self.__log_cache_object()
+                    cache.prune_if_due()
                     return True
         return False
 
+    def __log_cache_object(self):
+        d = self.configuration_dict()
+        logging.debug('cache object hash {} formed from...\n{}'.format(
+            binascii.hexlify(self.configuration_hash(d)),
+            json.dumps(d, sort_keys=True, indent=4, separators=(',', ': ')))
+        )
+
     def __load_cached_artifacts(self):
-        with TempDir() as temp_dir:
-            temp_tar = os.path.join(temp_dir, 'artifacts.tgz')
-            for cache in self.__build_caches:
-                if cache.get(self.__cache_key(), temp_tar):
-                    tar = tarfile.open(temp_tar, 'r:gz')
-                    tar.extractall(path=self.build_directory())
-                    tar.close()
-                    return True
+        for cache in self.__build_caches:
+            start = time.time()
+            try:
+                if cache.stores_directories():
+                    hit = cache.get_directory(self.__cache_key(), self.build_directory())
+                    stats = {'bytes': directory_size(self.build_directory()) if hit else 0, 'transfer_time': time.time() - start}
+                else:
+                    with cache.open_read(self.__cache_key(cache.codec())) as f:
+                        hit = f is not None
+                        lookup_time = time.time() - start
+                        stats = {'transfer_time': lookup_time}
+                        if hit:
+                            # archives are extracted as they're read, so time spent waiting on the cache is transfer time
+                            reader = TimedReader(f)
+                            extract_archive(reader, self.build_directory(), archive.codec(cache.codec()))
+                            stats = {
+                                'bytes': reader.bytes_read(),
+                                'transfer_time': lookup_time + reader.read_time(),
+                                'extraction_time': time.time() - start - lookup_time - reader.read_time(),
+                            }
+            except Exception:
+                self.__record_cache_operation('get', 'error', cache, transfer_time=time.time() - start)
+                raise
+            self.__record_cache_operation('get', 'hit' if hit else 'miss', cache, **stats)
+            if hit:
+                return True
         return False
 
-    def __cache_key(self):
+    def __record_cache_operation(self, operation, result, cache, **kwargs):
+        try:
+            self.needy.cache_stats().record(operation, result, self.name(), str(self.target()),
+                                            '{} {}'.format(cache.type(), cache.description()), **kwargs)
+        except (IOError, OSError) as e:
+            logging.debug('unable to record cache stats: {}'.format(e))
+
+    def __cache_key(self, codec='gzip'):
         configuration_hash = binascii.hexlify(self.configuration_hash()).decode()
         path = os.path.relpath(self.build_directory(), self.needy.needs_directory())
-        return os.path.join(path, configuration_hash)
+        key = os.path.join(path, configuration_hash)
+        # gzip keys predate codec selection, so they're left unchanged to keep existing cache objects usable
+        return key if codec == archive.GzipCodec.identifier() else '{}.{}'.format(key, codec)
+
+    def __context(self):
+        """ the context that the library's commands are executed with """
+        return ExecutionContext(self.project_root()).with_environment(self.__environment_overrides())
 
     def __environment_overrides(self):
         configuration = self.project_configuration()
@@ -277,18 +352,34 @@ class Library:
         return self.__directory
 
     def build_directory(self):
-        directory = os.path.join(self.__directory, 'build', self.target().platform.identifier(), self.target().architecture)
-        suffix = self.configuration().get('build-directory-suffix')
+        return os.path.join(self.__directory, 'build', Library.target_directory(self.target(), self.configuration()))
+
+    @staticmethod
+    def target_directory(target, configuration):
+        """ the relative path that separates the target's build, intermediate, and isolated source directories """
+        directory = os.path.join(target.platform.identifier(), target.architecture)
+        suffix = configuration.get('build-directory-suffix') if configuration else None
         if suffix:
             directory = os.path.join(directory, suffix.lstrip(os.path.sep))
         return directory
 
+    def intermediate_directory(self):
+        return os.path.join(self.__directory, 'intermediate', Library.target_directory(self.target(), self.configuration()))
+
     def build_status_path(self):
         return os.path.join(self.build_directory(), 'needy.status')
 
     def source_directory(self):
+        if self.has_isolated_source():
+            return os.path.join(self.__directory, 'isolated-source', Library.target_directory(self.target(), self.configuration()))
         return os.path.join(self.__directory, 'source')
 
+    def has_isolated_source(self):
+        """ whether each target is built in its own source directory, which lets targets be built concurrently.
+        libraries in development mode are always built in the shared source directory. git sources without configured
+        mirrors get one of their own, so the repository is still only downloaded once """
+        return bool(self.__configuration and self.__configuration.get('isolated-source')) and not self.is_in_development_mode()
+
     def project_root(self):
         configuration = self.project_configuration()
         return os.path.join(self.source_directory(), configuration['root']) if 'root' in configuration else self.source_directory()
@@ -316,23 +407,22 @@ class Library:
 
         logging.debug('project candidates ordered by number of valid configuration keys: {}'.format(', '.join([c.identifier() for c in candidates])))
         logging.debug('evaluating candidates in {}'.format(definition.directory))
-        with cd(definition.directory):
-            for candidate in candidates:
-                valid, reasons = candidate.is_valid_project(definition, self.needy)
-                missing_prerequisites = candidate.missing_prerequisites(definition, self.needy)
-                logging.debug('project type determined {} be {}'.format('to' if valid else 'not to', candidate.identifier()))
-                if isinstance(reasons, list):
-                    for r in reasons:
-                        logging.debug('  - {}'.format(r))
-                else:
-                    logging.debug('  - {}'.format(reasons))
-                if valid:
-                    if len(missing_prerequisites) > 0:
-                        print(Fore.YELLOW + '[WARNING]' + Fore.RESET + ' Detected {} project, but the following prerequisites are missing: {}'.format(
-                            candidate.identifier(), ', '.join(missing_prerequisites)
-                        ))
-                        continue
-                    return candidate(definition, self.needy)
+        for candidate in candidates:
+            valid, reasons = candidate.is_valid_project(definition, self.needy)
+            missing_prerequisites = candidate.missing_prerequisites(definition, self.needy)
+            logging.debug('project type determined {} be {}'.format('to' if valid else 'not to', candidate.identifier()))
+            if isinstance(reasons, list):
+                for r in reasons:
+                    logging.debug('  - {}'.format(r))
+            else:
+                logging.debug('  - {}'.format(reasons))
+            if valid:
+                if len(missing_prerequisites) > 0:
+                    print(Fore.YELLOW + '[WARNING]' + Fore.RESET + ' Detected {} project, but the following prerequisites are missing: {}'.format(
+                        candidate.identifier(), ', '.join(missing_prerequisites)
+                    ))
+                    continue
+                return candidate(definition, self.needy)
 
         raise RuntimeError('unknown project type')
 
@@ -341,20 +431,33 @@ class Library:
         return 6
 
     def configuration_hash(self, config_dict=None):
-        hash = hashlib.sha256()
-        hash.update(json.dumps(config_dict or self.configuration_dict(), sort_keys=True).encode())
-        return hash.digest()
+        if config_dict:
+            return Library.__hash(config_dict)
+        return self.needy.fingerprints().get(self.__fingerprint_key('hash'), lambda: Library.__hash(self.configuration_dict()))
 
     def configuration_dict(self):
+        """ the configuration that determines whether the library needs to be rebuilt. it's shared, so don't modify it """
+        return self.needy.fingerprints().get(self.__fingerprint_key('configuration'), self.__configuration_dict)
+
+    def __configuration_dict(self):
         configuration = self.__configuration.copy()
         configuration['project'] = self.project_configuration()
         return {
             'build-compatibility': self.build_compatibility(),
-            'platform-configuration': (self.target().platform.configuration(self.target().architecture) or {}),
+            'platform-configuration': self.needy.fingerprints().platform_configuration(self.target()),
             'library-configuration': configuration,
             'dependencies': [self.needy.library_configuration(self.target(), d) for d in self.dependencies()],
         }
 
+    def __fingerprint_key(self, kind):
+        return (kind, self.target().platform.identifier(), self.target().architecture, self.name())
+
+    @staticmethod
+    def __hash(config_dict):
+        hash = hashlib.sha256()
+        hash.update(json.dumps(config_dict, sort_keys=True).encode())
+        return hash.digest()
+
     @staticmethod
     def generate_pkgconfig(prefix, library_name):
         libs = []
@@ -8,9 +8,11 @@ import os
 import re
 import subprocess
 import sys
+import threading
 
 from collections import OrderedDict
 from contextlib import contextmanager
+from functools import partial
 
 from .process import command_output
 from .library import Library
@@ -21,7 +23,13 @@ from .target import Target
 from .cd import current_directory
 from .local_configuration import LocalConfiguration
 from .needy_configuration import NeedyConfiguration
+from .cache_stats import CacheStats
+from .fingerprints import Fingerprints
+from .jobserver import JobServer
 from .memoize import MemoizeMethod
+from .scheduler import Scheduler
+from .sources.git import GitRepository
+from .uploader import BackgroundUploader
 from .utility import log_section, Fore, Style
 
 
@@ -31,13 +39,20 @@ def ConfiguredNeedy(scope, parameters=None):
     if needs_directory is None:
         raise RuntimeError('No needs file found!')
     with LocalConfiguration(os.path.join(needs_directory, 'config.json')) as local_configuration:
-        yield Needy(scope, parameters, local_configuration=local_configuration, needy_configuration=NeedyConfiguration(scope))
+        needy = Needy(scope, parameters, local_configuration=local_configuration, needy_configuration=NeedyConfiguration(scope))
+        try:
+            yield needy
+        finally:
+            failures = needy.wait_for_uploads()
+        if failures:
+            raise RuntimeError('{} build cache upload{} failed'.format(len(failures), 's' if len(failures) != 1 else ''))
 
 
 class Needy:
-    def __init__(self, path='.', parameters={}, local_configuration=None, needy_configuration=None):
+    def __init__(self, path='.', parameters={}, local_configuration=None, needy_configuration=None, jobserver=None):
         self.__path = self.__normalize_path(path)
         self.__parameters = parameters
+        self.__jobserver = jobserver
 
         self.__needs_file = self.find_needs_file(self.__path)
         self.__needs_directory = Needy.resolve_needs_directory(self.__path)
@@ -49,6 +64,15 @@ class Needy:
 
         self.__needy_configuration = needy_configuration
 
+        self.__fingerprints = Fingerprints()
+        self.__uploader = BackgroundUploader()
+
+        # rendering is re-entrant (build_directory renders the needs file) and stores state between passes
+        self.__render_lock = threading.RLock()
+
+        self.__source_locks = {}
+        self.__source_locks_lock = threading.Lock()
+
         logging.debug('Using needs file {}'.format(self.__needs_file))
         logging.debug('Using needs directory {}'.format(self.__needs_directory))
 
@@ -112,14 +136,23 @@ class Needy:
         return [name for name in self.__local_configuration.library_names() if self.__local_configuration.development_mode(name)]
 
     def set_development_mode(self, library_name, enable=True):
-        if not os.path.isdir(self.source_directory(library_name)):
+        source_directory = os.path.join(self.need_directory(library_name), 'source')
+        if not os.path.isdir(source_directory):
+            if enable and (self.library_configuration(None, library_name) or {}).get('isolated-source'):
+                raise RuntimeError('{} has isolated sources, which can\'t be put in development mode. Disable its isolated-source option first.'.format(library_name))
             raise RuntimeError('Please initialize the library before enabling development mode.')
 
+        if enable:
+            try:
+                GitRepository.unshallow(source_directory, verbosity=logging.INFO)
+            except subprocess.CalledProcessError:
+                logging.warning('unable to fetch the history of {}. git status and log may be incomplete'.format(library_name))
+
         was_already = self.__local_configuration.development_mode(library_name) == enable
         self.__local_configuration.set_development_mode(library_name, enable)
 
         if enable:
-            print('Development mode {}enabled for {}: {}'.format('already ' if was_already else '', library_name, self.source_directory(library_name)))
+            print('Development mode {}enabled for {}: {}'.format('already ' if was_already else '', library_name, source_directory))
         else:
             print('Development mode {}disabled for {}. Please ensure that you have persisted any changes you wish to keep.'.format('already ' if was_already else '', library_name))
 
@@ -162,7 +195,8 @@ class Needy:
         with open(self.needs_file(), 'r') as needs_file:
             source = needs_file.read()
 
-        return self.__render(source, target=target)
+        with self.__render_lock:
+            return self.__render(source, target=target)
 
     @MemoizeMethod
     def __render(self, source, target=None):
@@ -204,6 +238,30 @@ class Needy:
     def needs_directory(self):
         return self.__needs_directory
 
+    def fingerprints(self):
+        return self.__fingerprints
+
+    def cache_stats(self):
+        return CacheStats(os.path.join(self.needs_directory(), 'cache-stats'))
+
+    def source_lock(self, name):
+        """ returns the lock held while a library's source is cleaned """
+        with self.__source_locks_lock:
+            if name not in self.__source_locks:
+                self.__source_locks[name] = threading.Lock()
+            return self.__source_locks[name]
+
+    def uploader(self):
+        """ stores build artifacts in the build caches in the background """
+        return self.__uploader
+
+    def wait_for_uploads(self):
+        """ waits for pending build cache uploads and reports failures. returns the (description, exception) tuples """
+        failures = self.__uploader.wait()
+        for description, e in failures:
+            self.__print_status(Fore.RED, 'UPLOAD FAILED', '{}: {}'.format(description, e))
+        return failures
+
     def need_directory(self, name):
         return os.path.join(self.needs_directory(), name)
 
@@ -215,6 +273,16 @@ class Needy:
             return self.parameters().concurrency
         return multiprocessing.cpu_count()
 
+    @MemoizeMethod
+    def jobserver(self):
+        """ returns the job server shared by all builds, or None if each build should use build_concurrency """
+        if self.__jobserver is not None:
+            # nested needs files share their parent's job slots
+            return self.__jobserver
+        if sys.platform == 'win32' or self.build_concurrency() <= 1:
+            return None
+        return JobServer(self.build_concurrency())
+
     def platform(self, identifier):
         platform = host_platform() if identifier == 'host' else available_platforms().get(identifier, None)
         if platform is not None:
@@ -236,11 +304,15 @@ class Needy:
 
     def library(self, target, name):
         development_mode = self.__local_configuration and self.__local_configuration.development_mode(name)
+        build_caches = self.needy_configuration().build_caches() if self.needy_configuration() else []
+        for cache in build_caches:
+            # tiered caches hand stores to their remote tiers to the uploader
+            cache.set_uploader(self.__uploader)
         return Library(self, name,
                        target=target,
                        configuration=self.library_configuration(target, name),
                        development_mode=development_mode,
-                       build_caches=self.needy_configuration().build_caches() if self.needy_configuration() else [])
+                       build_caches=build_caches)
 
     def library_configuration(self, target, name):
         return self.needs_configuration(target)['libraries'][name] if name in self.needs_configuration(target)['libraries'] else None
@@ -382,47 +454,101 @@ class Needy:
         b = UniversalBinary(target_or_universal_binary, [l], self)
         return b.build_directory()
 
-    def source_directory(self, library_name):
-        return os.path.join(self.need_directory(library_name), 'source')
+    def source_directory(self, library_name, target=None):
+        """ libraries with isolated sources have a source directory for each target, so they require one """
+        if self.__local_configuration and self.__local_configuration.development_mode(library_name):
+            # libraries in development mode always use the shared directory, so the needs file isn't needed
+            return os.path.join(self.need_directory(library_name), 'source')
+        configuration = self.library_configuration(target, library_name)
+        if not configuration or not configuration.get('isolated-source'):
+            return os.path.join(self.need_directory(library_name), 'source')
+        if target is None:
+            raise RuntimeError('{} has a source directory for each target, so a target is required'.format(library_name))
+        return os.path.join(self.need_directory(library_name), 'isolated-source', Library.target_directory(target, configuration))
 
     def satisfy_target(self, target, filters=None):
-        needs_configuration = self.needs_configuration(target)
-
-        if 'libraries' not in needs_configuration:
-            return
-
-        print('Satisfying {} in {}'.format(target, self.path()))
-
         try:
-            for name, library in self.libraries_to_build(target, filters):
-                if not self.parameters().force_build and library.is_up_to_date():
-                    self.__print_status(Fore.GREEN, 'UP-TO-DATE', name)
-                else:
-                    with log_section('needy.satisfy.{}'.format(name)):
-                        self.__print_status(Fore.CYAN, 'OUT-OF-DATE', name)
-                        start_time = datetime.datetime.now()
-                        library.build()
-                    self.__print_status(Fore.GREEN, 'SUCCESS', '{} in {}'.format(name, datetime.datetime.now() - start_time))
+            self.__satisfy_targets([target], filters)
         except Exception as e:
             self.__print_status(Fore.RED, 'ERROR')
             print(e)
             raise
 
+    def __satisfy_targets(self, targets, filters=None):
+        """ builds the libraries for all of the targets with one scheduler. libraries with isolated sources are built for
+        all of the targets concurrently, while other libraries are built for one target at a time since they share a
+        source directory """
+        scheduler = Scheduler(self.build_concurrency(), jobserver=self.jobserver())
+        last_job = {}
+
+        for target in targets:
+            if 'libraries' not in self.needs_configuration(target):
+                continue
+
+            print('Satisfying {} in {}'.format(target, self.path()))
+
+            libraries = self.libraries_to_build(target, filters)
+            checked, restored = self.__restore_from_caches(libraries)
+            for name, library in libraries:
+                description = name if len(targets) == 1 else '{} for {}'.format(name, target)
+                if name in restored:
+                    self.__print_status(Fore.GREEN, 'RESTORED', description)
+                    continue
+                job = (str(target), name)
+                dependencies = [(str(target), dependency) for dependency in library.dependencies()]
+                if not library.has_isolated_source() and name in last_job:
+                    dependencies.append(last_job[name])
+                scheduler.add(job, partial(self.__satisfy_library, description, library, name not in checked), dependencies)
+                last_job[name] = job
+
+        scheduler.run()
+
+    def __restore_from_caches(self, libraries):
+        """ looks up every out-of-date library in the build caches at once instead of one at a time as they're built.
+        returns the names of the libraries that were looked up and the names of those that were restored """
+        if self.parameters().force_build:
+            return set(), set()
+
+        checked = set([name for name, library in libraries if not library.is_in_development_mode() and not library.is_up_to_date()])
+        restored = set()
+
+        def restore(name, library):
+            if library.restore_from_cache():
+                restored.add(name)
+
+        # cache lookups are mostly spent waiting on I/O, so they don't take job server tokens
+        scheduler = Scheduler(self.build_concurrency())
+        for name, library in libraries:
+            if name in checked:
+                scheduler.add(name, partial(restore, name, library))
+        scheduler.run()
+        return checked, restored
+
+    def __satisfy_library(self, name, library, check_caches=True):
+        if not self.parameters().force_build and library.is_up_to_date():
+            self.__print_status(Fore.GREEN, 'UP-TO-DATE', name)
+            return
+        with log_section('needy.satisfy.{}'.format(name)):
+            self.__print_status(Fore.CYAN, 'OUT-OF-DATE', name)
+            start_time = datetime.datetime.now()
+            library.build(check_caches=check_caches)
+        self.__print_status(Fore.GREEN, 'SUCCESS', '{} in {}'.format(name, datetime.datetime.now() - start_time))
+
     def satisfy_universal_binary(self, universal_binary, filters=None):
         try:
             print('Satisfying universal binary {} in {}'.format(universal_binary, self.path()))
             configuration = self.universal_binary_configuration(universal_binary)
 
             libraries = dict()
+            targets = [Target(self.platform(platform), architecture) for platform, architectures in configuration.items() for architecture in architectures]
 
-            for platform, architectures in configuration.items():
-                for architecture in architectures:
-                    target = Target(self.platform(platform), architecture)
-                    self.satisfy_target(target, filters)
-                    for name, library in self.libraries_to_build(target, filters):
-                        if name not in libraries:
-                            libraries[name] = list()
-                        libraries[name].append(library)
+            self.__satisfy_targets(targets, filters)
+
+            for target in targets:
+                for name, library in self.libraries_to_build(target, filters):
+                    if name not in libraries:
+                        libraries[name] = list()
+                    libraries[name].append(library)
 
             for name, libs in libraries.items():
                 if filters and not self.test_filters(name, filters):
@@ -464,6 +590,7 @@ class Needy:
                     continue
             logging.info('Cleaning {}...'.format(name))
             libraries[0].clean_build()
+            libraries[0].clean_intermediates()
             if only_build_directory:
                 continue
             libraries[0].clean_source()
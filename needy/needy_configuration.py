@@ -3,8 +3,9 @@ import json
 import logging
 import time
 
-from .caches.directory import DirectoryCache
-from .caches.s3 import S3Cache
+from .caches import cache_from_dict
+from .download_store import DownloadStore
+from .git_mirrors import GitMirrors
 from .filesystem import os_file, lock_fd
 from .memoize import MemoizeMethod
 
@@ -106,11 +107,25 @@ class NeedyConfiguration:
                 build_caches = self.__configuration['build-caches']
             else:
                 build_caches = [self.__configuration['build-caches']]
-        ret = []
-        for c in build_caches:
-            config = c if isinstance(c, dict) else {'path': c}
-            if config['path'].lower().startswith('s3://'):
-                ret.append(S3Cache.from_dict(config))
-            else:
-                ret.append(DirectoryCache.from_dict(config))
-        return ret
+        return [cache_from_dict(c) for c in build_caches]
+
+    @MemoizeMethod
+    def download_store(self):
+        if 'download-store' not in self.__configuration:
+            return None
+        return DownloadStore.from_dict(self.__configuration['download-store'])
+
+    def download_buffer_size(self):
+        """ the number of bytes that downloads read at a time, or None for the default """
+        if 'download-buffer-size' not in self.__configuration:
+            return None
+        buffer_size = int(self.__configuration['download-buffer-size'])
+        if buffer_size <= 0:
+            raise ValueError('download-buffer-size must be positive')
+        return buffer_size
+
+    @MemoizeMethod
+    def git_mirrors(self):
+        if 'git-mirrors' not in self.__configuration:
+            return None
+        return GitMirrors.from_dict(self.__configuration['git-mirrors'])
@@ -0,0 +1,107 @@
+import binascii
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+from .filesystem import file_hash
+
+
+class ObjectCache:
+    """ Keeps compiled objects so that unchanged translation units don't need to be recompiled.
+
+    Objects are keyed by the compiler command and the content of the source file. Each object is stored alongside the
+    hashes of the headers it included (as reported by the compiler's dependency file), and is only reused if all of
+    those headers are unchanged.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__used_keys = set()
+        self.__file_hashes = {}
+        self.__lock = threading.Lock()
+
+    def directory(self):
+        return self.__directory
+
+    def key(self, command, source):
+        hash = hashlib.sha256()
+        hash.update(json.dumps([command, self.__file_hash(source)]).encode())
+        return hash.hexdigest()
+
+    def restore(self, key, output):
+        """ copies the object for the given key to output if it's present and up-to-date """
+        with self.__lock:
+            self.__used_keys.add(key)
+
+        try:
+            with open(self.__manifest_path(key), 'r') as f:
+                dependencies = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+
+        for path, expected in dependencies.items():
+            if self.__file_hash(path) != expected:
+                return False
+
+        try:
+            shutil.copyfile(self.__object_path(key), output)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def store(self, key, output, dependency_file=None):
+        """ stores the object at output. the dependency file's headers are hashed to validate it later """
+        dependencies = {}
+        if dependency_file:
+            for path in self.parse_dependency_file(dependency_file)[1:]:
+                dependencies[path] = self.__file_hash(path)
+
+        if not os.path.exists(self.__directory):
+            try:
+                os.makedirs(self.__directory)
+            except OSError:
+                if not os.path.isdir(self.__directory):
+                    raise
+
+        object_path = self.__object_path(key)
+        shutil.copyfile(output, object_path + '.tmp')
+        os.rename(object_path + '.tmp', object_path)
+        with open(self.__manifest_path(key) + '.tmp', 'w') as f:
+            json.dump(dependencies, f)
+        os.rename(self.__manifest_path(key) + '.tmp', self.__manifest_path(key))
+
+    def prune(self):
+        """ removes objects that weren't used since this cache was created """
+        if not os.path.isdir(self.__directory):
+            return
+        for name in os.listdir(self.__directory):
+            if name.split('.')[0] not in self.__used_keys:
+                os.remove(os.path.join(self.__directory, name))
+
+    @staticmethod
+    def parse_dependency_file(path):
+        """ returns the prerequisites listed in a make-style dependency file, starting with the source file """
+        with open(path, 'r') as f:
+            contents = f.read().replace('\\\n', ' ')
+        rule = contents.split(': ', 1)[1] if ': ' in contents else ''
+        rule = rule.split('\n', 1)[0]
+        return [path.replace('\\ ', ' ') for path in re.split(r'(?<!\\)\s+', rule.strip()) if path]
+
+    def __file_hash(self, path):
+        path = os.path.abspath(path)
+        if path not in self.__file_hashes:
+            try:
+                with open(path, 'rb') as f:
+                    self.__file_hashes[path] = binascii.hexlify(file_hash(f, hashlib.sha256())).decode()
+            except (IOError, OSError):
+                self.__file_hashes[path] = None
+        return self.__file_hashes[path]
+
+    def __object_path(self, key):
+        return os.path.join(self.__directory, key + '.o')
+
+    def __manifest_path(self, key):
+        return os.path.join(self.__directory, key + '.json')
@@ -55,10 +55,11 @@ class Platform:
         """ returns paths to inject in front of PATH """
         return []
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
+        """ returns the compiler command. environment is the build's environment, which defaults to os.environ """
         raise NotImplementedError('c_compiler')
 
-    def cxx_compiler(self, architecture):
+    def cxx_compiler(self, architecture, environment=None):
         raise NotImplementedError('cxx_compiler')
 
     def libraries(self, architecture):
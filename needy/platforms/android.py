@@ -1,3 +1,5 @@
+import distutils.spawn
+import json
 import os
 import subprocess
 import pipes
@@ -5,6 +7,7 @@ import logging
 
 from ..platform import Platform
 from ..memoize import MemoizeMethod
+from ..toolchain_cache import default_toolchain_cache
 
 
 class AndroidPlatform(Platform):
@@ -38,11 +41,9 @@ class AndroidPlatform(Platform):
         if 'ANDROID_TOOLCHAIN' in os.environ:
             return os.environ['ANDROID_TOOLCHAIN']
 
-        try:
-            which = subprocess.check_output(['which', '{}-c++'.format(self.binary_prefix(architecture))])
-            return os.path.dirname(os.path.dirname(which))
-        except subprocess.CalledProcessError:
-            pass
+        compiler = distutils.spawn.find_executable('{}-c++'.format(self.binary_prefix(architecture)))
+        if compiler:
+            return os.path.dirname(os.path.dirname(compiler))
 
         toolchain = None
         if 'arm' in architecture:
@@ -101,10 +102,10 @@ class AndroidPlatform(Platform):
 
         return ret
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
         return self.__compiler(architecture, ['clang'])
 
-    def cxx_compiler(self, architecture):
+    def cxx_compiler(self, architecture, environment=None):
         return self.__compiler(architecture, ['clang++'])
 
     def __compiler(self, architecture, choices):
@@ -180,6 +181,15 @@ class AndroidPlatform(Platform):
 
     @classmethod
     def __compiler_preprocessing_output(cls, compiler, binary_paths, program):
+        path = '{}:{}'.format(':'.join(binary_paths), os.environ['PATH'])
+        return default_toolchain_cache().get(
+            distutils.spawn.find_executable(compiler[0], path),
+            json.dumps(['preprocessing-output', compiler, binary_paths, program]),
+            lambda: cls.__uncached_compiler_preprocessing_output(compiler, path, program)
+        )
+
+    @classmethod
+    def __uncached_compiler_preprocessing_output(cls, compiler, path, program):
         # The compiler for android is implemented as a shell script (without the
         # shebang line, grrr) so we have to use sh to interpret it AND have to
         # be sure to use a full path because otherwise the shell script fails
@@ -187,7 +197,7 @@ class AndroidPlatform(Platform):
         # to hang as if waiting on stdin despite closing the fd via communicate.
         try:
             env = os.environ.copy()
-            env['PATH'] = '{}:{}'.format(':'.join(binary_paths), env['PATH'])
+            env['PATH'] = path
             cmd = 'printf \'{}\' | {} -x c++ -P -E -'.format(program, ' '.join([pipes.quote(c) for c in compiler]))
             return subprocess.check_output(cmd, env=env, shell=True).decode().strip().split('\n')
         except subprocess.CalledProcessError:
@@ -17,20 +17,22 @@ class GenericPlatform(Platform):
     def default_architecture(self):
         return platform.machine().lower()
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
+        environment = os.environ if environment is None else environment
         command = 'gcc'
-        if 'CC' in os.environ:
-            command = os.environ['CC']
+        if 'CC' in environment:
+            command = environment['CC']
         elif spawn.find_executable('clang'):
             command = 'clang'
         if platform.system() == 'Darwin':
             return [command, '-arch', architecture]
         return [command, '-m{}'.format('32' if architecture == 'i386' else '64')]
 
-    def cxx_compiler(self, architecture):
+    def cxx_compiler(self, architecture, environment=None):
+        environment = os.environ if environment is None else environment
         command = 'g++'
-        if 'CXX' in os.environ:
-            command = os.environ['CXX']
+        if 'CXX' in environment:
+            command = environment['CXX']
         elif spawn.find_executable('clang++'):
             command = 'clang++'
         if platform.system() == 'Darwin':
@@ -51,11 +51,11 @@ class WindowsPlatform(Platform):
     def binary_paths(self, architecture):
         return [os.path.join(self.__vc_root(), 'bin')]
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
         return [os.path.join(self.__vc_root(), 'bin', 'cl')]
 
-    def cxx_compiler(self, architecture):
-        return self.c_compiler(architecture)
+    def cxx_compiler(self, architecture, environment=None):
+        return self.c_compiler(architecture, environment)
 
     def __vc_root(self):
         tools_path = None
@@ -29,8 +29,8 @@ class XcodePlatform(Platform):
             args.append('-fembed-bitcode')
         return args
 
-    def c_compiler(self, architecture):
+    def c_compiler(self, architecture, environment=None):
         return ['xcrun', '-sdk', self.sdk(), 'clang'] + self.__common_compiler_args(architecture)
 
-    def cxx_compiler(self, architecture):
+    def cxx_compiler(self, architecture, environment=None):
         return ['xcrun', '-sdk', self.sdk(), 'clang++'] + self.__common_compiler_args(architecture)
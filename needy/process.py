@@ -25,16 +25,16 @@ def __log_check_call(cmd, verbosity, **kwargs):
             subprocess.check_call(cmd, stderr=subprocess.STDOUT, shell=shell, **kwargs)
 
 
-def command(cmd, verbosity=logging.INFO, environment_overrides={}):
-    __log_check_call(cmd, verbosity, env=__environment(environment_overrides))
+def command(cmd, verbosity=logging.INFO, environment_overrides={}, pass_fds=(), context=None):
+    __log_check_call(cmd, verbosity, env=__environment(environment_overrides, context), cwd=__cwd(context), **__pass_fds_kwargs(pass_fds))
 
 
-def command_output(cmd, verbosity=logging.INFO, environment_overrides={}):
+def command_output(cmd, verbosity=logging.INFO, environment_overrides={}, pass_fds=(), context=None):
     logging.log(verbosity, __format_command(cmd))
-    return __log_check_output(cmd, verbosity, env=__environment(environment_overrides))
+    return __log_check_output(cmd, verbosity, env=__environment(environment_overrides, context), cwd=__cwd(context), **__pass_fds_kwargs(pass_fds))
 
 
-def command_sequence(cmds, verbosity=logging.INFO, environment_overrides={}):
+def command_sequence(cmds, verbosity=logging.INFO, environment_overrides={}, pass_fds=(), context=None):
     with open(os.devnull, 'w') as devnull:
         stderr = devnull if verbosity < logging.getLogger().getEffectiveLevel() else subprocess.STDOUT
         stdout = devnull if verbosity < logging.getLogger().getEffectiveLevel() else None
@@ -43,17 +43,33 @@ def command_sequence(cmds, verbosity=logging.INFO, environment_overrides={}):
                 path = os.path.join(d, 'script.cmd')
                 with open(path, 'wb') as f:
                     f.write('\r\n'.join(cmds).encode())
-                subprocess.check_call(['cmd', '/c', 'call', path], stderr=stderr, stdout=stdout, env=__environment(environment_overrides))
+                subprocess.check_call(['cmd', '/c', 'call', path], stderr=stderr, stdout=stdout, env=__environment(environment_overrides, context),
+                                      cwd=__cwd(context))
         else:
-            subprocess.check_call(['sh', '-c', '\n'.join(['set -ex'] + cmds)], stderr=stderr, stdout=stdout, env=__environment(environment_overrides))
+            subprocess.check_call(['sh', '-c', '\n'.join(['set -ex'] + cmds)], stderr=stderr, stdout=stdout, env=__environment(environment_overrides, context),
+                                  cwd=__cwd(context), **__pass_fds_kwargs(pass_fds))
 
 
-def __environment(environment_overrides):
-    environment_overrides['PWD'] = current_directory()
-    env = os.environ.copy()
+def __environment(environment_overrides, context=None):
+    env = context.environment() if context else os.environ.copy()
     env.update(environment_overrides)
+    env['PWD'] = __cwd(context) or current_directory()
     return {key: str(value) for key, value in env.items()}
 
 
+def __cwd(context):
+    """ commands without a context run in the process's working directory """
+    return context.directory() if context else None
+
+
+def __pass_fds_kwargs(pass_fds):
+    """ returns the subprocess arguments needed for the given file descriptors to be inherited """
+    if not pass_fds or sys.platform == 'win32':
+        return {}
+    if sys.version_info >= (3, 2):
+        return {'pass_fds': pass_fds}
+    return {'close_fds': False}
+
+
 def __format_command(cmd):
     return Style.BRIGHT + '{}'.format(cmd) + Style.RESET_ALL
@@ -7,6 +7,7 @@ try:
 except ImportError:
     from pipes import quote
 
+from .execution_context import ExecutionContext
 from .process import command, command_output, command_sequence
 
 
@@ -44,10 +45,13 @@ def evaluate_conditionals(configuration, target):
 
 
 class ProjectDefinition:
-    def __init__(self, target, directory, configuration={}):
+    def __init__(self, target, directory, configuration={}, intermediate_directory=None, context=None, name=None):
         self.target = target
+        self.name = name
         self.directory = directory
         self.configuration = configuration
+        self.intermediate_directory = intermediate_directory
+        self.context = context if context else ExecutionContext(directory)
 
 
 class Project:
@@ -78,6 +82,18 @@ class Project:
     def directory(self):
         return self.__definition.directory
 
+    def name(self):
+        """ the name of the library that the project builds, or None if it isn't known """
+        return self.__definition.name
+
+    def context(self):
+        """ the working directory and environment that the project's commands are executed with """
+        return self.__definition.context
+
+    def intermediate_directory(self):
+        """ a directory that persists between builds for reusable intermediate files, or None if there isn't one """
+        return self.__definition.intermediate_directory
+
     def configuration(self, key=None):
         if key is None:
             return self.__definition.configuration
@@ -91,6 +107,12 @@ class Project:
             concurrency = min(concurrency, self.configuration('max-concurrency'))
         return concurrency
 
+    def jobserver(self):
+        """ returns the job server that this project's commands share, or None if they should use build_concurrency """
+        if self.configuration('max-concurrency') is not None:
+            return None
+        return self.needy.jobserver()
+
     def set_string_format_variables(self, **kwargs):
         self.__string_format_variables = kwargs
 
@@ -104,35 +126,37 @@ class Project:
 
     def target_environment_overrides(self):
         ret = {}
+        environ = self.context().environment()
 
         needy_wrappers = os.path.join(self.directory(), 'needy-wrappers')
 
-        ret['HOST_CC'] = os.environ.get('HOST_CC', os.environ.get('CC', ''))
-        if self.target().platform.c_compiler(self.target().architecture):
+        ret['HOST_CC'] = environ.get('HOST_CC', environ.get('CC', ''))
+        if self.target().platform.c_compiler(self.target().architecture, environ):
             ret['CC'] = os.path.join(needy_wrappers, 'needy-cc')
 
-        ret['HOST_CXX'] = os.environ.get('HOST_CXX', os.environ.get('CXX', ''))
-        if self.target().platform.cxx_compiler(self.target().architecture):
+        ret['HOST_CXX'] = environ.get('HOST_CXX', environ.get('CXX', ''))
+        if self.target().platform.cxx_compiler(self.target().architecture, environ):
             ret['CXX'] = os.path.join(needy_wrappers, 'needy-cxx')
 
-        ret['HOST_LDFLAGS'] = os.environ.get('HOST_LDFLAGS', os.environ.get('LDFLAGS', ''))
+        ret['HOST_LDFLAGS'] = environ.get('HOST_LDFLAGS', environ.get('LDFLAGS', ''))
         libraries = self.target().platform.libraries(self.target().architecture)
         if len(libraries) > 0:
-            ret['LDFLAGS'] = ' '.join(libraries + ([os.environ['LDFLAGS']] if 'LDFLAGS' in os.environ else []))
+            ret['LDFLAGS'] = ' '.join(libraries + ([environ['LDFLAGS']] if 'LDFLAGS' in environ else []))
 
-        ret['HOST_PATH'] = os.environ.get('HOST_PATH', os.environ['PATH'])
+        ret['HOST_PATH'] = environ.get('HOST_PATH', environ['PATH'])
         binary_paths = [needy_wrappers] + self.target().platform.binary_paths(self.target().architecture)
         if len(binary_paths) > 0:
-            ret['PATH'] = ('%s:%s' % (':'.join(binary_paths), os.environ['PATH']))
+            ret['PATH'] = ('%s:%s' % (':'.join(binary_paths), environ['PATH']))
 
         return ret
 
     def setup(self):
         # create wrappers for cc / cxx since some systems (e.g. boost's bootstrap) expect these to be single tokens
-        c_compiler = self.target().platform.c_compiler(self.target().architecture)
+        environment = self.context().environment()
+        c_compiler = self.target().platform.c_compiler(self.target().architecture, environment)
         if c_compiler:
             self.__create_wrapper('needy-cc', c_compiler)
-        cxx_compiler = self.target().platform.cxx_compiler(self.target().architecture)
+        cxx_compiler = self.target().platform.cxx_compiler(self.target().architecture, environment)
         if cxx_compiler:
             self.__create_wrapper('needy-cxx', cxx_compiler)
 
@@ -157,10 +181,11 @@ class Project:
                 os.makedirs(d)
 
     def __create_wrapper(self, name, command):
-        if not os.path.exists('needy-wrappers'):
-            os.makedirs('needy-wrappers')
+        wrappers = os.path.join(self.directory(), 'needy-wrappers')
+        if not os.path.exists(wrappers):
+            os.makedirs(wrappers)
 
-        path = 'needy-wrappers/{}'.format(name)
+        path = os.path.join(wrappers, name)
         with open(path, 'w') as f:
             f.write("#!/bin/sh\n{} \"$@\"".format(' '.join(quote(arg) for arg in command) if isinstance(command, list) else command))
         os.chmod(path, 0o755)
@@ -171,24 +196,35 @@ class Project:
             env.update(self.target_environment_overrides())
         else:
             for var in ['PATH', 'CC', 'CXX', 'LDFLAGS']:
-                if 'HOST_'+var in os.environ:
-                    env[var] = os.environ['HOST_'+var]
+                if self.context().getenv('HOST_'+var) is not None:
+                    env[var] = self.context().getenv('HOST_'+var)
+        jobserver = self.jobserver()
+        if jobserver:
+            env['MAKEFLAGS'] = jobserver.make_flags(env.get('MAKEFLAGS', self.context().getenv('MAKEFLAGS', '')))
         return env
 
-    def command(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True):
+    def command_pass_fds(self):
+        jobserver = self.jobserver()
+        return jobserver.file_descriptors() if jobserver else ()
+
+    def command(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True, directory=None):
         return command(cmd, verbosity=verbosity, environment_overrides=self.command_environment_overrides(
             environment_overrides=environment_overrides,
             use_target_overrides=use_target_overrides
-        ))
+        ), pass_fds=self.command_pass_fds(), context=self.__command_context(directory))
 
-    def command_output(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True):
+    def command_output(self, cmd, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True, directory=None):
         return command_output(cmd, verbosity=verbosity, environment_overrides=self.command_environment_overrides(
             environment_overrides=environment_overrides,
             use_target_overrides=use_target_overrides
-        ))
+        ), pass_fds=self.command_pass_fds(), context=self.__command_context(directory))
 
-    def command_sequence(self, cmds, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True):
+    def command_sequence(self, cmds, verbosity=logging.INFO, environment_overrides={}, use_target_overrides=True, directory=None):
         return command_sequence(cmds, verbosity=verbosity, environment_overrides=self.command_environment_overrides(
             environment_overrides=environment_overrides,
             use_target_overrides=use_target_overrides
-        ))
+        ), pass_fds=self.command_pass_fds(), context=self.__command_context(directory))
+
+    def __command_context(self, directory):
+        """ commands run in the project directory unless another directory, relative to it, is given """
+        return self.context().with_directory(directory) if directory else self.context()
@@ -16,7 +16,7 @@ class BoostBuildProject(project.Project):
     @staticmethod
     def is_valid_project(definition, needy):
         for name in BoostBuildProject.__valid_jamroot_filenames():
-            if os.path.isfile(name):
+            if os.path.isfile(os.path.join(definition.directory, name)):
                 return True, 'Jamroot file {} found'.format(name)
         return False, 'no Jamroot file matching {} found'.format(BoostBuildProject.__valid_jamroot_filenames())
 
@@ -26,14 +26,15 @@ class BoostBuildProject(project.Project):
 
     @staticmethod
     def missing_prerequisites(definition, needy):
-        return ['b2'] if not os.path.isfile('bootstrap.sh') and distutils.spawn.find_executable('b2') is None else []
+        return ['b2'] if not os.path.isfile(os.path.join(definition.directory, 'bootstrap.sh')) and distutils.spawn.find_executable('b2') is None else []
 
     @staticmethod
     def configuration_keys():
         return project.Project.configuration_keys() | {'b2-args', 'bootstrap-args'}
 
-    def get_build_concurrency_args(self):
-        concurrency = self.build_concurrency()
+    def get_build_concurrency_args(self, concurrency=None):
+        if concurrency is None:
+            concurrency = self.build_concurrency()
 
         if concurrency > 1:
             return ['-j', str(concurrency)]
@@ -43,7 +44,7 @@ class BoostBuildProject(project.Project):
 
     def configure(self, build_directory):
         bootstrap_args = self.evaluate(self.configuration('bootstrap-args'))
-        if not os.path.isfile('bootstrap.sh'):
+        if not os.path.isfile(os.path.join(self.directory(), 'bootstrap.sh')):
             if len(bootstrap_args) > 0:
                 raise RuntimeError('bootstrap-args was given, but no bootstrap script is present')
             return
@@ -51,9 +52,8 @@ class BoostBuildProject(project.Project):
         self.command(['./bootstrap.sh'] + bootstrap_args, use_target_overrides=False)
 
     def build(self, output_directory):
-        b2 = './b2' if os.path.isfile('b2') else 'b2'
+        b2 = './b2' if os.path.isfile(os.path.join(self.directory(), 'b2')) else 'b2'
         b2_args = self.evaluate(self.configuration('b2-args'))
-        b2_args.extend(self.get_build_concurrency_args())
 
         if not any(['variant' in arg for arg in b2_args]):
             b2_args.append('variant=release')
@@ -69,8 +69,9 @@ class BoostBuildProject(project.Project):
         b2_args.append('toolset={}-needy'.format(toolset))
 
         project_config = ''
-        if os.path.exists('project-config.jam'):
-            with open('project-config.jam', 'r') as f:
+        project_config_path = os.path.join(self.directory(), 'project-config.jam')
+        if os.path.exists(project_config_path):
+            with open(project_config_path, 'r') as f:
                 project_config = f.read()
 
         new_project_config = textwrap.dedent("""\
@@ -105,14 +106,22 @@ class BoostBuildProject(project.Project):
             if not skip_lines:
                 new_project_config += line
 
-        with open('project-config.jam', 'w') as f:
+        with open(project_config_path, 'w') as f:
             f.write(new_project_config)
 
-        if 'CFLAGS' in os.environ:
-            b2_args.append('cflags={}'.format(os.environ['CFLAGS']))
-        if 'CXXFLAGS' in os.environ:
-            b2_args.append('cxxflags={}'.format(os.environ['CXXFLAGS']))
-        if 'LDFLAGS' in os.environ:
-            b2_args.append('linkflags={}'.format(os.environ['LDFLAGS']))
+        environment = self.context().environment()
+        if 'CFLAGS' in environment:
+            b2_args.append('cflags={}'.format(environment['CFLAGS']))
+        if 'CXXFLAGS' in environment:
+            b2_args.append('cxxflags={}'.format(environment['CXXFLAGS']))
+        if 'LDFLAGS' in environment:
+            b2_args.append('linkflags={}'.format(environment['LDFLAGS']))
+
+        jobserver = self.jobserver()
+        if not jobserver:
+            self.command([b2, 'install', '--prefix={}'.format(output_directory)] + b2_args + self.get_build_concurrency_args())
+            return
 
-        self.command([b2, 'install', '--prefix={}'.format(output_directory)] + b2_args)
+        # b2 doesn't speak the job server protocol, so borrow whatever tokens are free for the duration of the build
+        with jobserver.reserved_slots(self.build_concurrency() - 1) as reserved:
+            self.command([b2, 'install', '--prefix={}'.format(output_directory)] + b2_args + self.get_build_concurrency_args(reserved + 1))
@@ -2,7 +2,8 @@ import distutils.spawn
 import os
 
 from .. import project
-from ..cd import cd
+
+from .make import get_make_jobs_args
 
 
 class CMakeProject(project.Project):
@@ -17,7 +18,7 @@ class CMakeProject(project.Project):
 
     @staticmethod
     def is_valid_project(definition, needy):
-        if not os.path.isfile('CMakeLists.txt'):
+        if not os.path.isfile(os.path.join(definition.directory, 'CMakeLists.txt')):
             return False, 'no CMakeLists.txt found in project root'
         if not definition.target.platform.is_host():
             return False, 'cross-compilation of CMake projects not yet supported'
@@ -33,13 +34,12 @@ class CMakeProject(project.Project):
             os.makedirs(cmake_directory)
         cmake_options = self.configuration('cmake-options') or []
         cmake_option_strings = ['-D{}={}'.format(key, self.evaluate(self.__cmake_value(value))[0]) for key, value in cmake_options.items()] if cmake_options else []
-        with cd(cmake_directory):
-            self.command(['cmake', '-G', 'Unix Makefiles'] + cmake_option_strings + ['-DCMAKE_INSTALL_PREFIX=%s' % output_directory, self.directory()])
+        self.command(['cmake', '-G', 'Unix Makefiles'] + cmake_option_strings + ['-DCMAKE_INSTALL_PREFIX=%s' % output_directory, self.directory()],
+                     directory=cmake_directory)
 
     def build(self, output_directory):
         cmake_directory = os.path.join(self.directory(), 'cmake')
-        with cd(cmake_directory):
-            self.command(['make', 'install'])
+        self.command(['make', 'install'] + get_make_jobs_args(self), directory=cmake_directory)
 
     @staticmethod
     def __cmake_value(value):
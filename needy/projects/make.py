@@ -10,6 +10,10 @@ from .. import project
 #       other build systems still use some of the MakeProject
 #       arguments and parameters such as AutotoolsProject.
 def get_make_jobs_args(project):
+    if project.jobserver():
+        # concurrency is negotiated through the job server in MAKEFLAGS instead
+        return []
+
     concurrency = project.build_concurrency()
 
     if concurrency > 1:
@@ -58,10 +62,10 @@ class MakeProject(project.Project):
         if not self.target().platform.is_host():
             excluded_targets.extend(['test', 'tests', 'check'])
 
-        makefile_path = MakeProject.get_makefile_path()
+        makefile_path = MakeProject.get_makefile_path(self.directory())
 
         with open(makefile_path, 'r') as makefile:
-            with open('MakefileNeedyGenerated', 'w') as needy_makefile:
+            with open(os.path.join(self.directory(), 'MakefileNeedyGenerated'), 'w') as needy_makefile:
                 for line in makefile.readlines():
                     uname_assignment = re.match('(.+=).*shell .*uname', line, re.MULTILINE)
                     if uname_assignment and self.target().platform.identifier() == 'android':
@@ -20,7 +20,7 @@ class MSBuildProject(project.Project):
             return False, 'target platform not an MSBuild supported platform'
 
         if 'msbuild-project' not in definition.configuration:
-            extensions = [os.path.splitext(f)[1] for f in os.listdir('.') if os.path.isfile(f)]
+            extensions = [os.path.splitext(f)[1] for f in os.listdir(definition.directory) if os.path.isfile(os.path.join(definition.directory, f))]
             if not set(['.vcproj', '.vcxproj', '.sln']) & set(extensions):
                 return False, 'no projects or solutions present'
 
@@ -5,8 +5,12 @@ import shlex
 import shutil
 import logging
 
-from distutils import dir_util
+from distutils import dir_util, spawn
+from functools import partial
+
 from .. import project
+from ..object_cache import ObjectCache
+from ..scheduler import Scheduler
 
 
 class SourceProject(project.Project):
@@ -18,7 +22,7 @@ class SourceProject(project.Project):
     @staticmethod
     def source_directory(directory, configuration):
         if 'source-directory' in configuration:
-            return configuration['source-directory']
+            return os.path.join(directory, configuration['source-directory'])
         for name in SourceProject.__default_source_directory_names():
             if os.path.exists(os.path.join(directory, name)):
                 return os.path.join(directory, name)
@@ -35,7 +39,7 @@ class SourceProject(project.Project):
     @staticmethod
     def header_directory(directory, configuration):
         if 'header-directory' in configuration:
-            return configuration['header-directory']
+            return os.path.join(directory, configuration['header-directory'])
         for name in SourceProject.__default_header_directory_names():
             if os.path.exists(os.path.join(directory, name)):
                 return os.path.join(directory, name)
@@ -67,13 +71,14 @@ class SourceProject(project.Project):
 
     @staticmethod
     def configuration_keys():
-        return project.Project.configuration_keys() | {'source-directory', 'header-directory', 'exclude'}
+        return project.Project.configuration_keys() | {'source-directory', 'header-directory', 'exclude', 'incremental'}
 
     def build(self, output_directory):
         # check for needs
 
         if self.needy.find_needs_file(self.directory()):
-            needy = Needy(self.directory(), self.needy.parameters())
+            from ..needy import Needy
+            needy = Needy(self.directory(), self.needy.parameters(), jobserver=self.needy.jobserver())
             needy.satisfy_target(self.target())
 
         # compile source
@@ -88,62 +93,104 @@ class SourceProject(project.Project):
         if source_directory:
             include_paths.append(source_directory)
             object_directory = os.path.join(output_directory, 'obj')
-            os.makedirs(object_directory)
+            if not os.path.exists(object_directory):
+                os.makedirs(object_directory)
 
             objects = []
+            scheduler = Scheduler(self.build_concurrency(), jobserver=self.jobserver())
+            object_cache = ObjectCache(os.path.join(self.intermediate_directory(), 'objects')) if self.__is_incremental() else None
 
             for root, dirs, files in os.walk(source_directory):
                 for file in files:
                     input = os.path.join(root, file)
                     relpath = os.path.relpath(input, source_directory)
-                    if self.__should_exclude(relpath):
+                    if self.__should_exclude(relpath) or os.path.splitext(file)[1] not in ['.c', '.cpp']:
                         continue
                     output = os.path.join(object_directory, relpath)
                     name, extension = os.path.splitext(output)
                     output = name + '.o'
 
-                    if self.__compile(input, output, include_paths):
-                        objects.append(output)
+                    if not os.path.exists(os.path.dirname(output)):
+                        os.makedirs(os.path.dirname(output))
+
+                    scheduler.add(input, partial(self.__compile, input, output, include_paths, object_cache))
+                    objects.append(output)
+
+            scheduler.run()
+
+            if object_cache:
+                object_cache.prune()
 
             if len(objects) > 0:
                 self.__link(objects, os.path.join(output_directory, 'lib'))
 
         self.copy_headers(self.directory(), self.configuration(), os.path.join(output_directory, 'include'))
 
-    def __compile(self, input, output, include_paths):
+    def __compile(self, input, output, include_paths, object_cache=None):
         name, extension = os.path.splitext(input)
 
-        if not os.path.exists(os.path.dirname(output)):
-            os.makedirs(os.path.dirname(output))
-
         platform = self.target().platform
         architecture = self.target().architecture
 
-        logging.info('Compiling {}'.format(input))
-
         if platform.identifier() == 'windows':
             flags = ['/c', input, '/Fo{}'.format(output), '/Ox'] + ['/I{}'.format(path) for path in include_paths]
         else:
             flags = ['-c', input, '-o', output, '-O3'] + ['-I{}'.format(path) for path in include_paths]
 
         if extension == '.c':
-            if 'CFLAGS' in os.environ:
-                flags.extend(shlex.split(os.environ['CFLAGS']))
-            self.command((['needy-cc'] if platform.identifier() != 'windows' else platform.c_compiler(architecture)) + flags, verbosity=logging.DEBUG)
+            if self.context().getenv('CFLAGS') is not None:
+                flags.extend(shlex.split(self.context().getenv('CFLAGS')))
+            compiler = platform.c_compiler(architecture, self.context().environment())
+            command = (['needy-cc'] if platform.identifier() != 'windows' else compiler) + flags
         elif extension == '.cpp':
-            if 'CXXFLAGS' in os.environ:
-                flags.extend(shlex.split(os.environ['CXXFLAGS']))
-            self.command((['needy-cxx'] if platform.identifier() != 'windows' else platform.cxx_compiler(architecture)) + flags, verbosity=logging.DEBUG)
+            if self.context().getenv('CXXFLAGS') is not None:
+                flags.extend(shlex.split(self.context().getenv('CXXFLAGS')))
+            compiler = platform.cxx_compiler(architecture, self.context().environment())
+            command = (['needy-cxx'] if platform.identifier() != 'windows' else compiler) + flags
         else:
             return False
 
+        if not object_cache:
+            logging.info('Compiling {}'.format(input))
+            self.command(command, verbosity=logging.DEBUG)
+            return True
+
+        # the wrapper hides the actual compiler, so it's resolved here to make sure compiler changes invalidate objects
+        key = object_cache.key([compiler, self.__compiler_identity(compiler), command], input)
+        if object_cache.restore(key, output):
+            logging.info('Reusing object for {}'.format(input))
+            return True
+
+        logging.info('Compiling {}'.format(input))
+        dependency_file = os.path.splitext(output)[0] + '.d'
+        self.command(command + ['-MD', '-MF', dependency_file], verbosity=logging.DEBUG)
+        object_cache.store(key, output, dependency_file)
+        os.remove(dependency_file)
         return True
 
+    def __compiler_identity(self, compiler):
+        """ identifies the compiler binary by its path, size, and modification time so that upgrades are noticed """
+        executable = compiler[0] if isinstance(compiler, list) else compiler
+        binary_paths = self.target().platform.binary_paths(self.target().architecture)
+        path = os.pathsep.join(binary_paths + [self.context().getenv('PATH', '')])
+        resolved = spawn.find_executable(executable, path)
+        if resolved is None:
+            return [executable]
+        resolved = os.path.realpath(resolved)
+        stat = os.stat(resolved)
+        return [resolved, stat.st_size, stat.st_mtime]
+
+    def __is_incremental(self):
+        if self.configuration('incremental') is not True or not self.intermediate_directory():
+            return False
+        # msvc doesn't produce make-style dependency files
+        return self.target().platform.identifier() != 'windows'
+
     def __link(self, objects, lib_directory):
         platform = self.target().platform
         architecture = self.target().architecture
 
-        name = os.path.basename(os.path.dirname(self.directory()))
+        name = self.name() if self.name() else os.path.basename(os.path.dirname(self.directory()))
 
         output = os.path.join(lib_directory, ('{}.lib' if platform.identifier() == 'windows' else 'lib{}.a').format(name))
         logging.info('Linking {}'.format(output))
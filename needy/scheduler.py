@@ -0,0 +1,98 @@
+import threading
+
+from collections import OrderedDict
+from functools import partial
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class Scheduler:
+    """ Runs jobs concurrently, starting each one as soon as all of its dependencies have finished.
+
+    Jobs are started in the order they were added whenever more than one is ready, so with a concurrency of 1 and jobs
+    added in topological order, they'll run exactly in that order. If a job fails, no new jobs are started, the running
+    jobs are allowed to finish, and the first failure is re-raised from run.
+
+    If a job server is given, the caller is assumed to hold one of its slots, which is lent to the first running job.
+    Every other job holds a token from the job server while it runs.
+    """
+
+    def __init__(self, concurrency=1, jobserver=None):
+        self.__concurrency = max(1, concurrency)
+        self.__jobserver = jobserver
+        self.__jobs = OrderedDict()
+
+    def concurrency(self):
+        return self.__concurrency
+
+    def add(self, name, job, dependencies=[]):
+        if name in self.__jobs:
+            raise ValueError('duplicate job ({})'.format(name))
+        self.__jobs[name] = (job, set(dependencies))
+
+    def run(self):
+        remaining = OrderedDict((name, set(dependencies) & set(self.__jobs.keys())) for name, (job, dependencies) in self.__jobs.items())
+        results = queue.Queue()
+        running = set()
+        implicit_slot_holder = None
+        failure = None
+
+        while remaining or running:
+            if failure is None:
+                for name in [name for name, dependencies in remaining.items() if not dependencies]:
+                    if len(running) >= self.__concurrency:
+                        break
+                    del remaining[name]
+                    running.add(name)
+                    needs_token = self.__jobserver is not None and implicit_slot_holder is not None
+                    if not needs_token:
+                        implicit_slot_holder = name
+                    self.__start(name, results, needs_token)
+
+            if not running:
+                if failure is None:
+                    raise ValueError('circular dependency detected')
+                break
+
+            name, error = results.get()
+            running.remove(name)
+            if name == implicit_slot_holder:
+                implicit_slot_holder = None
+            if error is not None:
+                failure = failure or error
+                continue
+            for dependencies in remaining.values():
+                dependencies.discard(name)
+
+        if failure is not None:
+            raise failure
+
+    def __start(self, name, results, needs_token):
+        job = self.__jobs[name][0]
+        if needs_token:
+            job = partial(Scheduler.__run_with_token, self.__jobserver, job)
+
+        if self.__concurrency == 1:
+            Scheduler.__run_job(name, job, results)
+            return
+
+        thread = threading.Thread(target=Scheduler.__run_job, args=(name, job, results))
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def __run_with_token(jobserver, job):
+        with jobserver.slot():
+            job()
+
+    @staticmethod
+    def __run_job(name, job, results):
+        try:
+            job()
+        except BaseException as e:
+            results.put((name, e))
+            return
+        results.put((name, None))
@@ -1,7 +1,9 @@
 from __future__ import print_function
 
 import io
+import json
 import os
+import re
 import binascii
 import hashlib
 import socket
@@ -18,17 +20,27 @@ try:
 except ImportError:
     import urllib2
 
+try:
+    from http.client import HTTPException
+except ImportError:
+    from httplib import HTTPException
+
+from ..filesystem import clone_tree, file_hash
 from ..source import Source
 
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
 
 class Download(Source):
-    def __init__(self, url, checksum, destination, cache_directory):
+    def __init__(self, url, checksum, destination, cache_directory, buffer_size=DEFAULT_BUFFER_SIZE, store=None):
         Source.__init__(self)
         self.url = url
         self.checksum = checksum
         self.destination = destination
         self.cache_directory = cache_directory
         self.local_download_path = os.path.join(cache_directory, checksum)
+        self.buffer_size = buffer_size
+        self.store = store
 
     @classmethod
     def identifier(cls):
@@ -40,123 +52,223 @@ class Download(Source):
 
         self.__fetch()
 
-        logging.info('Unpacking to %s' % self.destination)
-        self.__clean_destination_dir()
-        self.__unpack()
-        self.__trim_lone_dirs()
+        # the archive is only unpacked once and each clean copies the result, which is much faster for large archives
+        pristine_directory = self.pristine_directory()
+        if not os.path.isdir(pristine_directory):
+            self.__unpack_pristine_directory(pristine_directory)
+
+        logging.info('Copying source to %s' % self.destination)
+        if os.path.exists(self.destination):
+            shutil.rmtree(self.destination)
+        clone_tree(pristine_directory, self.destination)
+
+    def pristine_directory(self):
+        """ the unmodified contents of the archive """
+        return os.path.join(self.cache_directory, self.checksum + '.source')
 
     def __fetch(self):
         if not os.path.exists(self.cache_directory):
             os.makedirs(self.cache_directory)
 
         if not os.path.isfile(self.local_download_path):
-            self.get(self.url, self.checksum, self.local_download_path)
+            if self.store and self.store.get(self.checksum, self.local_download_path):
+                if self.verify_checksum(self.local_download_path, self.checksum, self.buffer_size):
+                    return
+                logging.warning('The download store\'s copy of {} is corrupt. Downloading it again.'.format(self.url))
+                os.remove(self.local_download_path)
+                self.store.remove(self.checksum)
+            self.get(self.url, self.checksum, self.local_download_path, self.buffer_size)
+
+        if self.store:
+            self.store.insert(self.checksum, self.local_download_path)
 
     @classmethod
-    def get(cls, url, checksum, destination):
+    def get(cls, url, checksum, destination, buffer_size=DEFAULT_BUFFER_SIZE, attempts=5, retry_delay=1):
+        """ downloads url to destination. interrupted downloads are kept next to the destination and resumed """
         logging.info('Downloading from %s' % url)
-        download = None
-        attempts = 0
-        download_successful = False
-        while not download_successful and attempts < 5:
+        partial_path = destination + '.partial'
+        hash = None
+        for attempt in range(attempts):
+            if attempt:
+                logging.warning('Download failed. Retrying...')
+                time.sleep(attempt * retry_delay)
             try:
-                download = urllib2.urlopen(url, timeout=5)
-            except urllib2.URLError as e:
-                logging.warning(e)
-            except socket.timeout as e:
+                hash = cls.__download(url, checksum, partial_path, buffer_size)
+                break
+            except (urllib2.URLError, socket.timeout, HTTPException, IOError) as e:
                 logging.warning(e)
-            attempts = attempts + 1
-            download_successful = download and download.code == 200 and 'content-length' in download.info()
-            if not download_successful:
-                logging.warning('Download failed. Retrying...')
-            time.sleep(attempts)
-        if not download_successful:
+        if hash is None:
             raise IOError('unable to download library')
-        size = int(download.info()['content-length'])
-        progress = 0
-        if sys.stdout.isatty():
-            print('{:.1%}'.format(float(progress) / size), end='')
-            sys.stdout.flush()
 
-        local_file = tempfile.NamedTemporaryFile('wb', delete=False)
+        if hash.digest() != binascii.unhexlify(checksum):
+            cls.__remove_partial_download(partial_path)
+            raise ValueError('incorrect checksum')
+        logging.debug('Checksum verified.')
+
+        shutil.move(partial_path, destination)
+        cls.__remove_partial_download(partial_path)
+
+    @classmethod
+    def __download(cls, url, checksum, path, buffer_size):
+        """ downloads url to path, continuing from where a previous download left off if the resource hasn't changed.
+        returns the checksum's hash object for the complete file """
+        metadata_path = path + '.json'
+        offset = 0
+        validator = None
+        if os.path.isfile(path) and os.path.isfile(metadata_path):
+            try:
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+                if metadata.get('url') == url and metadata.get('validator'):
+                    offset = os.path.getsize(path)
+                    validator = metadata['validator']
+            except ValueError:
+                pass
+
+        # If-Range makes the server send the whole resource instead of a range if it changed since the first request
+        headers = {'Range': 'bytes={}-'.format(offset), 'If-Range': validator} if offset else {}
         try:
-            chunk_size = 1024
-            while True:
-                chunk = download.read(chunk_size)
-                progress = progress + chunk_size
-                if sys.stdout.isatty():
-                    print('\r{:.1%}'.format(float(progress) / size), end='')
-                    sys.stdout.flush()
-                if not chunk:
-                    break
-                local_file.write(chunk)
-
-            local_file.close()
-            if sys.stdout.isatty():
-                print('\r       \r', end='')
-                sys.stdout.flush()
-
-            logging.debug('Verifying checksum...')
-            if not cls.verify_checksum(local_file.name, checksum):
-                raise ValueError('incorrect checksum')
-            logging.debug('Checksum verified.')
-
-            shutil.move(local_file.name, destination)
-        except:
-            os.unlink(local_file.name)
+            response = urllib2.urlopen(urllib2.Request(url, headers=headers), timeout=5)
+        except urllib2.HTTPError as e:
+            if e.code == 416:
+                cls.__remove_partial_download(path)
             raise
 
-        del download
+        info = response.info()
+        if response.getcode() == 206 and offset:
+            content_range = re.match(r'bytes (\d+)-', info.get('Content-Range', ''))
+            if not content_range or int(content_range.group(1)) != offset:
+                cls.__remove_partial_download(path)
+                raise IOError('unexpected content range: {}'.format(info.get('Content-Range')))
+        elif response.getcode() == 200:
+            offset = 0
+            etag = info.get('ETag')
+            validator = etag if etag and not etag.startswith('W/') else info.get('Last-Modified')
+            with open(metadata_path, 'w') as f:
+                json.dump({'url': url, 'validator': validator}, f)
+        else:
+            raise IOError('unexpected response status: {}'.format(response.getcode()))
 
-    @classmethod
-    def verify_checksum(cls, path, expected):
-        expected = binascii.unhexlify(expected)
+        # the checksum is computed as the file is written so that it doesn't need to be read again afterwards
+        hash = cls.checksum_hash(checksum)
+        if offset:
+            logging.debug('Resuming download at byte {}'.format(offset))
+            with open(path, 'rb') as f:
+                file_hash(f, hash, buffer_size)
 
+        length = int(info['Content-Length']) if 'Content-Length' in info else None
+        progress = _Progress(offset + length if length is not None else None, offset)
+        received = 0
+        try:
+            with open(path, 'ab' if offset else 'wb') as f:
+                while True:
+                    chunk = response.read(buffer_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    hash.update(chunk)
+                    received += len(chunk)
+                    progress.update(len(chunk))
+        finally:
+            progress.clear()
+            response.close()
+
+        if length is not None and received < length:
+            raise IOError('connection closed after {} of {} bytes'.format(offset + received, offset + length))
+        return hash
+
+    @staticmethod
+    def __remove_partial_download(path):
+        for p in [path, path + '.json']:
+            if os.path.exists(p):
+                os.remove(p)
+
+    @staticmethod
+    def checksum_hash(checksum):
+        """ returns a new hash object of the type that produces the given hex digest """
+        digest_size = len(binascii.unhexlify(checksum))
+        for algorithm in [hashlib.md5, hashlib.sha1, hashlib.sha256, hashlib.sha512]:
+            if algorithm().digest_size == digest_size:
+                return algorithm()
+        raise ValueError('unknown checksum type')
+
+    @classmethod
+    def verify_checksum(cls, path, expected, buffer_size=DEFAULT_BUFFER_SIZE):
         with open(path, 'rb') as file:
-            file_contents = file.read()
-            hash = None
-            if len(expected) == hashlib.md5().digest_size:
-                hash = hashlib.md5()
-            elif len(expected) == hashlib.sha1().digest_size:
-                hash = hashlib.sha1()
-            else:
-                raise ValueError('unknown checksum type')
-            hash.update(file_contents)
-            return expected == hash.digest()
-
-    def __clean_destination_dir(self):
-        if os.path.exists(self.destination):
-            shutil.rmtree(self.destination)
-        os.makedirs(self.destination)
+            return file_hash(file, cls.checksum_hash(expected), buffer_size) == binascii.unhexlify(expected)
+
+    def __unpack_pristine_directory(self, pristine_directory):
+        # the archive is unpacked next to the pristine directory and moved into place once it's complete
+        temporary_directory = tempfile.mkdtemp(dir=self.cache_directory, prefix='.unpack')
+        try:
+            unpack_directory = os.path.join(temporary_directory, 'source')
+            os.makedirs(unpack_directory)
+            logging.info('Unpacking to %s' % pristine_directory)
+            self.__unpack(unpack_directory)
+            self.__trim_lone_dirs(unpack_directory, os.path.join(temporary_directory, 'temp_'))
+            try:
+                os.rename(unpack_directory, pristine_directory)
+            except OSError:
+                if not os.path.isdir(pristine_directory):
+                    raise
+        finally:
+            shutil.rmtree(temporary_directory)
 
-    def __unpack(self):
+    def __unpack(self, destination):
         if tarfile.is_tarfile(self.local_download_path):
-            self.__tarfile_unpack()
+            self.__tarfile_unpack(destination)
             return
         if zipfile.is_zipfile(self.local_download_path):
-            self.__zipfile_unpack()
+            self.__zipfile_unpack(destination)
             return
 
-    def __tarfile_unpack(self):
+    def __tarfile_unpack(self, destination):
         with open(self.local_download_path, 'rb') as file:
             tar = tarfile.open(fileobj=file, mode='r|*')
-            tar.extractall(self.destination if isinstance(self.destination, str) else self.destination.encode(sys.getfilesystemencoding()))
+            tar.extractall(destination if isinstance(destination, str) else destination.encode(sys.getfilesystemencoding()))
             del tar
 
-    def __zipfile_unpack(self):
+    def __zipfile_unpack(self, destination):
         with zipfile.ZipFile(self.local_download_path, 'r') as file:
-            file.extractall(self.destination)
-
-    def __trim_lone_dirs(self):
-        temporary_directory = os.path.join(self.cache_directory, 'temp_')
+            file.extractall(destination)
 
+    @staticmethod
+    def __trim_lone_dirs(directory, temporary_directory):
         while True:
-            destination_contents = os.listdir(self.destination)
-            if len(destination_contents) != 1:
+            contents = os.listdir(directory)
+            if len(contents) != 1:
                 break
-            lone_directory = os.path.join(self.destination, destination_contents[0])
+            lone_directory = os.path.join(directory, contents[0])
             if not os.path.isdir(lone_directory):
                 break
             shutil.move(lone_directory, temporary_directory)
-            shutil.rmtree(self.destination)
-            shutil.move(temporary_directory, self.destination)
+            shutil.rmtree(directory)
+            shutil.move(temporary_directory, directory)
+
+
+class _Progress:
+    """ prints download progress to terminals, at most a few times per second """
+
+    def __init__(self, size, progress=0, interval=0.2):
+        self.__size = size
+        self.__interval = interval
+        self.__progress = progress
+        self.__last_print = None
+        self.__enabled = sys.stdout.isatty() and bool(size)
+        self.__print()
+
+    def update(self, bytes):
+        self.__progress += bytes
+        if time.time() - self.__last_print >= self.__interval:
+            self.__print()
+
+    def clear(self):
+        if self.__enabled:
+            print('\r       \r', end='')
+            sys.stdout.flush()
+
+    def __print(self):
+        self.__last_print = time.time()
+        if self.__enabled:
+            print('\r{:.1%}'.format(float(self.__progress) / self.__size), end='')
+            sys.stdout.flush()
@@ -1,30 +1,31 @@
 import os
+import re
 import logging
 import distutils.spawn
 import subprocess
 
 from ..source import Source
-from ..cd import cd
+from ..execution_context import ExecutionContext
 from ..process import command, command_output
 
 
 class GitRepository(Source):
-    def __init__(self, repository, commit, directory):
+    def __init__(self, repository, commit, directory, mirrors=None):
         Source.__init__(self)
         self.repository = repository
         self.commit = commit
         self.directory = directory
+        self.mirrors = mirrors
 
     @classmethod
     def identifier(cls):
         return 'git'
 
     def status_text(self):
-        with cd(self.directory):
-            rev_list = subprocess.check_output(['git', 'rev-list', '--left-right', '{}...'.format(self.commit)]).decode().splitlines()
-            ahead = len([1 for rev in rev_list if rev[0] == '>'])
-            behind = len([1 for rev in rev_list if rev[0] == '<'])
-            diff = subprocess.check_output(['git', 'diff-index', 'HEAD']).decode().splitlines()
+        rev_list = subprocess.check_output(['git', 'rev-list', '--left-right', '{}...'.format(self.commit)], cwd=self.directory).decode().splitlines()
+        ahead = len([1 for rev in rev_list if rev[0] == '>'])
+        behind = len([1 for rev in rev_list if rev[0] == '<'])
+        diff = subprocess.check_output(['git', 'diff-index', 'HEAD'], cwd=self.directory).decode().splitlines()
 
         ret = []
         if ahead:
@@ -39,14 +40,24 @@ class GitRepository(Source):
     def clean(self):
         GitRepository.__assert_git_availability()
 
+        mirror = None
+        if self.mirrors:
+            # branches and tags can move, so the mirror is fetched unless it already has the pinned object
+            pinned = self.__pins_object()
+            mirror = self.mirrors.update(self.repository, self.commit if pinned else None, fetch=not pinned)
         self.__repair_source()
-        self.__fetch()
-
-        with cd(self.directory):
-            command(['git', 'clean', '-xffd'], logging.DEBUG)
-            command(['git', 'reset', 'HEAD', '--hard'], logging.DEBUG)
-            command(['git', 'checkout', '--force', self.commit], logging.DEBUG)
-            command(['git', 'submodule', 'update', '--init', '--recursive'], logging.DEBUG)
+        if mirror:
+            self.__borrow_objects(mirror)
+        if self.__has_commit():
+            logging.debug('{} is already present, skipping fetch'.format(self.commit))
+        else:
+            self.__fetch_commit()
+
+        command(['git', 'clean', '-xffd'], logging.DEBUG, context=self.__context())
+        # HEAD doesn't exist yet in repositories that were only initialized, so the checkout comes first
+        command(['git', 'checkout', '--force', self.commit], logging.DEBUG, context=self.__context())
+        command(['git', 'reset', 'HEAD', '--hard'], logging.DEBUG, context=self.__context())
+        self.__update_submodules()
 
     def synchronize(self):
         GitRepository.__assert_git_availability()
@@ -54,10 +65,17 @@ class GitRepository(Source):
         if not os.path.exists(os.path.join(self.directory, '.git')):
             self.__fetch(verbosity=logging.INFO)
 
-        with cd(self.directory):
-            command(['git', 'fetch'])
-            command(['git', 'checkout', self.commit])
-            command(['git', 'submodule', 'update', '--init', '--recursive'])
+        GitRepository.unshallow(self.directory, verbosity=logging.INFO)
+        command(['git', 'fetch'], context=self.__context())
+        command(['git', 'checkout', self.commit], context=self.__context())
+        command(['git', 'submodule', 'update', '--init', '--recursive'], context=self.__context())
+
+    @staticmethod
+    def unshallow(directory, verbosity=logging.DEBUG):
+        """ fetches the history that's missing from repositories cleaned outside of development mode, which only fetch the
+        pinned commit. development mode needs it for status, log, and moving between commits """
+        if os.path.exists(os.path.join(directory, '.git', 'shallow')):
+            command(['git', 'fetch', '--unshallow'], verbosity, context=ExecutionContext(directory))
 
     def __repair_source(self):
         if not os.path.exists(os.path.join(self.directory, '.git')):
@@ -70,38 +88,103 @@ class GitRepository(Source):
 
     def __current_remote(self, remote):
         if os.path.exists(self.directory):
-            with cd(self.directory):
-                try:
-                    return command_output(['git', 'config', '--get', 'remote.{}.url'.format(remote)], logging.DEBUG).strip()
-                except subprocess.CalledProcessError:
-                    pass
-
-    def __replace_remote(self, remote, git_url, verbosity=logging.DEBUG):
-        with cd(self.directory):
             try:
-                command(['git', 'remote', 'remove', 'origin'], verbosity)
+                return command_output(['git', 'config', '--get', 'remote.{}.url'.format(remote)], logging.DEBUG, context=self.__context()).strip()
             except subprocess.CalledProcessError:
                 pass
-            command(['git', 'remote', 'add', 'origin', self.repository], verbosity)
 
-    def __fetch(self, verbosity=logging.DEBUG):
-        with cd(self.directory):
+    def __replace_remote(self, remote, git_url, verbosity=logging.DEBUG):
+        try:
+            command(['git', 'remote', 'remove', 'origin'], verbosity, context=self.__context())
+        except subprocess.CalledProcessError:
+            pass
+        command(['git', 'remote', 'add', 'origin', self.repository], verbosity, context=self.__context())
+
+    def __pins_object(self):
+        """ whether the commit is an object id rather than a ref that can move """
+        return re.match(r'^[0-9a-fA-F]{7,40}$', self.commit) is not None
+
+    def __has_commit(self):
+        if not self.__pins_object():
+            return False
+        try:
+            command(['git', 'cat-file', '-e', '{}^{{commit}}'.format(self.commit)], logging.DEBUG, context=self.__context())
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def __fetch_commit(self, verbosity=logging.DEBUG):
+        """ fetches just the pinned commit if possible, falling back to fetching every ref """
+        if self.__pins_object() and len(self.commit) == 40:
             try:
-                command(['git', 'fetch'], verbosity)
+                command(['git', 'fetch', '--depth', '1', 'origin', self.commit], verbosity, context=self.__context())
+                return
             except subprocess.CalledProcessError:
-                # we should be okay with this to enable offline builds
-                logging.warn('git fetch failed for {}'.format(self.directory))
-                pass
+                logging.debug('unable to fetch {} by itself, fetching all refs'.format(self.commit))
+        self.__fetch(verbosity)
+
+    def __borrow_objects(self, mirror):
+        """ lets the repository use objects from the mirror instead of fetching them. this is what clone's --reference does """
+        alternates_path = os.path.join(self.directory, '.git', 'objects', 'info', 'alternates')
+        objects = os.path.join(os.path.abspath(mirror), 'objects')
+        alternates = []
+        if os.path.exists(alternates_path):
+            with open(alternates_path, 'r') as f:
+                alternates = f.read().splitlines()
+        if objects in alternates:
+            return
+        if not os.path.exists(os.path.dirname(alternates_path)):
+            os.makedirs(os.path.dirname(alternates_path))
+        with open(alternates_path, 'a') as f:
+            f.write(objects + '\n')
+
+    def __update_submodules(self, verbosity=logging.DEBUG):
+        if self.mirrors and os.path.exists(os.path.join(self.directory, '.gitmodules')):
+            # top-level submodules are cloned with references to their own mirrors
+            for path, url in self.__submodules():
+                commit = command_output(['git', 'rev-parse', 'HEAD:{}'.format(path)], logging.DEBUG, context=self.__context()).strip()
+                mirror = self.mirrors.update(url, commit)
+                command(['git', 'submodule', 'update', '--init', '--reference', mirror, '--', path], verbosity, context=self.__context())
+        command(['git', 'submodule', 'update', '--init', '--recursive'], verbosity, context=self.__context())
+
+    def __submodules(self):
+        """ returns (path, url) tuples for the submodules with absolute urls """
+        try:
+            output = command_output(['git', 'config', '--file', '.gitmodules', '--get-regexp', r'^submodule\..*\.(path|url)$'], logging.DEBUG, context=self.__context())
+        except subprocess.CalledProcessError:
+            return []
+        submodules = {}
+        for line in output.splitlines():
+            key, value = line.split(' ', 1)
+            name, attribute = key[len('submodule.'):].rsplit('.', 1)
+            submodules.setdefault(name, {})[attribute] = value
+        return [(s['path'], s['url']) for s in submodules.values() if 'path' in s and 'url' in s and not s['url'].startswith('.')]
+
+    def __fetch(self, verbosity=logging.DEBUG):
+        try:
+            command(['git', 'fetch'], verbosity, context=self.__context())
+        except subprocess.CalledProcessError:
+            # we should be okay with this to enable offline builds
+            logging.warn('git fetch failed for {}'.format(self.directory))
+            pass
 
     def __clone(self, verbosity=logging.DEBUG):
         if not os.path.exists(os.path.dirname(self.directory)):
             os.makedirs(os.path.dirname(self.directory))
 
-        with cd(os.path.dirname(self.directory)):
-            command(['git', 'clone', self.repository, os.path.basename(self.directory)], verbosity)
+        if self.__pins_object() and len(self.commit) == 40:
+            # an empty repository is enough since clean only fetches the pinned commit
+            command(['git', 'init', os.path.basename(self.directory)], verbosity, context=ExecutionContext(os.path.dirname(self.directory)))
+            command(['git', 'remote', 'add', 'origin', self.repository], verbosity, context=self.__context())
+            return
+
+        reference = ['--reference', self.mirrors.update(self.repository)] if self.mirrors else []
+        command(['git', 'clone'] + reference + [self.repository, os.path.basename(self.directory)], verbosity, context=ExecutionContext(os.path.dirname(self.directory)))
+
+        self.__update_submodules(verbosity)
 
-        with cd(self.directory):
-            command(['git', 'submodule', 'update', '--init', '--recursive'], verbosity)
+    def __context(self):
+        return ExecutionContext(self.directory)
 
     @classmethod
     def __assert_git_availability(cls):
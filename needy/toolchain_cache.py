@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from .filesystem import lock_file
+
+
+class ToolchainCache:
+    """ Persists the results of toolchain probes, such as running a compiler's preprocessor, between runs.
+
+    Results are stored per binary and are discarded as soon as the binary's size, modification time, or inode change,
+    so upgrading or replacing a compiler invalidates everything that was learned about it.
+    """
+
+    def __init__(self, path):
+        self.__path = path
+        self.__lock = threading.Lock()
+
+    def path(self):
+        return self.__path
+
+    def get(self, binary, probe, compute):
+        """ returns the result of compute for the binary. probe should identify the probe and any other inputs to it.
+        results are computed every time if the binary doesn't exist, and results that are None or empty aren't stored """
+        fingerprint = ToolchainCache.__fingerprint(binary)
+        if fingerprint is None:
+            return compute()
+        binary = os.path.realpath(binary)
+
+        with self.__lock:
+            entry = self.__read().get(binary)
+            if entry and entry['fingerprint'] == fingerprint and probe in entry['probes']:
+                return entry['probes'][probe]
+
+        value = compute()
+        if value is None or (isinstance(value, (list, dict)) and not value):
+            return value
+
+        with self.__lock:
+            fd = self.__lock_file()
+            try:
+                # re-read to keep results written by other processes in the meantime
+                entries = self.__read()
+                entry = entries.get(binary)
+                if not entry or entry['fingerprint'] != fingerprint:
+                    entry = entries[binary] = {'fingerprint': fingerprint, 'probes': {}}
+                entry['probes'][probe] = value
+                self.__write(entries)
+            finally:
+                if fd is not None:
+                    os.close(fd)
+        return value
+
+    @staticmethod
+    def __fingerprint(binary):
+        try:
+            s = os.stat(binary)
+        except (OSError, TypeError):
+            return None
+        return [s.st_size, s.st_mtime, s.st_ino]
+
+    def __lock_file(self):
+        """ locks the cache against other processes, returning the file descriptor of the lock or None on failure """
+        try:
+            if not os.path.exists(os.path.dirname(self.__path)):
+                os.makedirs(os.path.dirname(self.__path))
+            return lock_file(self.__path + '.lock')
+        except (IOError, OSError) as e:
+            logging.debug('unable to lock the toolchain cache: {}'.format(e))
+            return None
+
+    def __read(self):
+        try:
+            with open(self.__path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def __write(self, entries):
+        staging_path = None
+        try:
+            fd, staging_path = tempfile.mkstemp(prefix=os.path.basename(self.__path) + '.', suffix='.tmp',
+                                                dir=os.path.dirname(self.__path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f, sort_keys=True)
+            if os.path.exists(self.__path):
+                os.remove(self.__path)
+            os.rename(staging_path, self.__path)
+        except (IOError, OSError) as e:
+            # the cache is only an optimization
+            logging.debug('unable to write the toolchain cache: {}'.format(e))
+            if staging_path and os.path.exists(staging_path):
+                os.remove(staging_path)
+
+
+__default_toolchain_cache = None
+__default_toolchain_cache_lock = threading.Lock()
+
+
+def default_toolchain_cache():
+    """ returns the toolchain cache shared by all platforms """
+    global __default_toolchain_cache
+    with __default_toolchain_cache_lock:
+        if __default_toolchain_cache is None:
+            __default_toolchain_cache = ToolchainCache(os.path.join(os.path.expanduser('~'), '.needy', 'toolchains.json'))
+        return __default_toolchain_cache
@@ -0,0 +1,64 @@
+import logging
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class BackgroundUploader:
+    """ Runs build cache uploads on background threads so that builds don't wait for them.
+
+    At most max_pending uploads wait in the queue. Submitting more blocks until one of them starts, which bounds the
+    work that can pile up behind a slow cache. Failures are collected and returned by wait.
+    """
+
+    def __init__(self, threads=2, max_pending=8):
+        self.__queue = queue.Queue(max_pending)
+        self.__thread_count = threads
+        self.__threads = []
+        self.__failures = []
+        self.__lock = threading.Lock()
+
+    def submit(self, description, function):
+        with self.__lock:
+            if not self.__threads:
+                for _ in range(self.__thread_count):
+                    thread = threading.Thread(target=self.__work)
+                    thread.daemon = True
+                    thread.start()
+                    self.__threads.append(thread)
+            is_worker = threading.current_thread() in self.__threads
+        if not is_worker:
+            self.__queue.put((description, function))
+            return
+        # uploads can submit follow-up uploads, but workers can't wait for room in the queue since only they make it
+        try:
+            self.__queue.put_nowait((description, function))
+        except queue.Full:
+            self.__run(description, function)
+
+    def wait(self):
+        """ waits for all submitted uploads to finish. returns a (description, exception) tuple for each failure """
+        self.__queue.join()
+        with self.__lock:
+            failures, self.__failures = self.__failures, []
+        return failures
+
+    def __work(self):
+        while True:
+            description, function = self.__queue.get()
+            try:
+                self.__run(description, function)
+            finally:
+                self.__queue.task_done()
+
+    def __run(self, description, function):
+        try:
+            function()
+        except Exception as e:
+            logging.debug(traceback.format_exc())
+            with self.__lock:
+                self.__failures.append((description, e))
@@ -34,7 +34,7 @@ class TestCase(unittest.TestCase):
 
     def source_directory(self, library, target=Target(host_platform()())):
         needy = Needy(self.path())
-        return needy.source_directory(library)
+        return needy.source_directory(library, target)
 
     def needs_directory(self):
         needy = Needy(self.path())
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import sys
+import unittest
+
+from ..functional_test import TestCase
+
+
+class RecordingHandler(logging.Handler):
+    """ keeps the messages that are logged while it's installed """
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.INFO)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class SourceProjectTest(TestCase):
+    def test_concurrent_compilation(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'include'))
+        os.makedirs(os.path.join(source_directory, 'src', 'nested'))
+        with open(os.path.join(source_directory, 'include', 'mylib.h'), 'w') as f:
+            f.write('int mylib_value(int i);\n')
+        for i in range(8):
+            with open(os.path.join(source_directory, 'src', 'nested' if i % 2 else '', 'file{}.c'.format(i)), 'w') as f:
+                f.write('#include "mylib.h"\nint mylib_value{0}(int i) {{ return i + {0}; }}\n'.format(i))
+        with open(os.path.join(source_directory, 'src', 'excluded.c'), 'w') as f:
+            f.write('this will not compile\n')
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'project': {
+                            'type': 'source',
+                            'exclude': 'excluded.c'
+                        }
+                    }
+                }
+            }))
+        self.assertEqual(self.execute(['satisfy', '-j', '4']), 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.build_directory('mylib'), 'include', 'mylib.h')))
+        self.assertTrue(os.path.isfile(os.path.join(self.build_directory('mylib'), 'lib', 'mylib.lib' if sys.platform == 'win32' else 'libmylib.a')))
+        object_directory = os.path.join(self.build_directory('mylib'), 'obj')
+        self.assertEqual(sum([len(files) for _, _, files in os.walk(object_directory)]), 8)
+
+    def test_nested_needs(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'src'))
+        os.makedirs(os.path.join(source_directory, 'nested', 'src'))
+        with open(os.path.join(source_directory, 'src', 'mylib.c'), 'w') as f:
+            f.write('int mylib() { return 1; }\n')
+        with open(os.path.join(source_directory, 'nested', 'src', 'nested.c'), 'w') as f:
+            f.write('int nested() { return 2; }\n')
+        with open(os.path.join(source_directory, 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'nested': {
+                        'directory': 'nested',
+                        'project': {
+                            'type': 'source'
+                        }
+                    }
+                }
+            }))
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'project': {
+                            'type': 'source'
+                        }
+                    }
+                }
+            }))
+        self.assertEqual(self.execute(['satisfy', '-j', '2']), 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.build_directory('mylib'), 'lib', 'mylib.lib' if sys.platform == 'win32' else 'libmylib.a')))
+        nested_archives = [f for _, _, files in os.walk(self.path()) for f in files if f.startswith('libnested') or f == 'nested.lib']
+        self.assertEqual(nested_archives, ['nested.lib' if sys.platform == 'win32' else 'libnested.a'])
+
+    @unittest.skipIf(sys.platform == 'win32', 'the compiler wrapper is a shell script')
+    def test_compiler_from_library_environment(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'src'))
+        with open(os.path.join(source_directory, 'src', 'mylib.c'), 'w') as f:
+            f.write('int mylib() { return 1; }\n')
+        compiler = os.path.join(self.path(), 'mycc')
+        with open(compiler, 'w') as f:
+            f.write('#!/bin/sh\ntouch "{}"\nexec cc "$@"\n'.format(os.path.join(self.path(), 'used')))
+        os.chmod(compiler, 0o755)
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'project': {
+                            'type': 'source',
+                            'environment': {
+                                'CC': compiler
+                            }
+                        }
+                    }
+                }
+            }))
+        self.assertEqual(self.satisfy(), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.path(), 'used')))
+
+    def test_isolated_source(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'src'))
+        with open(os.path.join(source_directory, 'src', 'mylib.c'), 'w') as f:
+            f.write('int mylib() { return 1; }\n')
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'isolated-source': True,
+                        'project': {
+                            'type': 'source'
+                        }
+                    }
+                }
+            }))
+        self.assertEqual(self.satisfy(), 0)
+        # the archive is named after the library, not the isolated source directory
+        archives = [name for name in os.listdir(os.path.join(self.build_directory('mylib'), 'lib')) if name != 'pkgconfig']
+        self.assertEqual(archives, ['mylib.lib' if sys.platform == 'win32' else 'libmylib.a'])
+
+    @unittest.skipIf(sys.platform == 'win32', 'incremental compilation is not supported on windows')
+    def test_incremental_compilation(self):
+        compiler = os.path.join(self.path(), 'mycc')
+        with open(compiler, 'w') as f:
+            f.write('#!/bin/sh\nexec cc "$@"\n')
+        os.chmod(compiler, 0o755)
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'src'))
+        with open(os.path.join(source_directory, 'src', 'mylib.h'), 'w') as f:
+            f.write('#define MYLIB_VALUE 1\n')
+        with open(os.path.join(source_directory, 'src', 'a.c'), 'w') as f:
+            f.write('#include "mylib.h"\nint a() { return MYLIB_VALUE; }\n')
+        with open(os.path.join(source_directory, 'src', 'b.c'), 'w') as f:
+            f.write('int b() { return 2; }\n')
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'project': {
+                            'type': 'source',
+                            'incremental': True,
+                            'environment': {
+                                'CC': compiler
+                            }
+                        }
+                    }
+                }
+            }))
+
+        def compiled_files():
+            handler = RecordingHandler()
+            logging.getLogger().addHandler(handler)
+            try:
+                self.assertEqual(self.execute(['satisfy', '--force-build']), 0)
+            finally:
+                logging.getLogger().removeHandler(handler)
+            return sorted([os.path.basename(message.split('Compiling ')[1]) for message in handler.messages if message.startswith('Compiling ')])
+
+        self.assertEqual(compiled_files(), ['a.c', 'b.c'])
+        self.assertEqual(compiled_files(), [])
+        with open(os.path.join(source_directory, 'src', 'mylib.h'), 'w') as f:
+            f.write('#define MYLIB_VALUE 2\n')
+        self.assertEqual(compiled_files(), ['a.c'])
+        # replacing the compiler invalidates everything
+        with open(compiler, 'a') as f:
+            f.write('# upgraded\n')
+        self.assertEqual(compiled_files(), ['a.c', 'b.c'])
+        self.assertTrue(os.path.isfile(os.path.join(self.build_directory('mylib'), 'lib', 'libmylib.a')))
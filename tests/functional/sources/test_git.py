@@ -1,7 +1,11 @@
 import json
 import os
+import shutil
+import subprocess
 import sys
 
+from needy.platforms import host_platform
+
 from ..functional_test import TestCase
 
 
@@ -38,3 +42,166 @@ class GitTest(TestCase):
                 }
             }))
         self.assertEqual(self.satisfy(), 0)
+
+    GIT = ['git', '-c', 'user.name=needy', '-c', 'user.email=needy@example.com', '-c', 'protocol.file.allow=always']
+
+    def repository(self, name, commits=1, submodules={}):
+        """ creates a repository with a file containing the commit's index. returns the path and the commit ids """
+        path = os.path.join(self.path(), name)
+        os.makedirs(path)
+        subprocess.check_call(self.GIT + ['init', '-q'], cwd=path)
+        for submodule_path, url in submodules.items():
+            subprocess.check_call(self.GIT + ['submodule', '-q', 'add', url, submodule_path], cwd=path)
+        ret = []
+        for i in range(commits):
+            with open(os.path.join(path, 'file'), 'w') as f:
+                f.write(str(i))
+            subprocess.check_call(self.GIT + ['add', 'file'], cwd=path)
+            subprocess.check_call(self.GIT + ['commit', '-q', '-m', str(i)], cwd=path)
+            ret.append(subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=path).decode().strip())
+        return path, ret
+
+    def write_needs_file(self, repository, commit):
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'repository': repository,
+                        'commit': commit,
+                        'project': {
+                            'build-steps': [
+                                'echo noop'
+                            ]
+                        }
+                    }
+                }
+            }))
+
+    def test_pinned_commit(self):
+        upstream, commits = self.repository('upstream', commits=3)
+        self.write_needs_file(upstream, commits[1])
+        self.assertEqual(self.satisfy(), 0)
+
+        source = os.path.join(self.path(), 'needs', 'mylib', 'source')
+        with open(os.path.join(source, 'file'), 'r') as f:
+            self.assertEqual(f.read(), '1')
+
+        def has_commit(commit):
+            return subprocess.call(['git', 'cat-file', '-e', '{}^{{commit}}'.format(commit)], cwd=source) == 0
+
+        # only the pinned commit is fetched
+        self.assertTrue(has_commit(commits[1]))
+        self.assertFalse(has_commit(commits[0]))
+        self.assertFalse(has_commit(commits[2]))
+
+        # the pinned commit is present, so building again doesn't need the repository
+        shutil.move(upstream, upstream + '-moved')
+        self.assertEqual(self.execute(['satisfy', '-f']), 0)
+        with open(os.path.join(source, 'file'), 'r') as f:
+            self.assertEqual(f.read(), '1')
+
+    def test_development_mode_history(self):
+        upstream, commits = self.repository('upstream', commits=3)
+        self.write_needs_file(upstream, commits[1])
+        self.assertEqual(self.satisfy(), 0)
+
+        source = os.path.join(self.path(), 'needs', 'mylib', 'source')
+        self.assertTrue(os.path.exists(os.path.join(source, '.git', 'shallow')))
+
+        # development mode needs the history for status and log
+        self.assertEqual(self.execute(['dev', 'enable', 'mylib']), 0)
+        self.assertFalse(os.path.exists(os.path.join(source, '.git', 'shallow')))
+        self.assertEqual(subprocess.call(['git', 'cat-file', '-e', '{}^{{commit}}'.format(commits[0])], cwd=source), 0)
+
+    def test_isolated_source(self):
+        upstream, commits = self.repository('upstream', commits=2)
+        architectures = [host_platform()().default_architecture(), 'other']
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'repository': 'file://' + upstream,
+                        'commit': commits[1],
+                        'isolated-source': True,
+                        'project': {
+                            'build-steps': [
+                                'echo noop'
+                            ]
+                        }
+                    }
+                },
+                'universal-binaries': {
+                    'ub': {
+                        'host': architectures
+                    }
+                }
+            }))
+        self.assertEqual(self.execute(['satisfy', '-u', 'ub']), 0)
+
+        # without configured mirrors, the library gets one of its own that the targets borrow objects from
+        self.assertEqual(len([name for name in os.listdir(os.path.join(self.path(), 'needs', 'mylib', 'mirror')) if not name.endswith('.lock')]), 1)
+        for architecture in architectures:
+            source = os.path.join(self.path(), 'needs', 'mylib', 'isolated-source', host_platform().identifier(), architecture)
+            with open(os.path.join(source, 'file'), 'r') as f:
+                self.assertEqual(f.read(), '1')
+            self.assertEqual(subprocess.check_output(['git', 'count-objects'], cwd=source).decode().split()[0], '0')
+
+    def test_mirrors(self):
+        dependency, dependency_commits = self.repository('dependency')
+        upstream, commits = self.repository('upstream', commits=2, submodules={'dependency': 'file://' + dependency})
+        mirrors = os.path.join(self.path(), 'mirrors')
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+            f.write(json.dumps({'git-mirrors': mirrors}))
+        self.write_needs_file(upstream, commits[1])
+
+        # submodules with file urls have to be allowed explicitly
+        environment = os.environ.copy()
+        os.environ.update({'GIT_CONFIG_COUNT': '1', 'GIT_CONFIG_KEY_0': 'protocol.file.allow', 'GIT_CONFIG_VALUE_0': 'always'})
+        try:
+            self.check_mirrors(upstream, commits, mirrors)
+        finally:
+            os.environ.clear()
+            os.environ.update(environment)
+
+    def test_mirrors_with_tags(self):
+        upstream, commits = self.repository('upstream', commits=1)
+        subprocess.check_call(self.GIT + ['tag', 'v1'], cwd=upstream)
+        mirrors = os.path.join(self.path(), 'mirrors')
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+            f.write(json.dumps({'git-mirrors': mirrors}))
+        self.write_needs_file('file://' + upstream, 'v1')
+        self.assertEqual(self.satisfy(), 0)
+
+        with open(os.path.join(upstream, 'file'), 'w') as f:
+            f.write('1')
+        subprocess.check_call(self.GIT + ['commit', '-q', '-a', '-m', '1'], cwd=upstream)
+        subprocess.check_call(self.GIT + ['tag', 'v2'], cwd=upstream)
+        self.write_needs_file('file://' + upstream, 'v2')
+        self.assertEqual(self.satisfy(), 0)
+
+        # refs aren't object ids, so the mirror is fetched and the new objects are borrowed from it
+        source = os.path.join(self.path(), 'needs', 'mylib', 'source')
+        with open(os.path.join(source, 'file'), 'r') as f:
+            self.assertEqual(f.read(), '1')
+        self.assertEqual(subprocess.check_output(['git', 'count-objects'], cwd=source).decode().split()[0], '0')
+
+    def check_mirrors(self, upstream, commits, mirrors):
+        self.assertEqual(self.satisfy(), 0)
+        self.assertEqual(len([name for name in os.listdir(mirrors) if not name.endswith('.lock')]), 2)
+        source = os.path.join(self.path(), 'needs', 'mylib', 'source')
+        with open(os.path.join(source, 'dependency', 'file'), 'r') as f:
+            self.assertEqual(f.read(), '0')
+
+        # objects are borrowed from the mirrors instead of being stored in the workspace
+        for git_directory in [os.path.join(source, '.git'), os.path.join(source, '.git', 'modules', 'dependency')]:
+            with open(os.path.join(git_directory, 'objects', 'info', 'alternates'), 'r') as f:
+                self.assertEqual(len(f.read().splitlines()), 1)
+            self.assertEqual(subprocess.check_output(['git', 'count-objects'], cwd=git_directory).decode().split()[0], '0')
+
+        # a fresh workspace only needs the mirror
+        shutil.move(upstream, upstream + '-moved')
+        shutil.rmtree(os.path.join(self.path(), 'needs'))
+        self.write_needs_file(upstream, commits[0])
+        self.assertEqual(self.satisfy(), 0)
+        with open(os.path.join(source, 'file'), 'r') as f:
+            self.assertEqual(f.read(), '0')
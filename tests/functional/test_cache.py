@@ -0,0 +1,63 @@
+import json
+import os
+import time
+
+from needy.cache_stats import CacheStats
+
+from .functional_test import TestCase
+
+
+class CacheTest(TestCase):
+    def test_prune(self):
+        cache_directory = os.path.join(self.path(), 'cache')
+        os.makedirs(cache_directory)
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+            f.write(json.dumps({'build-caches': [cache_directory]}))
+
+        distant_past = time.time() - 60 * 60 * 24 * 30
+        for name in ['expired', 'fresh']:
+            with open(os.path.join(cache_directory, name), 'w') as f:
+                f.write(name)
+        os.utime(os.path.join(cache_directory, 'expired'), (distant_past, distant_past))
+
+        self.assertEqual(self.execute(['cache', 'prune']), 0)
+        self.assertFalse(os.path.exists(os.path.join(cache_directory, 'expired')))
+        self.assertTrue(os.path.exists(os.path.join(cache_directory, 'fresh')))
+        self.assertTrue(os.path.exists(os.path.join(cache_directory, '.last-prune')))
+
+    def test_stats(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'include'))
+        with open(os.path.join(source_directory, 'include', 'mylib.h'), 'w') as f:
+            f.write('int mylib();\n')
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+            f.write(json.dumps({'build-caches': [os.path.join(self.path(), 'cache')]}))
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'project': {
+                            'type': 'source'
+                        }
+                    }
+                }
+            }))
+        os.makedirs(os.path.join(self.path(), 'cache'))
+        self.assertEqual(self.execute(['satisfy']), 0)
+        self.assertEqual(self.execute(['clean']), 0)
+        self.assertEqual(self.execute(['satisfy']), 0)
+        self.assertEqual(self.execute(['cache', 'stats']), 0)
+
+        stats = CacheStats(os.path.join(self.needs_directory(), 'cache-stats'))
+        totals = list(stats.summary().values())
+        self.assertEqual(len(totals), 1)
+        self.assertEqual((totals[0]['hits'], totals[0]['misses'], totals[0]['stored']), (1, 1, 1))
+        self.assertGreater(totals[0]['bytes-downloaded'], 0)
+        self.assertEqual(totals[0]['bytes-downloaded'], totals[0]['bytes-uploaded'])
+
+        self.assertEqual(self.execute(['cache', 'stats', '--reset']), 0)
+        self.assertEqual(stats.records(), [])
+
+    def test_stats_outside_project(self):
+        self.assertEqual(self.execute(['cache', 'stats']), 1)
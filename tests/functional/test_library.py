@@ -1,6 +1,12 @@
 import json
 import os
+import shutil
 import sys
+import unittest
+
+from needy.needy import Needy
+from needy.platforms import host_platform
+from needy.target import Target
 
 from .functional_test import TestCase
 
@@ -69,3 +75,166 @@ class LibraryTest(TestCase):
         self.assertEqual(len(os.listdir(include_dir)), 0)
         self.assertEqual(len(os.listdir(lib_dir)), 0)
         self.assertFalse(os.path.exists(os.path.join(lib_dir, 'pkgconfig')))
+
+    def test_concurrent_build(self):
+        empty_directory = os.path.join(self.path(), 'empty')
+        os.makedirs(empty_directory)
+        # waits up to 10 seconds for a file to exist
+        wait = 'for i in $(seq 100); do test -f "{0}" && break; sleep 0.1; done; test -f "{0}"'
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'dependency': {
+                        'directory': empty_directory,
+                        'project': {
+                            'build-steps': 'type nul > "{needs_file_directory}\\dependency-built"'
+                        } if sys.platform == 'win32' else {
+                            'build-steps': [
+                                'touch "{needs_file_directory}/dependency-started"',
+                                wait.format('{needs_file_directory}/independent-started'),
+                                'touch "{needs_file_directory}/dependency-built"'
+                            ]
+                        }
+                    },
+                    'independent': {
+                        'directory': empty_directory,
+                        'project': {
+                            'build-steps': []
+                        } if sys.platform == 'win32' else {
+                            # only succeeds if the independent libraries are built at the same time
+                            'build-steps': [
+                                'touch "{needs_file_directory}/independent-started"',
+                                wait.format('{needs_file_directory}/dependency-started')
+                            ]
+                        }
+                    },
+                    'dependent': {
+                        'directory': empty_directory,
+                        'dependencies': 'dependency',
+                        'project': {
+                            'build-steps': 'dir "{needs_file_directory}\\dependency-built"'
+                        } if sys.platform == 'win32' else {
+                            'build-steps': 'test -f "{needs_file_directory}/dependency-built"'
+                        }
+                    }
+                }
+            }))
+        self.assertEqual(self.execute(['satisfy', '-j', '4']), 0)
+        for name in ['dependency', 'independent', 'dependent']:
+            self.assertTrue(os.path.isfile(os.path.join(self.build_directory(name), 'needy.status')))
+
+    def test_build_cache_codecs(self):
+        for codec in ['gzip', 'block-gzip']:
+            source_directory = os.path.join(self.path(), codec)
+            os.makedirs(os.path.join(source_directory, 'include'))
+            with open(os.path.join(source_directory, 'include', 'mylib.h'), 'w') as f:
+                f.write('int mylib();\n')
+            with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+                f.write(json.dumps({'build-caches': [{'path': os.path.join(self.path(), 'cache'), 'codec': codec}]}))
+            with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+                needs_file.write(json.dumps({
+                    'libraries': {
+                        'mylib': {
+                            'directory': source_directory,
+                            'project': {
+                                'type': 'source'
+                            }
+                        }
+                    }
+                }))
+            self.assertEqual(self.execute(['satisfy', 'mylib']), 0)
+            self.assertEqual(self.execute(['clean', 'mylib']), 0)
+            self.assertFalse(os.path.exists(os.path.join(self.build_directory('mylib'), 'include', 'mylib.h')))
+            # without the source, the library can only be satisfied from the cache
+            shutil.rmtree(source_directory)
+            self.assertEqual(self.execute(['satisfy', 'mylib']), 0)
+            self.assertTrue(os.path.isfile(os.path.join(self.build_directory('mylib'), 'include', 'mylib.h')))
+        self.assertEqual(len([name for name in os.listdir(os.path.join(self.path(), 'cache')) if not name.startswith('.')]), 2)
+
+    def test_build_cache_lookahead(self):
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+            f.write(json.dumps({'build-caches': [{'path': os.path.join(self.path(), 'cache')}]}))
+        libraries = {}
+        for name in ['dependency', 'dependent']:
+            source_directory = os.path.join(self.path(), name)
+            os.makedirs(os.path.join(source_directory, 'include'))
+            with open(os.path.join(source_directory, 'include', '{}.h'.format(name)), 'w') as f:
+                f.write('int {}();\n'.format(name))
+            libraries[name] = {
+                'directory': source_directory,
+                'project': {
+                    'type': 'source'
+                }
+            }
+        libraries['dependent']['dependencies'] = 'dependency'
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({'libraries': libraries}))
+        self.assertEqual(self.execute(['satisfy']), 0)
+        self.assertEqual(self.execute(['clean']), 0)
+        for name in ['dependency', 'dependent']:
+            shutil.rmtree(os.path.join(self.path(), name))
+        self.assertEqual(self.execute(['satisfy']), 0)
+        for name in ['dependency', 'dependent']:
+            self.assertTrue(os.path.isfile(os.path.join(self.build_directory(name), 'include', '{}.h'.format(name))))
+
+    def test_content_addressed_build_cache(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(os.path.join(source_directory, 'include'))
+        with open(os.path.join(source_directory, 'include', 'mylib.h'), 'w') as f:
+            f.write('int mylib();\n')
+        with open(os.path.join(self.path(), '.needyconfig'), 'w') as f:
+            f.write(json.dumps({'build-caches': [{'path': os.path.join(self.path(), 'cache'), 'type': 'content-addressed'}]}))
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'project': {
+                            'type': 'source'
+                        }
+                    }
+                }
+            }))
+        self.assertEqual(self.execute(['satisfy', 'mylib']), 0)
+        self.assertEqual(self.execute(['clean', 'mylib']), 0)
+        shutil.rmtree(source_directory)
+        self.assertEqual(self.execute(['satisfy', 'mylib']), 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.build_directory('mylib'), 'include', 'mylib.h')))
+
+    @unittest.skipIf(sys.platform == 'win32', 'the build steps require a posix shell')
+    def test_isolated_source(self):
+        source_directory = os.path.join(self.path(), 'mylib')
+        os.makedirs(source_directory)
+        architectures = [host_platform()().default_architecture(), 'other']
+        # each build waits until the other has started, so the test only passes if they run concurrently
+        with open(os.path.join(self.path(), 'needs.json'), 'w') as needs_file:
+            needs_file.write(json.dumps({
+                'libraries': {
+                    'mylib': {
+                        'directory': source_directory,
+                        'isolated-source': True,
+                        'project': {
+                            'build-steps': [
+                                'test ! -e built',
+                                'touch built "{needs_file_directory}/started-{architecture}"',
+                                'for i in $(seq 100); do test $(ls "{needs_file_directory}" | grep -c started-) -eq 2 && exit 0; sleep 0.1; done; exit 1',
+                            ]
+                        }
+                    }
+                },
+                'universal-binaries': {
+                    'ub': {
+                        'host': architectures
+                    }
+                }
+            }))
+        self.assertEqual(self.execute(['satisfy', '-u', 'ub', '-j', '2']), 0)
+        for architecture in architectures:
+            self.assertTrue(os.path.isfile(os.path.join(self.path(), 'needs', 'mylib', 'isolated-source', host_platform().identifier(), architecture, 'built')))
+        self.assertFalse(os.path.exists(os.path.join(self.path(), 'needs', 'mylib', 'source')))
+
+        needy = Needy(self.path())
+        target = Target(host_platform()(), 'other')
+        self.assertEqual(needy.source_directory('mylib', target), os.path.join(self.path(), 'needs', 'mylib', 'isolated-source', host_platform().identifier(), 'other'))
+        with self.assertRaises(RuntimeError):
+            needy.source_directory('mylib')
@@ -0,0 +1,74 @@
+import os
+import stat
+import sys
+import time
+import unittest
+
+from needy.caches.content_addressed import ContentAddressedCache
+from needy.filesystem import TempDir
+
+
+class ContentAddressedCacheTest(unittest.TestCase):
+    def write(self, path, contents, mode=0o644):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+        os.chmod(path, mode)
+
+    def blobs(self, cache_directory):
+        return sum([len(files) for _, _, files in os.walk(os.path.join(cache_directory, 'blobs'))])
+
+    def test_round_trip(self):
+        with TempDir() as d:
+            cache = ContentAddressedCache(os.path.join(d, 'cache'))
+            self.assertEqual(cache.type(), 'content-addressed')
+            self.assertTrue(cache.stores_directories())
+            self.assertFalse(cache.get_directory('a', os.path.join(d, 'restored')))
+
+            for name in ['a', 'b']:
+                self.write(os.path.join(d, name, 'include', 'shared.h'), 'shared')
+                self.write(os.path.join(d, name, 'lib', 'lib{}.a'.format(name)), name)
+                self.write(os.path.join(d, name, 'bin', 'tool'), 'tool', 0o755)
+                os.makedirs(os.path.join(d, name, 'empty'))
+                self.assertTrue(cache.set_directory(name, os.path.join(d, name)))
+            self.assertEqual(self.blobs(cache.description()), 4)
+
+            restored = os.path.join(d, 'restored')
+            self.assertTrue(cache.get_directory('b', restored))
+            with open(os.path.join(restored, 'include', 'shared.h')) as f:
+                self.assertEqual(f.read(), 'shared')
+            with open(os.path.join(restored, 'lib', 'libb.a')) as f:
+                self.assertEqual(f.read(), 'b')
+            self.assertFalse(os.path.exists(os.path.join(restored, 'lib', 'liba.a')))
+            self.assertTrue(os.path.isdir(os.path.join(restored, 'empty')))
+            if sys.platform != 'win32':
+                self.assertTrue(os.stat(os.path.join(restored, 'bin', 'tool')).st_mode & stat.S_IXUSR)
+
+            # restored files are writable and modifying them doesn't affect the cache
+            with open(os.path.join(restored, 'include', 'shared.h'), 'w') as f:
+                f.write('modified')
+            self.assertTrue(os.stat(os.path.join(restored, 'bin', 'tool')).st_mode & stat.S_IWUSR)
+            self.assertTrue(cache.get_directory('a', os.path.join(d, 'restored-again')))
+            with open(os.path.join(d, 'restored-again', 'include', 'shared.h')) as f:
+                self.assertEqual(f.read(), 'shared')
+
+    def test_prune(self):
+        with TempDir() as d:
+            cache = ContentAddressedCache(os.path.join(d, 'cache'))
+            self.write(os.path.join(d, 'a', 'shared.h'), 'shared')
+            self.write(os.path.join(d, 'a', 'a.h'), 'a')
+            self.write(os.path.join(d, 'b', 'shared.h'), 'shared')
+            cache.set_directory('a', os.path.join(d, 'a'))
+            cache.set_directory('b', os.path.join(d, 'b'))
+
+            distant_past = time.time() - 60 * 60 * 24 * 30
+            for root, _, files in os.walk(cache.description()):
+                for name in files:
+                    os.utime(os.path.join(root, name), (distant_past, distant_past))
+            cache.get_directory('b', os.path.join(d, 'restored'))
+
+            cache.prune()
+            self.assertFalse(cache.get_directory('a', os.path.join(d, 'restored')))
+            self.assertTrue(cache.get_directory('b', os.path.join(d, 'restored')))
+            self.assertEqual(self.blobs(cache.description()), 1)
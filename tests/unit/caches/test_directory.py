@@ -1,3 +1,7 @@
+import os
+import socket
+import subprocess
+import sys
 import time
 
 from pyfakefs import fake_filesystem_unittest
@@ -25,8 +29,123 @@ class DirectoryTest(fake_filesystem_unittest.TestCase):
         cache.prune()
         self.assertTrue(cache.get('a', 'obj'))
 
+        cache.prune(object_lifetime=0)
+        self.assertFalse(cache.get('a', 'obj'))
+
+    def test_open_read(self):
+        cache = DirectoryCache('cache')
+        with cache.open_read('a') as f:
+            self.assertIsNone(f)
+
+        self.fs.CreateFile('a', contents='AAA')
+        self.assertTrue(cache.set('a', 'a'))
+        with cache.open_read('a') as f:
+            self.assertEquals(f.read(), b'AAA')
+
+    def test_max_size(self):
+        cache = DirectoryCache('cache', max_size=DirectoryCache.parse_size('5K'))
+        for name in ['a', 'b', 'c']:
+            self.fs.CreateFile(name, contents='A' * 2048)
+            self.assertTrue(cache.set(name, name))
+        self.assertTrue(cache.get('a', 'obj'))
+
+        cache.prune()
+        self.assertTrue(cache.get('a', 'obj'))
+        self.assertFalse(cache.get('b', 'obj'))
+        self.assertTrue(cache.get('c', 'obj'))
+
+    def test_index_bootstrap(self):
+        self.fs.CreateFile('a', contents='AAA')
+        cache = DirectoryCache('cache')
+        self.assertTrue(cache.set('a', 'a'))
+        os.remove(os.path.join('cache', '.index'))
+
+        distant_past = time.time() - 60 * 60 * 24 * 30
+        path = cache._object_path('a')
+        os.utime(path, (distant_past, distant_past))
+
+        DirectoryCache('cache').prune()
+        self.assertFalse(os.path.exists(path))
+
+    def test_parse_size(self):
+        self.assertEqual(DirectoryCache.parse_size(100), 100)
+        self.assertEqual(DirectoryCache.parse_size('100'), 100)
+        self.assertEqual(DirectoryCache.parse_size('2k'), 2048)
+        self.assertEqual(DirectoryCache.parse_size('1.5G'), 1536 * 1024 * 1024)
+        with self.assertRaises(ValueError):
+            DirectoryCache.parse_size('10X')
+
+    def test_prune_if_due(self):
+        self.fs.CreateFile('a', contents='AAA')
+        cache = DirectoryCache('cache')
+        self.assertTrue(cache.set('a', 'a'))
+
         distant_past = time.time() - 60 * 60 * 24 * 30
-        self.fs.GetObject(cache._object_path('a')).st_atime = distant_past
+        os.utime(cache._object_path('a'), (distant_past, distant_past))
+        os.remove(os.path.join('cache', '.index'))
+
+        DirectoryCache('cache')
+        self.assertTrue(os.path.exists(cache._object_path('a')))
+
+        self.assertTrue(cache.prune_if_due())
+        self.assertFalse(os.path.exists(cache._object_path('a')))
+        self.assertFalse(cache.prune_if_due())
+
+    def test_reconcile(self):
+        cache = DirectoryCache('cache')
+        self.fs.CreateFile('a', contents='AAA')
+        self.assertTrue(cache.set('a', 'a'))
+        self.assertTrue(cache.set('b', 'a'))
+        os.remove(cache._object_path('b'))
+
+        # objects without records, such as those stored by older versions, are pruned using their modification times
+        distant_past = time.time() - 60 * 60 * 24 * 30
+        self.fs.CreateFile(os.path.join('cache', 'orphan'), contents='OOO')
+        os.utime(os.path.join('cache', 'orphan'), (distant_past, distant_past))
+        self.fs.CreateFile(os.path.join('cache', 'recent'), contents='RRR')
 
         cache.prune()
-        self.assertFalse(cache.get('a', 'obj'))
+        self.assertFalse(os.path.exists(os.path.join('cache', 'orphan')))
+        self.assertTrue(os.path.exists(os.path.join('cache', 'recent')))
+        with open(os.path.join('cache', '.index'), 'r') as f:
+            names = [line.split()[0] for line in f]
+        self.assertEqual(sorted(names), sorted([os.path.basename(cache._object_path('a')), 'recent']))
+
+    def test_prune_keeps_appended_records(self):
+        cache = DirectoryCache('cache')
+        self.fs.CreateFile('a', contents='AAA')
+        self.assertTrue(cache.set('a', 'a'))
+        distant_past = time.time() - 60 * 60 * 24 * 30
+        with open(os.path.join('cache', '.index'), 'a') as f:
+            f.write('{} 3 {}\n'.format(os.path.basename(cache._object_path('a')), distant_past))
+            # a record that another process is in the middle of appending
+            f.write('b 3')
+
+        cache.prune()
+        self.assertFalse(os.path.exists(cache._object_path('a')))
+        with open(os.path.join('cache', '.index'), 'r') as f:
+            self.assertEqual(f.read(), 'b 3')
+
+    def test_compaction_lock(self):
+        cache = DirectoryCache('cache')
+        self.fs.CreateFile('a', contents='AAA')
+        self.assertTrue(cache.set('a', 'a'))
+        distant_past = time.time() - 60 * 60 * 24 * 30
+        os.utime(cache._object_path('a'), (distant_past, distant_past))
+        os.remove(os.path.join('cache', '.index'))
+        lock_path = os.path.join('cache', '.index.lock')
+
+        # locks held by running processes aren't taken over, no matter how old they are
+        self.fs.CreateFile(lock_path, contents='{} {}'.format(socket.gethostname(), os.getpid()))
+        os.utime(lock_path, (distant_past, distant_past))
+        cache.prune()
+        self.assertTrue(os.path.exists(cache._object_path('a')))
+
+        if sys.platform != 'win32':
+            process = subprocess.Popen([sys.executable, '-c', 'pass'])
+            process.wait()
+            with open(lock_path, 'w') as f:
+                f.write('{} {}'.format(socket.gethostname(), process.pid))
+            cache.prune()
+            self.assertFalse(os.path.exists(cache._object_path('a')))
+            self.assertFalse(os.path.exists(lock_path))
@@ -0,0 +1,34 @@
+import os
+import time
+import unittest
+
+from needy.caches.negative_lookups import NegativeLookups
+from needy.filesystem import TempDir
+
+
+class NegativeLookupsTest(unittest.TestCase):
+    def test_negative_lookups(self):
+        with TempDir() as d:
+            lookups = NegativeLookups(os.path.join(d, 'lookups'), 60)
+            self.assertFalse(lookups.is_missing('key'))
+            lookups.record_miss('key')
+            self.assertTrue(lookups.is_missing('key'))
+            self.assertTrue(NegativeLookups(os.path.join(d, 'lookups'), 60).is_missing('key'))
+            lookups.invalidate('key')
+            self.assertFalse(lookups.is_missing('key'))
+
+    def test_expiration(self):
+        with TempDir() as d:
+            lookups = NegativeLookups(d, 60)
+            lookups.record_miss('key')
+            for name in os.listdir(d):
+                os.utime(os.path.join(d, name), (time.time() - 120, time.time() - 120))
+            self.assertFalse(lookups.is_missing('key'))
+            self.assertEqual(os.listdir(d), [])
+
+    def test_disabled(self):
+        with TempDir() as d:
+            lookups = NegativeLookups(os.path.join(d, 'lookups'), 0)
+            lookups.record_miss('key')
+            self.assertFalse(lookups.is_missing('key'))
+            self.assertFalse(os.path.exists(os.path.join(d, 'lookups')))
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import sys
+import threading
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+from needy.caches.aws_credentials import CredentialProvider, CredentialsError
+from needy.caches.s3 import S3Cache
+from needy.caches.s3_client import S3Client, S3Error
+from needy.filesystem import TempDir
+from needy.override_environment import OverrideEnvironment
+
+
+class FakeS3Server(ThreadingMixIn, HTTPServer):
+    """ a small in-memory stand-in for the parts of the S3 API that S3Client uses """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeS3Handler)
+        self.objects = {}
+        self.uploads = {}
+        self.connections = 0
+        self.failures = 0
+        self.requests = []
+        self.region = None
+        self.lock = threading.Lock()
+
+    def endpoint(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.handle_request()
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_PUT(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def do_DELETE(self):
+        self.handle_request()
+
+    def handle_request(self):
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query, keep_blank_values=True).items())
+        key = url.path
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        with self.server.lock:
+            self.server.requests.append((self.command, key, query))
+            if self.server.failures:
+                self.server.failures -= 1
+                return self.respond(503, b'<Error><Code>SlowDown</Code></Error>')
+
+        authorization = re.search(r'Credential=\w+/\d+/([\w-]+)/', self.headers.get('Authorization', ''))
+        if not authorization:
+            return self.respond(403)
+        if self.server.region and authorization.group(1) != self.server.region:
+            return self.respond(301, headers={'x-amz-bucket-region': self.server.region})
+
+        if self.command == 'POST' and 'uploads' in query:
+            upload_id = str(len(self.server.uploads) + 1)
+            self.server.uploads[upload_id] = {}
+            return self.respond(200, '<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/"><UploadId>{}</UploadId></InitiateMultipartUploadResult>'.format(upload_id).encode())
+        if self.command == 'PUT' and 'uploadId' in query:
+            self.server.uploads[query['uploadId']][int(query['partNumber'])] = body
+            return self.respond(200, headers={'ETag': '"{}"'.format(query['partNumber'])})
+        if self.command == 'POST' and 'uploadId' in query:
+            parts = self.server.uploads.pop(query['uploadId'])
+            numbers = [int(number) for number in re.findall(r'<PartNumber>(\d+)</PartNumber>', body.decode())]
+            self.server.objects[key] = b''.join([parts[number] for number in numbers])
+            return self.respond(200, b'<CompleteMultipartUploadResult></CompleteMultipartUploadResult>')
+        if self.command == 'DELETE' and 'uploadId' in query:
+            self.server.uploads.pop(query['uploadId'], None)
+            return self.respond(204)
+        if self.command == 'PUT':
+            self.server.objects[key] = body
+            return self.respond(200)
+
+        if key not in self.server.objects:
+            return self.respond(404)
+        data = self.server.objects[key]
+        if self.command == 'HEAD':
+            return self.respond(200, headers={'Content-Length': str(len(data))})
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            return self.respond(206, data[int(match.group(1)):int(match.group(2)) + 1])
+        return self.respond(200, data)
+
+    def respond(self, status, body=b'', headers={}):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+class S3Test(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeS3Server()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs):
+        return S3Client('bucket', region='us-east-1', endpoint=self.server.endpoint(), credentials=('id', 'secret', None), **kwargs)
+
+    def test_small_objects(self):
+        client = self.client()
+        self.assertIsNone(client.head('key'))
+        client.put('key', b'value')
+        self.assertEqual(client.head('key'), 5)
+        self.assertEqual(client.get('key'), b'value')
+        self.assertEqual(client.get('key', 1, 2), b'al')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_multipart_transfers(self):
+        client = self.client(part_size=1024, threads=4)
+        data = os.urandom(10 * 1024 + 100)
+        with TempDir() as d:
+            with open(os.path.join(d, 'source'), 'wb') as f:
+                f.write(data)
+            client.upload_file('key', os.path.join(d, 'source'))
+            self.assertEqual(len([r for r in self.server.requests if r[0] == 'PUT']), 11)
+            self.assertEqual(self.server.objects['/bucket/key'], data)
+
+            self.assertTrue(client.download_file('key', os.path.join(d, 'destination')))
+            with open(os.path.join(d, 'destination'), 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertFalse(client.download_file('missing', os.path.join(d, 'missing')))
+
+        reader = client.open('key')
+        self.assertEqual(reader.read(10), data[:10])
+        self.assertEqual(reader.read(), data[10:])
+        self.assertIsNone(client.open('missing'))
+        self.assertLessEqual(self.server.connections, 4)
+
+    def test_stop_reading_early(self):
+        client = self.client(part_size=1024, threads=2)
+        client.put('key', os.urandom(10 * 1024))
+        reader = client.open('key')
+        reader.read(10)
+        reader.close()
+        with self.assertRaises(ValueError):
+            reader.read()
+        # reading the first part refilled the window once, and nothing was scheduled after closing
+        self.assertLessEqual(len([r for r in self.server.requests if r[0] == 'GET']), 3)
+
+        with TempDir() as d, self.environment(d, AWS_ACCESS_KEY_ID='id', AWS_SECRET_ACCESS_KEY='secret'):
+            cache = self.cache()
+            with open(os.path.join(d, 'source'), 'wb') as f:
+                f.write(b'x' * 5000)
+            cache.set('key', os.path.join(d, 'source'))
+            with self.assertRaises(RuntimeError):
+                with cache.open_read('key') as f:
+                    reader = f
+                    f.read(10)
+                    raise RuntimeError('extraction failed')
+            self.assertTrue(reader.closed)
+
+    def test_retries(self):
+        self.server.failures = 2
+        client = self.client()
+        client.put('key', b'value')
+        self.assertEqual(client.get('key'), b'value')
+
+        self.server.failures = 5
+        with self.assertRaises(S3Error):
+            self.client(max_attempts=3).get('key')
+
+    def test_region_redirects(self):
+        self.server.region = 'eu-central-1'
+        client = self.client()
+        client.put('key', b'value')
+        self.assertEqual(client.get('key'), b'value')
+        # the region is remembered, so only the first request is redirected
+        self.assertEqual(len(self.server.requests), 3)
+
+    def environment(self, home, **kwargs):
+        variables = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN', 'AWS_PROFILE', 'AWS_DEFAULT_PROFILE',
+                     'AWS_CONFIG_FILE', 'AWS_SHARED_CREDENTIALS_FILE', 'AWS_WEB_IDENTITY_TOKEN_FILE',
+                     'AWS_CONTAINER_CREDENTIALS_RELATIVE_URI', 'AWS_CONTAINER_CREDENTIALS_FULL_URI']
+        # botocore, if it's installed, shouldn't find anything either
+        return OverrideEnvironment(dict(dict([(v, None) for v in variables], HOME=home, AWS_EC2_METADATA_DISABLED='true'), **kwargs))
+
+    def test_credential_process(self):
+        with TempDir() as d:
+            config = os.path.join(d, 'config')
+            with open(config, 'w') as f:
+                script = 'import json; print(json.dumps({"Version": 1, "AccessKeyId": "id", "SecretAccessKey": "secret"}))'
+                f.write('[profile ci]\ncredential_process = "{}" -c \'{}\'\n'.format(sys.executable, script))
+            with self.environment(d, AWS_CONFIG_FILE=config, AWS_PROFILE='ci'):
+                client = S3Client('bucket', region='us-east-1', endpoint=self.server.endpoint())
+                client.put('key', b'value')
+                self.assertEqual(client.get('key'), b'value')
+
+    def test_parse_time(self):
+        self.assertEqual(CredentialProvider.parse_time('2016-01-01T00:00:00Z'), 1451606400)
+        self.assertEqual(CredentialProvider.parse_time('2016-01-01T01:00:00.5+01:00'), 1451606400.5)
+        self.assertEqual(CredentialProvider.parse_time('2015-12-31T19:00:00-0500'), 1451606400)
+        with self.assertRaises(CredentialsError):
+            CredentialProvider.parse_time('2016-01-01 00:00:00')
+
+    def test_missing_credentials(self):
+        with TempDir() as d:
+            with self.environment(d):
+                client = S3Client('bucket', region='us-east-1', endpoint=self.server.endpoint())
+                with self.assertRaises(CredentialsError):
+                    client.get('key')
+        self.assertEqual(self.server.requests, [])
+
+    def cache(self, **kwargs):
+        return S3Cache.from_dict(dict({'path': 's3://bucket/prefix', 'endpoint': self.server.endpoint()}, **kwargs))
+
+    def test_cache(self):
+        with TempDir() as d, self.environment(d, AWS_ACCESS_KEY_ID='id', AWS_SECRET_ACCESS_KEY='secret'):
+            cache = self.cache()
+            with open(os.path.join(d, 'source'), 'wb') as f:
+                f.write(b'x' * 5000)
+            self.assertFalse(cache.get('key', os.path.join(d, 'destination')))
+            self.assertTrue(cache.set('key', os.path.join(d, 'source')))
+            self.assertTrue(cache.get('key', os.path.join(d, 'destination')))
+            with open(os.path.join(d, 'destination'), 'rb') as f:
+                self.assertEqual(f.read(), b'x' * 5000)
+            with cache.open_read('key') as f:
+                self.assertEqual(f.read(), b'x' * 5000)
+            with cache.open_read('missing') as f:
+                self.assertIsNone(f)
+        self.assertTrue(all([r[1].startswith('/bucket/prefix/') for r in self.server.requests]))
+
+    def test_negative_lookups(self):
+        with TempDir() as d, self.environment(d, AWS_ACCESS_KEY_ID='id', AWS_SECRET_ACCESS_KEY='secret'):
+            with open(os.path.join(d, 'source'), 'wb') as f:
+                f.write(b'x')
+            cache = self.cache()
+            self.assertFalse(cache.get('key', os.path.join(d, 'destination')))
+            requests = len(self.server.requests)
+            # other instances, like later invocations, remember the miss
+            self.assertFalse(self.cache().get('key', os.path.join(d, 'destination')))
+            with cache.open_read('key') as f:
+                self.assertIsNone(f)
+            self.assertEqual(len(self.server.requests), requests)
+
+            self.assertTrue(cache.set('key', os.path.join(d, 'source')))
+            self.assertTrue(cache.get('key', os.path.join(d, 'destination')))
+
+            cache = self.cache(**{'negative-lookup-ttl': 0})
+            self.assertFalse(cache.get('missing', os.path.join(d, 'destination')))
+            requests = len(self.server.requests)
+            self.assertFalse(cache.get('missing', os.path.join(d, 'destination')))
+            self.assertGreater(len(self.server.requests), requests)
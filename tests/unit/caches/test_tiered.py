@@ -0,0 +1,83 @@
+import os
+import unittest
+
+from needy.caches import cache_from_dict
+from needy.caches.directory import DirectoryCache
+from needy.caches.tiered import TieredCache
+from needy.filesystem import TempDir
+from needy.uploader import BackgroundUploader
+
+
+class RemoteDirectoryCache(DirectoryCache):
+    def is_remote(self):
+        return True
+
+
+class TieredTest(unittest.TestCase):
+    def test_promotion(self):
+        with TempDir() as d:
+            local = DirectoryCache(os.path.join(d, 'local'))
+            remote = DirectoryCache(os.path.join(d, 'remote'))
+            os.makedirs(os.path.join(d, 'local'))
+            os.makedirs(os.path.join(d, 'remote'))
+            cache = TieredCache([local, remote])
+
+            with open(os.path.join(d, 'a'), 'w') as f:
+                f.write('AAA')
+            self.assertTrue(remote.set('a', os.path.join(d, 'a')))
+            self.assertFalse(local.get('a', os.path.join(d, 'obj')))
+
+            with cache.open_read('a') as f:
+                self.assertEqual(f.read(), b'AAA')
+            self.assertTrue(local.get('a', os.path.join(d, 'obj')))
+
+            self.assertTrue(remote.set('b', os.path.join(d, 'a')))
+            self.assertTrue(cache.get('b', os.path.join(d, 'obj')))
+            self.assertTrue(local.get('b', os.path.join(d, 'obj')))
+
+            self.assertFalse(cache.get('missing', os.path.join(d, 'obj')))
+            with cache.open_read('missing') as f:
+                self.assertIsNone(f)
+
+    def test_set(self):
+        with TempDir() as d:
+            tiers = [DirectoryCache(os.path.join(d, name)) for name in ['local', 'remote']]
+            for name in ['local', 'remote']:
+                os.makedirs(os.path.join(d, name))
+            with open(os.path.join(d, 'a'), 'w') as f:
+                f.write('AAA')
+            self.assertTrue(TieredCache(tiers).set('a', os.path.join(d, 'a')))
+            for tier in tiers:
+                self.assertTrue(tier.get('a', os.path.join(d, 'obj')))
+
+    def test_background_set(self):
+        with TempDir() as d:
+            for name in ['local', 'remote']:
+                os.makedirs(os.path.join(d, name))
+            local = DirectoryCache(os.path.join(d, 'local'))
+            remote = RemoteDirectoryCache(os.path.join(d, 'remote'))
+            uploader = BackgroundUploader()
+            cache = TieredCache([local, remote])
+            cache.set_uploader(uploader)
+            with open(os.path.join(d, 'a'), 'w') as f:
+                f.write('AAA')
+
+            # the upload happens from the local copy, so the source doesn't need to outlive set
+            self.assertTrue(cache.set('a', os.path.join(d, 'a')))
+            os.remove(os.path.join(d, 'a'))
+            self.assertTrue(local.get('a', os.path.join(d, 'obj')))
+            self.assertEqual(uploader.wait(), [])
+            self.assertTrue(remote.get('a', os.path.join(d, 'obj')))
+            with open(os.path.join(d, 'obj'), 'r') as f:
+                self.assertEqual(f.read(), 'AAA')
+
+    def test_from_dict(self):
+        cache = cache_from_dict({'type': 'tiered', 'tiers': ['local', {'path': 's3://bucket/prefix'}]})
+        self.assertEqual(cache.type(), 'tiered')
+        self.assertEqual([tier.type() for tier in cache.tiers()], ['directory', 's3'])
+        with self.assertRaises(ValueError):
+            cache_from_dict({'type': 'tiered', 'tiers': ['local', {'path': 'remote', 'codec': 'block-gzip'}]})
+        with self.assertRaises(ValueError):
+            cache_from_dict({'type': 'tiered', 'tiers': ['local', {'path': 'remote', 'type': 'content-addressed'}]})
+        with self.assertRaises(ValueError):
+            cache_from_dict({'type': 'tiered', 'tiers': []})
@@ -1,6 +1,22 @@
+import hashlib
+import io
 import os
+import re
+import tarfile
+import threading
+import unittest
+
 from pyfakefs import fake_filesystem_unittest
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from needy.download_store import DownloadStore
+from needy.filesystem import TempDir
 from needy.sources.download import Download
 
 
@@ -22,3 +38,203 @@ class DownloadTest(fake_filesystem_unittest.TestCase):
                          'destination'
                          )
         self.assertFalse(os.path.exists('destination'))
+
+
+class DownloadServer(ThreadingMixIn, HTTPServer):
+    """ serves files from memory, supporting range requests and dropping connections on purpose """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), DownloadHandler)
+        self.files = {}
+        self.etags = {}
+        # the number of upcoming responses to cut off, and how many bytes of each to send before doing so
+        self.drops = 0
+        self.drop_after = 0
+        self.requests = []
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}/{}'.format(self.server_address[1], path)
+
+
+class DownloadHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.lstrip('/')
+        self.server.requests.append((name, self.headers.get('Range'), self.headers.get('If-Range')))
+        data = self.server.files.get(name)
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = self.server.etags.get(name)
+        offset = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range') or '')
+        if match and (self.headers.get('If-Range') is None or self.headers.get('If-Range') == etag):
+            offset = int(match.group(1))
+            if offset >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(offset, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data) - offset))
+        self.end_headers()
+
+        if self.server.drops:
+            self.server.drops -= 1
+            self.wfile.write(data[offset:offset + self.server.drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data[offset:])
+
+
+class LocalDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.server = DownloadServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get(self):
+        data = os.urandom(3 * 1024 * 1024 + 100)
+        self.server.files['archive.tar.gz'] = data
+        with TempDir() as d:
+            for algorithm in [hashlib.md5, hashlib.sha1, hashlib.sha256, hashlib.sha512]:
+                destination = os.path.join(d, algorithm().name)
+                Download.get(self.server.url('archive.tar.gz'), algorithm(data).hexdigest(), destination, buffer_size=64 * 1024)
+                with open(destination, 'rb') as f:
+                    self.assertEqual(f.read(), data)
+                self.assertTrue(Download.verify_checksum(destination, algorithm(data).hexdigest()))
+
+            with self.assertRaises(ValueError):
+                Download.get(self.server.url('archive.tar.gz'), hashlib.sha256(b'other').hexdigest(), os.path.join(d, 'incorrect'))
+            self.assertFalse(os.path.exists(os.path.join(d, 'incorrect')))
+
+    def test_get_resumes(self):
+        data = os.urandom(3 * 1024 * 1024)
+        self.server.files['archive.tar.gz'] = data
+        self.server.etags['archive.tar.gz'] = '"v1"'
+        self.server.drops = 2
+        self.server.drop_after = 1024 * 1024
+        with TempDir() as d:
+            destination = os.path.join(d, 'archive')
+            Download.get(self.server.url('archive.tar.gz'), hashlib.sha256(data).hexdigest(), destination, retry_delay=0)
+            with open(destination, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertFalse(os.path.exists(destination + '.partial'))
+            self.assertFalse(os.path.exists(destination + '.partial.json'))
+        self.assertEqual(self.server.requests, [
+            ('archive.tar.gz', None, None),
+            ('archive.tar.gz', 'bytes=1048576-', '"v1"'),
+            ('archive.tar.gz', 'bytes=2097152-', '"v1"'),
+        ])
+
+    def test_get_restarts_changed_download(self):
+        self.server.files['archive.tar.gz'] = os.urandom(2 * 1024 * 1024)
+        self.server.etags['archive.tar.gz'] = '"v1"'
+        self.server.drops = 1
+        self.server.drop_after = 1024 * 1024
+        with TempDir() as d:
+            destination = os.path.join(d, 'archive')
+            with self.assertRaises(IOError):
+                Download.get(self.server.url('archive.tar.gz'), hashlib.sha256(b'').hexdigest(), destination, attempts=1)
+            self.assertEqual(os.path.getsize(destination + '.partial'), 1024 * 1024)
+
+            data = os.urandom(2 * 1024 * 1024)
+            self.server.files['archive.tar.gz'] = data
+            self.server.etags['archive.tar.gz'] = '"v2"'
+            Download.get(self.server.url('archive.tar.gz'), hashlib.sha256(data).hexdigest(), destination)
+            with open(destination, 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(self.server.requests[-1], ('archive.tar.gz', 'bytes=1048576-', '"v1"'))
+
+    def test_get_discards_partial_download_with_incorrect_checksum(self):
+        data = os.urandom(2 * 1024 * 1024)
+        self.server.files['archive.tar.gz'] = data
+        self.server.etags['archive.tar.gz'] = '"v1"'
+        self.server.drops = 1
+        self.server.drop_after = 1024 * 1024
+        with TempDir() as d:
+            destination = os.path.join(d, 'archive')
+            with self.assertRaises(ValueError):
+                Download.get(self.server.url('archive.tar.gz'), hashlib.sha256(b'other').hexdigest(), destination, retry_delay=0)
+            self.assertFalse(os.path.exists(destination))
+            self.assertFalse(os.path.exists(destination + '.partial'))
+            self.assertFalse(os.path.exists(destination + '.partial.json'))
+
+    def test_clean_with_store(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+            info = tarfile.TarInfo('library/README')
+            info.size = len(b'readme')
+            tar.addfile(info, io.BytesIO(b'readme'))
+        data = archive.getvalue()
+        self.server.files['library.tar.gz'] = data
+        checksum = hashlib.sha256(data).hexdigest()
+
+        with TempDir() as d:
+            store = DownloadStore(os.path.join(d, 'store'))
+            for project in ['a', 'b']:
+                source = Download(self.server.url('library.tar.gz'), checksum, os.path.join(d, project, 'source'), os.path.join(d, project, 'download'), store=store)
+                source.clean()
+                with open(os.path.join(d, project, 'source', 'README'), 'rb') as f:
+                    self.assertEqual(f.read(), b'readme')
+            self.assertEqual(len(self.server.requests), 1)
+            self.assertTrue(store.get(checksum, os.path.join(d, 'copy')))
+
+            # corrupt entries are replaced
+            entry = os.path.join(d, 'store', checksum[:2], checksum)
+            os.chmod(entry, 0o644)
+            with open(entry, 'wb') as f:
+                f.write(b'corrupt')
+            Download(self.server.url('library.tar.gz'), checksum, os.path.join(d, 'c', 'source'), os.path.join(d, 'c', 'download'), store=store).clean()
+            self.assertEqual(len(self.server.requests), 2)
+            self.assertTrue(Download.verify_checksum(entry, checksum))
+
+    def test_clean_copies_pristine_directory(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+            for name in ['library-1.0/include/library.h', 'library-1.0/src/library.c']:
+                info = tarfile.TarInfo(name)
+                info.size = len(name)
+                tar.addfile(info, io.BytesIO(name.encode()))
+        data = archive.getvalue()
+        self.server.files['library.tar.gz'] = data
+
+        with TempDir() as d:
+            source = Download(self.server.url('library.tar.gz'), hashlib.sha256(data).hexdigest(), os.path.join(d, 'source'), os.path.join(d, 'download'))
+            source.clean()
+            self.assertEqual(sorted(os.listdir(source.pristine_directory())), ['include', 'src'])
+            self.assertEqual(sorted(os.listdir(os.path.join(d, 'source'))), ['include', 'src'])
+
+            with open(os.path.join(d, 'source', 'src', 'library.c'), 'w') as f:
+                f.write('modified')
+            with open(os.path.join(source.pristine_directory(), 'marker'), 'w') as f:
+                f.write('marker')
+
+            source.clean()
+            self.assertEqual(sorted(os.listdir(os.path.join(d, 'source'))), ['include', 'marker', 'src'])
+            with open(os.path.join(d, 'source', 'src', 'library.c'), 'r') as f:
+                self.assertEqual(f.read(), 'library-1.0/src/library.c')
+            self.assertEqual(sorted(os.listdir(os.path.join(d, 'download'))), [source.checksum, source.checksum + '.source'])
+
+    def test_checksum_hash(self):
+        self.assertEqual(Download.checksum_hash(hashlib.sha512(b'').hexdigest()).name, 'sha512')
+        with self.assertRaises(ValueError):
+            Download.checksum_hash('abcd')
@@ -0,0 +1,56 @@
+import io
+import os
+import tarfile
+import unittest
+
+from needy import archive
+from needy.filesystem import TempDir
+
+
+class ArchiveTest(unittest.TestCase):
+    def write_tree(self, directory):
+        os.makedirs(os.path.join(directory, 'lib'))
+        with open(os.path.join(directory, 'lib', 'libfoo.a'), 'wb') as f:
+            f.write(os.urandom(300 * 1024) + b'\0' * 300 * 1024)
+        with open(os.path.join(directory, 'foo.pc'), 'w') as f:
+            f.write('Name: foo\n')
+
+    def assertTreesEqual(self, a, b):
+        for name in [os.path.join('lib', 'libfoo.a'), 'foo.pc']:
+            with open(os.path.join(a, name), 'rb') as f:
+                expected = f.read()
+            with open(os.path.join(b, name), 'rb') as f:
+                self.assertEqual(f.read(), expected)
+
+    def round_trip(self, codec):
+        with TempDir() as d:
+            source, destination = os.path.join(d, 'source'), os.path.join(d, 'destination')
+            self.write_tree(source)
+            stream = io.BytesIO()
+            archive.write_archive(source, stream, codec)
+            archive.extract_archive(io.BytesIO(stream.getvalue()), destination, codec)
+            self.assertTreesEqual(source, destination)
+            return stream.getvalue()
+
+    def test_gzip(self):
+        data = self.round_trip(archive.GzipCodec())
+        self.assertIn('./foo.pc', tarfile.open(fileobj=io.BytesIO(data), mode='r:gz').getnames())
+
+    def test_block_gzip(self):
+        data = self.round_trip(archive.BlockGzipCodec(block_size=64 * 1024, threads=3))
+        self.assertGreater(data.count(b'\x1f\x8b\x08'), 1)
+        # standard gzip implementations read all of the members
+        self.assertIn('./foo.pc', tarfile.open(fileobj=io.BytesIO(data), mode='r:gz').getnames())
+
+    def test_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            return
+        self.round_trip(archive.ZstdCodec())
+
+    def test_codec(self):
+        for c in archive.available_codecs():
+            self.assertEqual(archive.codec(c.identifier()).identifier(), c.identifier())
+        with self.assertRaises(ValueError):
+            archive.codec('rar')
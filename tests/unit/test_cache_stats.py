@@ -0,0 +1,42 @@
+import io
+import os
+import unittest
+
+from needy.cache_stats import CacheStats, TimedReader
+from needy.filesystem import TempDir
+
+
+class CacheStatsTest(unittest.TestCase):
+    def test_summary(self):
+        with TempDir() as d:
+            stats = CacheStats(os.path.join(d, 'needs', 'cache-stats'))
+            self.assertEqual(stats.records(), [])
+            stats.record('get', 'miss', 'b', 'generic:x86_64', 'directory cache')
+            stats.record('set', 'stored', 'b', 'generic:x86_64', 'directory cache', bytes=100, compression_time=1, transfer_time=2)
+            stats.record('get', 'hit', 'b', 'generic:x86_64', 'directory cache', bytes=100, transfer_time=3, extraction_time=4)
+            stats.record('get', 'error', 'a', 'generic:x86_64', 'directory cache')
+            stats.record('get', 'hit', 'a', 'generic:x86_64', 's3 s3://bucket')
+            with open(stats.path(), 'a') as f:
+                f.write('{"incomplete": ')
+
+            summary = stats.summary()
+            self.assertEqual(list(summary.keys()), [
+                ('directory cache', 'a', 'generic:x86_64'),
+                ('directory cache', 'b', 'generic:x86_64'),
+                ('s3 s3://bucket', 'a', 'generic:x86_64'),
+            ])
+            b = summary[('directory cache', 'b', 'generic:x86_64')]
+            self.assertEqual((b['hits'], b['misses'], b['stored']), (1, 1, 1))
+            self.assertEqual((b['bytes-downloaded'], b['bytes-uploaded']), (100, 100))
+            self.assertEqual((b['compression-time'], b['upload-time'], b['download-time'], b['extraction-time']), (1, 2, 3, 4))
+            self.assertEqual(summary[('directory cache', 'a', 'generic:x86_64')]['get-errors'], 1)
+
+            stats.reset()
+            self.assertEqual(stats.records(), [])
+
+    def test_timed_reader(self):
+        reader = TimedReader(io.BytesIO(b'abcdef'))
+        self.assertEqual(reader.read(4), b'abcd')
+        self.assertEqual(reader.read(), b'ef')
+        self.assertEqual(reader.bytes_read(), 6)
+        self.assertGreaterEqual(reader.read_time(), 0)
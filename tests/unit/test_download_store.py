@@ -0,0 +1,78 @@
+import os
+import threading
+import unittest
+
+from needy.download_store import DownloadStore
+from needy.filesystem import TempDir
+
+
+class DownloadStoreTest(unittest.TestCase):
+    def test_insert_and_get(self):
+        with TempDir() as d:
+            store = DownloadStore(os.path.join(d, 'store'))
+            source = os.path.join(d, 'source')
+            with open(source, 'wb') as f:
+                f.write(b'archive')
+
+            destination = os.path.join(d, 'project', 'download', 'abcd')
+            self.assertFalse(store.get('abcd', destination))
+            store.insert('abcd', source)
+            self.assertTrue(store.get('abcd', destination))
+            with open(destination, 'rb') as f:
+                self.assertEqual(f.read(), b'archive')
+            self.assertEqual(os.listdir(os.path.join(d, 'store', 'ab')), ['abcd'])
+
+            # projects get writable copies that don't share writes with the read-only entry
+            self.assertEqual(os.stat(os.path.join(d, 'store', 'ab', 'abcd')).st_mode & 0o222, 0)
+            with open(destination, 'wb') as f:
+                f.write(b'modified')
+            self.assertTrue(store.get('abcd', os.path.join(d, 'copy')))
+            with open(os.path.join(d, 'copy'), 'rb') as f:
+                self.assertEqual(f.read(), b'archive')
+
+            store.remove('abcd')
+            self.assertFalse(store.get('abcd', destination))
+
+    def test_insert_existing(self):
+        with TempDir() as d:
+            store = DownloadStore(os.path.join(d, 'store'))
+            for contents in [b'first', b'second']:
+                source = os.path.join(d, 'source')
+                with open(source, 'wb') as f:
+                    f.write(contents)
+                store.insert('abcd', source)
+                os.remove(source)
+
+            self.assertTrue(store.get('abcd', os.path.join(d, 'destination')))
+            with open(os.path.join(d, 'destination'), 'rb') as f:
+                self.assertEqual(f.read(), b'first')
+
+    def test_concurrent_insert(self):
+        with TempDir() as d:
+            store = DownloadStore(os.path.join(d, 'store'))
+            sources = []
+            for i in range(8):
+                sources.append(os.path.join(d, 'source{}'.format(i)))
+                with open(sources[-1], 'wb') as f:
+                    f.write(b'archive')
+
+            errors = []
+
+            def insert(source):
+                try:
+                    store.insert('abcd', source)
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=insert, args=(s,)) for s in sources]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(os.path.join(d, 'store', 'ab')), ['abcd'])
+
+    def test_from_dict(self):
+        self.assertEqual(DownloadStore.from_dict('~/downloads').path(), os.path.expanduser('~/downloads'))
+        self.assertEqual(DownloadStore.from_dict({'path': '/downloads'}).path(), '/downloads')
@@ -0,0 +1,28 @@
+import os
+import unittest
+
+from needy.cd import current_directory
+from needy.execution_context import ExecutionContext
+
+
+class ExecutionContextTest(unittest.TestCase):
+    def test_defaults(self):
+        context = ExecutionContext()
+        self.assertEqual(context.directory(), current_directory())
+        self.assertEqual(context.environment(), dict(os.environ))
+
+    def test_with_directory(self):
+        context = ExecutionContext(os.path.join(os.sep, 'tmp'), {'A': '1'})
+        self.assertEqual(context.with_directory('a').directory(), os.path.join(os.sep, 'tmp', 'a'))
+        self.assertEqual(context.with_directory(os.path.join(os.sep, 'b')).directory(), os.path.join(os.sep, 'b'))
+        self.assertEqual(context.with_directory('a').getenv('A'), '1')
+        self.assertEqual(context.path('a', 'b'), os.path.join(os.sep, 'tmp', 'a', 'b'))
+
+    def test_with_environment(self):
+        context = ExecutionContext(environment={'A': '1', 'B': '2'})
+        overridden = context.with_environment({'A': '3', 'B': None, 'C': '4'})
+        self.assertEqual(overridden.environment(), {'A': '3', 'C': '4'})
+        self.assertEqual(context.environment(), {'A': '1', 'B': '2'})
+        self.assertEqual(overridden.getenv('B', 'default'), 'default')
+        overridden.environment()['A'] = '5'
+        self.assertEqual(overridden.getenv('A'), '3')
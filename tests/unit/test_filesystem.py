@@ -9,7 +9,7 @@ import hashlib
 
 from pyfakefs import fake_filesystem_unittest
 
-from needy.filesystem import lock_file, clean_file, clean_directory, TempDir, dict_file, copy_if_changed, file_hash
+from needy.filesystem import lock_file, clean_file, clean_directory, TempDir, dict_file, copy_if_changed, file_hash, clone_tree
 
 
 def try_file_lock(path):
@@ -26,6 +26,34 @@ class FilesystemTest(unittest.TestCase):
             self.assertFalse(self.try_access_from_other_process(path))
             os.close(fd)
 
+    def test_clone_tree(self):
+        with TempDir() as d:
+            source = os.path.join(d, 'source')
+            os.makedirs(os.path.join(source, 'a', 'b'))
+            os.makedirs(os.path.join(source, 'empty'))
+            for i in range(20):
+                with open(os.path.join(source, 'a', 'b', str(i)), 'w') as f:
+                    f.write(str(i))
+            os.chmod(os.path.join(source, 'a', 'b', '0'), 0o755)
+            os.utime(os.path.join(source, 'a', 'b', '1'), (1000000000, 1000000000))
+            os.symlink('b', os.path.join(source, 'a', 'link'))
+
+            destination = os.path.join(d, 'destination')
+            clone_tree(source, destination)
+
+            for i in range(20):
+                with open(os.path.join(destination, 'a', 'b', str(i)), 'r') as f:
+                    self.assertEqual(f.read(), str(i))
+            self.assertTrue(os.path.isdir(os.path.join(destination, 'empty')))
+            self.assertEqual(os.readlink(os.path.join(destination, 'a', 'link')), 'b')
+            self.assertTrue(os.access(os.path.join(destination, 'a', 'b', '0'), os.X_OK))
+            self.assertEqual(os.path.getmtime(os.path.join(destination, 'a', 'b', '1')), 1000000000)
+
+            with open(os.path.join(destination, 'a', 'b', '2'), 'w') as f:
+                f.write('modified')
+            with open(os.path.join(source, 'a', 'b', '2'), 'r') as f:
+                self.assertEqual(f.read(), '2')
+
     @staticmethod
     def try_access_from_other_process(path):
         process = multiprocessing.Process(target=try_file_lock, args=(path,))
@@ -0,0 +1,56 @@
+import threading
+import unittest
+
+from needy.fingerprints import Fingerprints
+from needy.platform import Platform
+from needy.target import Target
+
+
+class CountingPlatform(Platform):
+    def __init__(self):
+        self.probes = 0
+
+    @staticmethod
+    def identifier():
+        return 'counting'
+
+    def configuration(self, architecture):
+        self.probes += 1
+        return {'architecture': architecture}
+
+
+class FingerprintsTest(unittest.TestCase):
+    def test_get(self):
+        fingerprints = Fingerprints()
+        calls = []
+
+        def compute():
+            calls.append(None)
+            return 'value'
+
+        self.assertEqual(fingerprints.get('key', compute), 'value')
+        self.assertEqual(fingerprints.get('key', compute), 'value')
+        self.assertEqual(fingerprints.get('other', lambda: 'other'), 'other')
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_get(self):
+        fingerprints = Fingerprints()
+        results = []
+
+        def get(value):
+            results.append(fingerprints.get('key', lambda: value))
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 1)
+
+    def test_platform_configuration(self):
+        fingerprints = Fingerprints()
+        platform = CountingPlatform()
+        self.assertEqual(fingerprints.platform_configuration(Target(platform, 'x86_64')), {'architecture': 'x86_64'})
+        self.assertEqual(fingerprints.platform_configuration(Target(platform, 'x86_64')), {'architecture': 'x86_64'})
+        self.assertEqual(fingerprints.platform_configuration(Target(platform, 'i386')), {'architecture': 'i386'})
+        self.assertEqual(platform.probes, 2)
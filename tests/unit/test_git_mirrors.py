@@ -0,0 +1,70 @@
+import os
+import subprocess
+import threading
+import unittest
+
+from needy.filesystem import TempDir
+from needy.git_mirrors import GitMirrors
+
+
+class GitMirrorsTest(unittest.TestCase):
+    GIT = ['git', '-c', 'user.name=needy', '-c', 'user.email=needy@example.com']
+
+    def commit(self, repository, contents):
+        with open(os.path.join(repository, 'file'), 'w') as f:
+            f.write(contents)
+        subprocess.check_call(self.GIT + ['add', 'file'], cwd=repository)
+        subprocess.check_call(self.GIT + ['commit', '-q', '-m', contents], cwd=repository)
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=repository).decode().strip()
+
+    def test_mirror_path(self):
+        mirrors = GitMirrors('/mirrors')
+        self.assertEqual(mirrors.mirror_path('https://example.com/a.git'), mirrors.mirror_path('https://example.com/a.git'))
+        self.assertNotEqual(mirrors.mirror_path('https://example.com/a.git'), mirrors.mirror_path('https://example.org/a.git'))
+        self.assertTrue(os.path.basename(mirrors.mirror_path('https://example.com/a.git')).endswith('-a.git'))
+
+    def test_update(self):
+        with TempDir() as d:
+            repository = os.path.join(d, 'repository')
+            os.makedirs(repository)
+            subprocess.check_call(self.GIT + ['init', '-q'], cwd=repository)
+            first = self.commit(repository, 'first')
+
+            mirrors = GitMirrors(os.path.join(d, 'mirrors'))
+            path = mirrors.update(repository)
+            self.assertTrue(GitMirrors.has_commit(path, first))
+
+            second = self.commit(repository, 'second')
+            self.assertEqual(mirrors.update(repository), path)
+            self.assertFalse(GitMirrors.has_commit(path, second))
+            mirrors.update(repository, second)
+            self.assertTrue(GitMirrors.has_commit(path, second))
+
+            # refs that moved are picked up by fetching
+            third = self.commit(repository, 'third')
+            mirrors.update(repository, fetch=True)
+            self.assertTrue(GitMirrors.has_commit(path, third))
+
+    def test_concurrent_update(self):
+        with TempDir() as d:
+            repository = os.path.join(d, 'repository')
+            os.makedirs(repository)
+            subprocess.check_call(self.GIT + ['init', '-q'], cwd=repository)
+            commit = self.commit(repository, 'first')
+
+            paths = []
+
+            def update():
+                paths.append(GitMirrors(os.path.join(d, 'mirrors')).update(repository, commit))
+
+            threads = [threading.Thread(target=update) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(set(paths)), 1)
+            self.assertEqual(len(paths), 4)
+            self.assertTrue(GitMirrors.has_commit(paths[0], commit))
+            # nothing was left behind by a clone that lost a race
+            name = os.path.basename(paths[0])
+            self.assertEqual(sorted(os.listdir(os.path.join(d, 'mirrors'))), [name, name + '.lock'])
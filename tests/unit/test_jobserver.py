@@ -0,0 +1,45 @@
+import distutils.spawn
+import os
+import sys
+import unittest
+
+import needy.process
+
+from needy.filesystem import TempDir
+from needy.jobserver import JobServer
+
+
+@unittest.skipIf(sys.platform == 'win32', 'job servers are not supported on windows')
+class JobServerTest(unittest.TestCase):
+    def test_tokens(self):
+        jobserver = JobServer(3)
+        tokens = [jobserver.try_acquire(), jobserver.try_acquire()]
+        self.assertTrue(all(tokens))
+        self.assertIsNone(jobserver.try_acquire())
+        for token in tokens:
+            jobserver.release(token)
+        with jobserver.slot():
+            with jobserver.reserved_slots(5) as reserved:
+                self.assertEqual(reserved, 1)
+                self.assertIsNone(jobserver.try_acquire())
+        with jobserver.reserved_slots(5) as reserved:
+            self.assertEqual(reserved, 2)
+
+    def test_make_flags(self):
+        jobserver = JobServer(2)
+        flags = jobserver.make_flags('-k -j8 --jobserver-auth=7,8 VAR=1').split()
+        read_fd, write_fd = jobserver.file_descriptors()
+        self.assertEqual(flags, ['-k', 'VAR=1', '-j', '--jobserver-fds={},{}'.format(read_fd, write_fd), '--jobserver-auth={},{}'.format(read_fd, write_fd)])
+
+    def test_make_returns_tokens(self):
+        if not distutils.spawn.find_executable('make'):
+            return
+        jobserver = JobServer(3)
+        with TempDir() as d:
+            with open(os.path.join(d, 'Makefile'), 'w') as f:
+                f.write('all: a b c d\na b c d:\n\ttouch $@\n')
+            needy.process.command(['make', '-C', d], environment_overrides={'MAKEFLAGS': jobserver.make_flags()}, pass_fds=jobserver.file_descriptors())
+            for name in ['a', 'b', 'c', 'd']:
+                self.assertTrue(os.path.exists(os.path.join(d, name)))
+        with jobserver.reserved_slots(5) as reserved:
+            self.assertEqual(reserved, 2)
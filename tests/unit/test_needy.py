@@ -26,6 +26,12 @@ class NeedyTest(fake_filesystem_unittest.TestCase):
         with self.assertRaises(RuntimeError):
             Needy.find_needs_file('.')
 
+    def test_shared_jobserver(self):
+        self.fs.CreateFile('needs.json', contents=json.dumps({'libraries': {}}))
+        jobserver = object()
+        needy = Needy(needy_configuration=NeedyConfiguration(None), jobserver=jobserver)
+        self.assertIs(needy.jobserver(), jobserver)
+
     def test_libraries_to_build(self):
         self.fs.CreateFile('needs.json', contents=json.dumps({
             'libraries': {
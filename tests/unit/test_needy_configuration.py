@@ -31,6 +31,19 @@ class NeedyConfigurationTest(unittest.TestCase):
 
             self.assertEqual(len(c.build_caches()), 3)
 
+    def test_download_buffer_size(self):
+        with TempDir() as d:
+            path = os.path.join(d, 'tmp', '.needyconfig')
+            os.makedirs(os.path.dirname(path))
+            self.assertIsNone(NeedyConfiguration(os.path.dirname(path)).download_buffer_size())
+            with open(path, 'w') as f:
+                f.write(json.dumps({'download-buffer-size': 4096}))
+            self.assertEqual(NeedyConfiguration(os.path.dirname(path)).download_buffer_size(), 4096)
+            with open(path, 'w') as f:
+                f.write(json.dumps({'download-buffer-size': 0}))
+            with self.assertRaises(ValueError):
+                NeedyConfiguration(os.path.dirname(path)).download_buffer_size()
+
     def test_config_merging(self):
         with TempDir() as d:
             root = os.path.join(d, 'tmp', '.needyconfig')
@@ -59,3 +72,22 @@ class NeedyConfigurationTest(unittest.TestCase):
 
             c = NeedyConfiguration(os.path.dirname(leaf))
             self.assertEqual(len(c.build_caches()), 1)
+
+    def test_build_cache_codecs(self):
+        with TempDir() as d:
+            path = os.path.join(d, 'tmp', '.needyconfig')
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(json.dumps({'build-caches': [{'path': 'foo', 'codec': 'block-gzip'}, 'bar']}))
+
+            c = NeedyConfiguration(os.path.dirname(path))
+            self.assertEqual([cache.codec() for cache in c.build_caches()], ['block-gzip', 'gzip'])
+
+    def test_download_store(self):
+        with TempDir() as d:
+            path = os.path.join(d, 'tmp', '.needyconfig')
+            os.makedirs(os.path.dirname(path))
+            self.assertIsNone(NeedyConfiguration(os.path.dirname(path)).download_store())
+            with open(path, 'w') as f:
+                f.write(json.dumps({'download-store': os.path.join(d, 'downloads')}))
+            self.assertEqual(NeedyConfiguration(os.path.dirname(path)).download_store().path(), os.path.join(d, 'downloads'))
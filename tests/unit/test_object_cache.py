@@ -0,0 +1,52 @@
+import os
+import unittest
+
+from needy.filesystem import TempDir
+from needy.object_cache import ObjectCache
+
+
+class ObjectCacheTest(unittest.TestCase):
+    def write(self, path, contents):
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def test_parse_dependency_file(self):
+        with TempDir() as d:
+            path = os.path.join(d, 'a.d')
+            self.write(path, 'obj/a.o: src/a.c include/a.h \\\n  include/with\\ space.h\n')
+            self.assertEqual(ObjectCache.parse_dependency_file(path), ['src/a.c', 'include/a.h', 'include/with space.h'])
+
+    def test_restore(self):
+        with TempDir() as d:
+            source, header, dependency_file = os.path.join(d, 'a.c'), os.path.join(d, 'a.h'), os.path.join(d, 'a.d')
+            self.write(source, 'source')
+            self.write(header, 'header')
+            self.write(dependency_file, 'a.o: {} {}\n'.format(source, header))
+            self.write(os.path.join(d, 'a.o'), 'object')
+
+            cache = ObjectCache(os.path.join(d, 'cache'))
+            key = cache.key(['cc', '-c', 'a.c'], source)
+            self.assertNotEqual(key, cache.key(['cc', '-c', '-O3', 'a.c'], source))
+            self.assertFalse(cache.restore(key, os.path.join(d, 'b.o')))
+            cache.store(key, os.path.join(d, 'a.o'), dependency_file)
+
+            self.assertTrue(ObjectCache(cache.directory()).restore(key, os.path.join(d, 'b.o')))
+            with open(os.path.join(d, 'b.o')) as f:
+                self.assertEqual(f.read(), 'object')
+
+            self.write(header, 'changed')
+            self.assertFalse(ObjectCache(cache.directory()).restore(key, os.path.join(d, 'c.o')))
+
+    def test_prune(self):
+        with TempDir() as d:
+            source = os.path.join(d, 'a.c')
+            self.write(source, 'source')
+            self.write(os.path.join(d, 'a.o'), 'object')
+
+            cache = ObjectCache(os.path.join(d, 'cache'))
+            key = cache.key(['cc'], source)
+            cache.store(key, os.path.join(d, 'a.o'))
+
+            cache = ObjectCache(cache.directory())
+            cache.prune()
+            self.assertEqual(os.listdir(cache.directory()), [])
@@ -5,6 +5,9 @@ import unittest
 
 import needy.process
 
+from needy.execution_context import ExecutionContext
+from needy.filesystem import TempDir
+
 
 class ProcessTest(unittest.TestCase):
 
@@ -26,3 +29,11 @@ class ProcessTest(unittest.TestCase):
     def test_command_sequence_failure(self):
         with self.assertRaises(subprocess.CalledProcessError) as a:
             needy.process.command_sequence(['notacommand123123', 'alsonotacommand321'])
+
+    def test_command_context(self):
+        with TempDir() as d:
+            context = ExecutionContext(d, dict(os.environ, NEEDY_TEST_VARIABLE='QWERTYUIOP'))
+            output = needy.process.command_output([sys.executable, '-c', 'import os; print(os.getcwd()); print(os.environ[\'NEEDY_TEST_VARIABLE\'])'], context=context)
+            self.assertEqual(output.split(), [os.path.realpath(d), 'QWERTYUIOP'])
+            self.assertNotEqual(os.path.realpath(os.getcwd()), os.path.realpath(d))
+            self.assertNotIn('NEEDY_TEST_VARIABLE', os.environ)
@@ -0,0 +1,92 @@
+import sys
+import threading
+import time
+import unittest
+
+from needy.jobserver import JobServer
+from needy.scheduler import Scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_serial_order(self):
+        order = []
+        scheduler = Scheduler()
+        scheduler.add('a', lambda: order.append('a'))
+        scheduler.add('b', lambda: order.append('b'), ['a'])
+        scheduler.add('c', lambda: order.append('c'))
+        scheduler.add('d', lambda: order.append('d'), ['b', 'c'])
+        scheduler.run()
+        self.assertEqual(order, ['a', 'b', 'c', 'd'])
+
+    def test_dependencies_finish_first(self):
+        lock = threading.Lock()
+        finished = []
+
+        def job(name, dependencies):
+            with lock:
+                for dependency in dependencies:
+                    self.assertIn(dependency, finished)
+            with lock:
+                finished.append(name)
+
+        graph = {'a': [], 'b': ['a'], 'c': ['a'], 'd': ['b', 'c'], 'e': []}
+        scheduler = Scheduler(4)
+        for name, dependencies in sorted(graph.items()):
+            scheduler.add(name, lambda name=name, dependencies=dependencies: job(name, dependencies), dependencies)
+        scheduler.run()
+        self.assertEqual(set(finished), set(graph.keys()))
+
+    def test_independent_jobs_run_concurrently(self):
+        barrier = threading.Event()
+        scheduler = Scheduler(2)
+        scheduler.add('a', lambda: self.assertTrue(barrier.wait(10)))
+        scheduler.add('b', barrier.set)
+        scheduler.run()
+
+    @unittest.skipIf(sys.platform == 'win32', 'job servers are not supported on windows')
+    def test_jobserver_limits_concurrency(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def job():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+        scheduler = Scheduler(4, jobserver=JobServer(2))
+        for name in ['a', 'b', 'c', 'd', 'e']:
+            scheduler.add(name, job)
+        scheduler.run()
+        self.assertEqual(len(peak), 5)
+        self.assertLessEqual(max(peak), 2)
+
+    def test_unknown_dependencies_are_ignored(self):
+        order = []
+        scheduler = Scheduler()
+        scheduler.add('a', lambda: order.append('a'), ['overridden'])
+        scheduler.run()
+        self.assertEqual(order, ['a'])
+
+    def test_failure_stops_dependents(self):
+        order = []
+
+        def fail():
+            raise RuntimeError('failure')
+
+        scheduler = Scheduler(2)
+        scheduler.add('a', fail)
+        scheduler.add('b', lambda: order.append('b'), ['a'])
+        with self.assertRaises(RuntimeError):
+            scheduler.run()
+        self.assertEqual(order, [])
+
+    def test_circular_dependency(self):
+        scheduler = Scheduler()
+        scheduler.add('a', lambda: None, ['b'])
+        scheduler.add('b', lambda: None, ['a'])
+        with self.assertRaises(ValueError):
+            scheduler.run()
@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import unittest
+
+from needy.filesystem import TempDir
+from needy.toolchain_cache import ToolchainCache
+
+
+class ToolchainCacheTest(unittest.TestCase):
+    def test_get(self):
+        with TempDir() as d:
+            binary = os.path.join(d, 'cc')
+            with open(binary, 'w') as f:
+                f.write('compiler')
+            calls = []
+
+            def probe():
+                calls.append(None)
+                return ['output']
+
+            cache = ToolchainCache(os.path.join(d, 'cache', 'toolchains.json'))
+            self.assertEqual(cache.get(binary, 'probe', probe), ['output'])
+            self.assertEqual(cache.get(binary, 'probe', probe), ['output'])
+            # another process sees the stored result
+            self.assertEqual(ToolchainCache(cache.path()).get(binary, 'probe', probe), ['output'])
+            self.assertEqual(len(calls), 1)
+
+            self.assertEqual(cache.get(binary, 'other probe', lambda: 1), 1)
+            with open(cache.path(), 'r') as f:
+                self.assertEqual(len(json.load(f)[os.path.realpath(binary)]['probes']), 2)
+
+    def test_invalidation(self):
+        with TempDir() as d:
+            binary = os.path.join(d, 'cc')
+            with open(binary, 'w') as f:
+                f.write('compiler')
+            cache = ToolchainCache(os.path.join(d, 'toolchains.json'))
+            self.assertEqual(cache.get(binary, 'probe', lambda: 'old'), 'old')
+            with open(binary, 'w') as f:
+                f.write('upgraded compiler')
+            self.assertEqual(cache.get(binary, 'probe', lambda: 'new'), 'new')
+
+    def test_unstored_results(self):
+        with TempDir() as d:
+            cache = ToolchainCache(os.path.join(d, 'toolchains.json'))
+            self.assertEqual(cache.get(os.path.join(d, 'missing'), 'probe', lambda: 'value'), 'value')
+            self.assertEqual(cache.get(None, 'probe', lambda: 'value'), 'value')
+            with open(os.path.join(d, 'cc'), 'w') as f:
+                f.write('compiler')
+            self.assertIsNone(cache.get(os.path.join(d, 'cc'), 'probe', lambda: None))
+            self.assertEqual(cache.get(os.path.join(d, 'cc'), 'probe', lambda: []), [])
+            self.assertFalse(os.path.exists(cache.path()))
+
+    def test_concurrent_writers(self):
+        with TempDir() as d:
+            binary = os.path.join(d, 'cc')
+            with open(binary, 'w') as f:
+                f.write('compiler')
+            path = os.path.join(d, 'toolchains.json')
+
+            def write(i):
+                # separate instances only share the file lock, like separate processes would
+                cache = ToolchainCache(path)
+                for j in range(10):
+                    cache.get(binary, 'probe {} {}'.format(i, j), lambda: 'value')
+
+            threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with open(path, 'r') as f:
+                self.assertEqual(len(json.load(f)[os.path.realpath(binary)]['probes']), 40)
+            self.assertEqual([name for name in os.listdir(d) if name.endswith('.tmp')], [])
@@ -0,0 +1,66 @@
+import threading
+import unittest
+
+from needy.uploader import BackgroundUploader
+
+
+class BackgroundUploaderTest(unittest.TestCase):
+    def test_wait(self):
+        uploader = BackgroundUploader(threads=2, max_pending=1)
+        uploaded = []
+        lock = threading.Lock()
+
+        def upload(i):
+            with lock:
+                uploaded.append(i)
+
+        for i in range(10):
+            uploader.submit('upload {}'.format(i), lambda i=i: upload(i))
+        self.assertEqual(uploader.wait(), [])
+        self.assertEqual(sorted(uploaded), list(range(10)))
+
+    def test_failures(self):
+        uploader = BackgroundUploader()
+
+        def fail():
+            raise RuntimeError('unreachable')
+
+        uploader.submit('success', lambda: None)
+        uploader.submit('failure', fail)
+        failures = uploader.wait()
+        self.assertEqual([description for description, e in failures], ['failure'])
+        self.assertIsInstance(failures[0][1], RuntimeError)
+        # failures are only reported once
+        self.assertEqual(uploader.wait(), [])
+
+    def test_bounded_queue(self):
+        uploader = BackgroundUploader(threads=1, max_pending=1)
+        release = threading.Event()
+        submitted = []
+
+        def submit():
+            for i in range(3):
+                uploader.submit('upload {}'.format(i), release.wait)
+                submitted.append(i)
+
+        thread = threading.Thread(target=submit)
+        thread.start()
+        thread.join(0.5)
+        # one upload is running and one is queued, so the third can't be submitted yet
+        self.assertEqual(submitted, [0, 1])
+        release.set()
+        thread.join()
+        self.assertEqual(uploader.wait(), [])
+
+    def test_submit_from_upload(self):
+        uploader = BackgroundUploader(threads=1, max_pending=1)
+        uploaded = []
+
+        def upload():
+            # once the queue is full, the rest run right away instead of waiting for the only worker
+            for i in range(3):
+                uploader.submit('upload {}'.format(i), lambda i=i: uploaded.append(i))
+
+        uploader.submit('uploads', upload)
+        self.assertEqual(uploader.wait(), [])
+        self.assertEqual(sorted(uploaded), [0, 1, 2])